@@ -0,0 +1,336 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from logging_service.logging import Logging
+from sensors.async_sensor import AsyncSensor
+from sensors.base_sensor import DifferentSensorsFactory, SensorType
+from sensors.scheduler import SensorScheduler
+from sensors.sensor_bank import SensorBank
+from service.model.ids import IdGenerator
+from service.model.message import MessageBatch, Messages
+from service.repository.repository import (
+    ConnectionPool,
+    DatabaseRepository,
+    FileRepository,
+    FsyncPolicy,
+    InMemoryRepository,
+    Repository,
+)
+from service.repository.ring_repository import RingBufferRepository
+from service.repository.segment_store import SegmentRepository
+from utils.async_network import AsyncNetwork
+from utils.clock import VirtualClock
+from utils.codec import BinaryCodec, Codec, TextCodec
+from utils.network import Network
+
+"""
+Benchmarks for the pipeline stages. Every benchmark returns a BenchmarkResult with the number of
+messages, the elapsed real time and, where it applies, end-to-end latencies (p50/p99) or the memory
+used per simulated sensor. Run `python -m benchmarks.pipeline` for the full suite, or `--quick` for
+a short smoke run.
+"""
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    messages: int
+    seconds: float
+    latencies: list[float] = field(default_factory=list, repr=False)
+    memory_per_sensor: Optional[float] = None
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+    @property
+    def p50(self) -> float:
+        return percentile(self.latencies, 50)
+
+    @property
+    def p99(self) -> float:
+        return percentile(self.latencies, 99)
+
+    def __str__(self) -> str:
+        line = f"{self.name:<40} {self.messages_per_second:>12,.0f} msg/s"
+        if self.latencies:
+            line += f"  p50={self.p50 * 1e3:8.3f}ms  p99={self.p99 * 1e3:8.3f}ms"
+        if self.memory_per_sensor is not None:
+            line += f"  {self.memory_per_sensor:,.0f} B/sensor"
+        return line
+
+
+class LatencyRepository:
+    """
+    The LatencyRepository class wraps a repository and records, for every saved message, the
+    time between its timestamp (set to time.perf_counter() by the benchmark producers) and the
+    moment save_many returns, read from now. It sets done once expected messages have been
+    saved.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        expected: int = 0,
+        now: Callable[[], float] = time.perf_counter,
+    ):
+        self.repository: Repository = repository
+        self.expected: int = expected
+        self.now: Callable[[], float] = now
+        self.saved: int = 0
+        self.latencies: list[float] = []
+        self.done: threading.Event = threading.Event()
+
+    def save(self, message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        self.repository.save_many(messages)
+        now = self.now()
+        if isinstance(messages, MessageBatch):
+            timestamps = messages.timestamps
+        else:
+            timestamps = [message.timestamp for message in messages]
+        self.latencies.extend(now - timestamp for timestamp in timestamps)
+        self.saved += len(timestamps)
+        if self.saved >= self.expected:
+            self.done.set()
+
+
+def bench_network(
+    messages: int = 100_000, producers: int = 4, max_messages: int = 5, batch: int = 1
+) -> BenchmarkResult:
+    network = Network(max_messages=max_messages)
+    per_producer = messages // producers // batch * batch
+    total = per_producer * producers
+
+    def produce() -> None:
+        for _ in range(0, per_producer, batch):
+            now = time.perf_counter()
+            if batch == 1:
+                network.send_message(now)
+            else:
+                network.send_many([now] * batch)
+
+    threads = [threading.Thread(target=produce) for _ in range(producers)]
+    latencies: list[float] = []
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    while len(latencies) < total:
+        received = network.receive_many(max_messages)
+        now = time.perf_counter()
+        latencies.extend(now - sent for sent in received)
+    seconds = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    return BenchmarkResult(
+        f"network(producers={producers}, batch={batch})", total, seconds, latencies
+    )
+
+
+def bench_logging(
+    messages: int = 50_000,
+    codec: Optional[Codec] = None,
+    repository: Optional[Repository] = None,
+    max_messages: int = 5,
+    batch_size: int = 100,
+) -> BenchmarkResult:
+    codec = codec or BinaryCodec()
+    network = Network(max_messages=max_messages)
+    recorder = LatencyRepository(repository or InMemoryRepository(), messages)
+    logging = Logging(
+        repository=recorder, network=network, batch_size=batch_size, codec=codec
+    )
+    logging.daemon = True
+    start = time.perf_counter()
+    logging.start()
+    for i in range(messages):
+        network.send_message(
+            codec.encode(f"sensor_{i % 100}", i % 100, time.perf_counter())
+        )
+    recorder.done.wait()
+    seconds = time.perf_counter() - start
+    return BenchmarkResult(
+        f"logging({type(codec).__name__}, batch_size={batch_size})",
+        messages,
+        seconds,
+        recorder.latencies,
+    )
+
+
+def bench_repository(
+    name: str,
+    factory: Callable[[str], Repository],
+    messages: int = 50_000,
+    batch_size: int = 500,
+) -> BenchmarkResult:
+    """Saves messages in batches of batch_size, latency is the save_many duration"""
+    ids = IdGenerator()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        repository = factory(directory)
+        batches = []
+        for start in range(0, messages, batch_size):
+            batch = MessageBatch()
+            for i in range(start, min(start + batch_size, messages)):
+                batch.append(
+                    f"sensor_{i % 100}",
+                    rng.randint(1, 100),
+                    1_700_000_000.0 + i,
+                    ids.next_int(),
+                )
+            batches.append(batch)
+        latencies = []
+        begin = time.perf_counter()
+        for batch in batches:
+            started = time.perf_counter()
+            repository.save_many(batch)
+            latencies.append(time.perf_counter() - started)
+        if hasattr(repository, "close"):
+            repository.close()
+        seconds = time.perf_counter() - begin
+    return BenchmarkResult(f"repository({name})", messages, seconds, latencies)
+
+
+REPOSITORIES: dict[str, Callable[[str], Repository]] = {
+    "memory": lambda directory: InMemoryRepository(),
+    "ring": lambda directory: RingBufferRepository(),
+    "file": lambda directory: FileRepository(
+        file_path=os.path.join(directory, "data.csv")
+    ),
+    "file(fsync=never)": lambda directory: FileRepository(
+        file_path=os.path.join(directory, "data.csv"), fsync_policy=FsyncPolicy.NEVER
+    ),
+    "database": lambda directory: DatabaseRepository(
+        db_name=os.path.join(directory, "data.db"), connection_pool=ConnectionPool(2)
+    ),
+    "segment": lambda directory: SegmentRepository(directory=directory),
+}
+
+
+def bench_pipeline(
+    sensors: int = 10_000,
+    duration: float = 60.0,
+    seed: int = 0,
+    codec: Optional[Codec] = None,
+) -> BenchmarkResult:
+    """Runs sensors, Network and Logging for duration simulated seconds on a VirtualClock,
+    with end-to-end latencies in simulated seconds"""
+    clock = VirtualClock()
+    codec = codec or BinaryCodec()
+    network = Network(max_messages=5, clock=clock)
+    repository = InMemoryRepository()
+    recorder = LatencyRepository(repository, now=clock.time)
+    logging = Logging(repository=recorder, network=network, codec=codec, clock=clock)
+    logging.daemon = True
+    scheduler = SensorScheduler(
+        start_delay=(0, 1), clock=clock, rng=random.Random(seed)
+    )
+    per_type = sensors // len(SensorType)
+    DifferentSensorsFactory().create_sensors(
+        network=network,
+        sensor_type={sensor_type: per_type for sensor_type in SensorType},
+        codec=codec,
+        scheduler=scheduler,
+        clock=clock,
+        seed=seed,
+    )
+    start = time.perf_counter()
+    logging.start()
+    scheduler.start()
+    while clock.monotonic() < duration:
+        time.sleep(0.01)
+    scheduler.stop()
+    scheduler.join()
+    # Logging drains the network and flushes its last batch on the way out. Nothing drives the
+    # clock any more, move it past the timeout of the receive it may be waiting in.
+    logging.stop()
+    clock.advance(logging.stop_poll_interval)
+    logging.join()
+    seconds = time.perf_counter() - start
+    return BenchmarkResult(
+        f"pipeline(sensors={per_type * len(SensorType)}, {duration:g}s simulated)",
+        len(repository.data),
+        seconds,
+        recorder.latencies,
+    )
+
+
+def _memory_per_object(create: Callable[[int], object], count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def bench_sensor_memory(sensors: int = 10_000) -> list[BenchmarkResult]:
+    network = Network()
+    async_network = AsyncNetwork()
+    codec = TextCodec()
+    kinds: dict[str, Callable[[int], object]] = {
+        "thread sensor": lambda n: [
+            SensorType.SensorA.value(network, name=f"SensorA_{i}", codec=codec)
+            for i in range(n)
+        ],
+        "async sensor": lambda n: [
+            AsyncSensor(
+                async_network, SensorType.SensorA, name=f"SensorA_{i}", codec=codec
+            )
+            for i in range(n)
+        ],
+        "sensor bank": lambda n: SensorBank(
+            network, SensorType.SensorA, n, codec=codec
+        ),
+    }
+    return [
+        BenchmarkResult(
+            f"memory({name})",
+            sensors,
+            0.0,
+            memory_per_sensor=_memory_per_object(create, sensors),
+        )
+        for name, create in kinds.items()
+    ]
+
+
+def run_suite(quick: bool = False) -> list[BenchmarkResult]:
+    scale = 10 if quick else 1
+    results = [
+        bench_network(messages=100_000 // scale),
+        bench_network(messages=100_000 // scale, batch=5),
+        bench_logging(messages=50_000 // scale, codec=TextCodec()),
+        bench_logging(messages=50_000 // scale, codec=BinaryCodec()),
+    ]
+    results.extend(
+        bench_repository(name, factory, messages=50_000 // scale)
+        for name, factory in REPOSITORIES.items()
+    )
+    results.append(bench_pipeline(sensors=10_000 // scale, duration=60.0 / scale))
+    results.extend(bench_sensor_memory(10_000 // scale))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+    for result in run_suite(quick=args.quick):
+        print(result)
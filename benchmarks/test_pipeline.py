@@ -0,0 +1,42 @@
+from benchmarks.pipeline import (
+    REPOSITORIES,
+    bench_logging,
+    bench_network,
+    bench_pipeline,
+    bench_repository,
+    bench_sensor_memory,
+    percentile,
+)
+
+
+class TestBenchmarks:
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 51.0
+        assert percentile(values, 99) == 100.0
+        assert percentile([], 50) == 0.0
+
+    def test_network(self):
+        result = bench_network(messages=1000, producers=2, batch=5)
+        assert result.messages == 1000
+        assert len(result.latencies) == 1000
+
+    def test_logging(self):
+        result = bench_logging(messages=500)
+        assert len(result.latencies) == 500
+        assert result.p50 <= result.p99
+
+    def test_repositories(self):
+        for name, factory in REPOSITORIES.items():
+            result = bench_repository(name, factory, messages=200, batch_size=50)
+            assert len(result.latencies) == 4
+
+    def test_pipeline(self):
+        result = bench_pipeline(sensors=30, duration=5.0)
+        assert result.messages > 0
+        assert len(result.latencies) == result.messages
+        assert 0 <= result.p50 <= result.p99
+
+    def test_sensor_memory(self):
+        results = bench_sensor_memory(sensors=100)
+        assert all(result.memory_per_sensor > 0 for result in results)
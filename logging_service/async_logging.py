@@ -0,0 +1,116 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Optional
+
+from logging_service.logging import decode_batch
+from service.model.ids import IdGenerator
+from service.model.message import MessageBatch
+from service.repository.repository import Repository
+from utils.async_network import AsyncNetwork
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import Codec, TextCodec
+from utils.metrics import NULL_METRICS, MetricsRegistry
+
+
+class AsyncLogging:
+    """
+    The AsyncLogging class is the asyncio counterpart of the Logging class. It drains an
+    AsyncNetwork in batches, decodes them with the shared Codec and flushes each batch once
+    batch_size messages are pending or flush_interval_ms milliseconds have passed. The blocking
+    repository.save_many call runs in an executor so the event loop keeps serving sensors; at
+    most one flush is in flight at a time, which keeps batches in order. Received messages,
+    flushes, batch sizes and the save_many latency are recorded in the given MetricsRegistry
+    under the names the Logging class uses. Once stopped, or when its task is cancelled, it
+    drains the messages left in the network and waits for its last flushes before returning.
+    Receives wait at most stop_poll_interval seconds at a time so a stop is noticed promptly.
+    """
+
+    stop_poll_interval: float = 0.1
+
+    def __init__(
+        self,
+        repository: Repository,
+        network: AsyncNetwork,
+        batch_size: int = 100,
+        flush_interval_ms: float = 50,
+        codec: Optional[Codec] = None,
+        executor: Optional[Executor] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ):
+        self.metrics: MetricsRegistry = metrics
+        self.received = metrics.counter(
+            "logging_messages_total", "Messages received by the logging service"
+        )
+        self.flushes = metrics.counter("logging_flushes_total", "Batches saved")
+        self.batch_sizes = metrics.histogram(
+            "logging_batch_size", "Messages per saved batch", unit=1
+        )
+        self.flush_latency = metrics.histogram(
+            "logging_flush_seconds", "Duration of repository.save_many"
+        )
+        self.clock: Clock = clock
+        self.repository: Repository = repository
+        self.network: AsyncNetwork = network
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval_ms / 1000
+        self.codec: Codec = codec or TextCodec()
+        self.executor: Optional[Executor] = executor
+        self.id_generator: IdGenerator = IdGenerator()
+        self.pending_flush: Optional[asyncio.Future] = None
+        self.runing: bool = True
+
+    def save(self, batch: MessageBatch) -> None:
+        if not self.metrics.enabled:
+            self.repository.save_many(batch)
+            return
+        started = time.perf_counter()
+        self.repository.save_many(batch)
+        self.flush_latency.record(time.perf_counter() - started)
+        self.flushes.inc()
+        self.batch_sizes.record(len(batch))
+
+    async def flush(self, batch: MessageBatch) -> None:
+        if self.pending_flush is not None:
+            await asyncio.shield(self.pending_flush)
+            self.pending_flush = None
+        if batch:
+            loop = asyncio.get_running_loop()
+            self.pending_flush = loop.run_in_executor(self.executor, self.save, batch)
+
+    async def receive(self, batch: MessageBatch, timeout: float) -> int:
+        encoded_messages = await self.network.receive_many(
+            self.batch_size - len(batch), timeout=timeout
+        )
+        if encoded_messages:
+            self.received.inc(len(encoded_messages))
+            decode_batch(self.codec, self.id_generator, encoded_messages, batch)
+        return len(encoded_messages)
+
+    async def run(self) -> None:
+        batch = MessageBatch()
+        try:
+            deadline = self.clock.monotonic() + self.flush_interval
+            while self.runing:
+                timeout = min(
+                    max(0.0, deadline - self.clock.monotonic()), self.stop_poll_interval
+                )
+                await self.receive(batch, timeout)
+                if len(batch) >= self.batch_size or self.clock.monotonic() >= deadline:
+                    await self.flush(batch)
+                    batch = MessageBatch()
+                    deadline = self.clock.monotonic() + self.flush_interval
+        finally:
+            # Also on cancellation, the receives below never suspend
+            while await self.receive(batch, 0.0):
+                if len(batch) >= self.batch_size:
+                    await self.flush(batch)
+                    batch = MessageBatch()
+            await self.flush(batch)
+            if self.pending_flush is not None:
+                await asyncio.shield(self.pending_flush)
+                self.pending_flush = None
+
+    def stop(self) -> None:
+        self.runing = False
@@ -1,38 +1,299 @@
-import uuid
 import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from logging_service.rollup import RollupStage
+from logging_service.write_ahead_log import WriteAheadLog
+from service.repository.repository import Repository, RollupRepository
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import Codec, Encoded, TextCodec
+from utils.diagnostics import get_logger
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import MessageReceiver
+from service.model.ids import IdGenerator
+from service.model.aggregate import Aggregate
+from service.model.message import Message, MessageBatch
 
-from service.repository.repository import Repository
-from utils.network import Network
-from service.model.message import Message
+log = (
+    get_logger(__name__)
+    .sample("batch_saved", every=100)
+    .limit("save_failed", per_second=1)
+)
+
+
+def decode_batch(
+    codec: Codec,
+    id_generator: IdGenerator,
+    encoded_messages: list[Encoded],
+    batch: Optional[MessageBatch] = None,
+) -> MessageBatch:
+    """Decodes encoded messages into a (new or given) MessageBatch, assigning ids"""
+    batch = MessageBatch() if batch is None else batch
+    next_id = id_generator.next_int
+    for sensor_name, value, timestamp in codec.decode_many(encoded_messages):
+        batch.append(sensor_name, value, timestamp, next_id())
+    return batch
 
 
 class Logging(threading.Thread):
     """
     The Logging class is a subclass of the threading.Thread class and is responsible
-    for receiving messages from the Network class, parsing them into Message objects,
-    and saving them to a repository using the Repository protocol. It runs in an
-    infinite loop, continuously receiving messages and saving them to the repository.
+    for receiving messages from a network (any MessageReceiver, such as Network or a
+    SocketCollector), decoding them into Message objects with the same Codec the sensors
+    encode with, and saving them to a repository using the Repository protocol. It runs until
+    stopped, draining the network in batches and group-committing them through
+    repository.save_many once batch_size messages are pending or flush_interval_ms
+    milliseconds have passed since the last flush, whichever comes first. Batches are
+    built as columnar MessageBatch objects and every reading gets a time-ordered id from
+    an IdGenerator. Flush deadlines are measured with the given Clock. Received messages,
+    flushes, batch sizes and the save_many latency are recorded in the given MetricsRegistry.
+    With a RollupStage every flushed batch also updates the per-sensor windowed aggregates, and
+    the windows closed since the last flush are saved to rollup_repository (the repository by
+    default). keep_raw=False stores only the rollups and drops the raw readings. A batch or
+    closed windows whose save raises are logged and kept to be saved again, in order, with the
+    next flush, and the log is not committed past them.
+    With a WriteAheadLog every received chunk is appended to the log before it joins the batch.
+    Every commit_interval seconds the log is committed up to what is durably saved: the
+    repository's flush (if it has one) is given commit_timeout seconds first, so write-behind
+    sinks have written and files are synced, and the commit is skipped until the next interval
+    if it does not return True in time; batches feeding rollup windows that are still open stay
+    uncommitted.
+    On start the batches left uncommitted by the last run are saved first. Ids grow with time,
+    so when the repository has a last_id (as FileRepository does) the replayed readings up to
+    that id, saved before the crash, are skipped; other repositories get them again, making the
+    replay at-least-once (the database ignores an id it already holds). stop ends the loop:
+    the messages still in the network are drained, every pending batch is flushed, the open
+    rollup windows are closed and saved and the log is committed before the thread exits.
+    Receives wait at most stop_poll_interval seconds at a time so a stop is noticed promptly.
     """
 
+    stop_poll_interval: float = 0.1
+
     def __init__(
         self,
         repository: Repository,
-        network: Network,
+        network: MessageReceiver,
+        batch_size: int = 100,
+        flush_interval_ms: float = 50,
+        codec: Optional[Codec] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+        rollups: Optional[RollupStage] = None,
+        rollup_repository: Optional[RollupRepository] = None,
+        keep_raw: bool = True,
+        wal: Optional[WriteAheadLog] = None,
+        commit_interval: float = 1.0,
+        commit_timeout: float = 0.1,
     ):
         super().__init__()
+        self.rollups: Optional[RollupStage] = rollups
+        self.rollup_repository: RollupRepository = rollup_repository or repository
+        self.keep_raw: bool = keep_raw
+        self.next_expire: float = 0.0
+        self.rollups_saved = metrics.counter(
+            "logging_rollups_total", "Closed rollup windows saved"
+        )
+        self.metrics: MetricsRegistry = metrics
+        self.received = metrics.counter(
+            "logging_messages_total", "Messages received by the logging service"
+        )
+        self.flushes = metrics.counter("logging_flushes_total", "Batches saved")
+        self.batch_sizes = metrics.histogram(
+            "logging_batch_size", "Messages per saved batch", unit=1
+        )
+        self.flush_latency = metrics.histogram(
+            "logging_flush_seconds", "Duration of repository.save_many"
+        )
+        self.save_failures = metrics.counter(
+            "logging_save_failures_total", "Saves that raised and are retried"
+        )
+        self.unsaved: deque[tuple[int, MessageBatch]] = deque()
+        self.unsaved_rollups: list[Aggregate] = []
+        self.clock: Clock = clock
         self.repository: Repository = repository
-        self.network: Network = network
+        self.network: MessageReceiver = network
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval_ms / 1000
+        self.codec: Codec = codec or TextCodec()
+        self.id_generator: IdGenerator = IdGenerator()
         self.message: Message = None
+        self.wal: Optional[WriteAheadLog] = wal
+        self.wal_seq: int = 0
+        self.batch_seq: int = 0
+        self.commit_interval: float = commit_interval
+        self.commit_timeout: float = commit_timeout
+        self.next_commit: float = 0.0
+        self.runing: bool = True
+
+    def parse_message(self, encoded_message: Encoded) -> Message:
+        sensor_name, value, timestamp = self.codec.decode(encoded_message)
+        return Message(
+            id=self.id_generator.next_id(),
+            sensor_name=sensor_name,
+            value=value,
+            timestamp=timestamp,
+        )
+
+    def parse_messages(
+        self, encoded_messages: list[Encoded], batch: Optional[MessageBatch] = None
+    ) -> MessageBatch:
+        return decode_batch(self.codec, self.id_generator, encoded_messages, batch)
+
+    def flush_rollups(self, batch: MessageBatch, seq: int = 0) -> None:
+        self.rollups.add_batch(batch, seq)
+        now = self.clock.time()
+        if now >= self.next_expire:
+            self.rollups.expire(now)
+            self.next_expire = now + self.rollups.grace
+        self.save_rollups(self.rollups.drain())
+
+    def save_rollups(self, closed: list[Aggregate]) -> None:
+        """Saves the closed windows after the ones an earlier failure left unsaved"""
+        self.unsaved_rollups.extend(closed)
+        if not self.unsaved_rollups:
+            return
+        try:
+            self.rollup_repository.save_rollups(self.unsaved_rollups)
+        except Exception as e:
+            self.save_failures.inc()
+            log.error("save_failed", exc_info=e, windows=len(self.unsaved_rollups))
+            return
+        self.rollups_saved.inc(len(self.unsaved_rollups))
+        self.unsaved_rollups = []
+
+    def flush(self, batch: MessageBatch, seq: int = 0) -> None:
+        if self.rollups is not None:
+            self.flush_rollups(batch, seq)
+        if self.keep_raw:
+            self.save(batch, seq)
+
+    def save(self, batch: MessageBatch, seq: int = 0) -> None:
+        """Saves the batch after the ones an earlier failure left unsaved, stopping at the first
+        that fails"""
+        if batch:
+            self.unsaved.append((seq, batch))
+        while self.unsaved:
+            try:
+                self.save_batch(self.unsaved[0][1])
+            except Exception as e:
+                self.save_failures.inc()
+                log.error("save_failed", exc_info=e, batches=len(self.unsaved))
+                return
+            self.unsaved.popleft()
+
+    def save_batch(self, batch: MessageBatch) -> None:
+        log.debug("batch_saved", messages=len(batch))
+        if not self.metrics.enabled:
+            self.repository.save_many(batch)
+            return
+        started = time.perf_counter()
+        self.repository.save_many(batch)
+        self.flush_latency.record(time.perf_counter() - started)
+        self.flushes.inc()
+        self.batch_sizes.record(len(batch))
+
+    def receive(self, batch: MessageBatch, timeout: float) -> int:
+        """Receives up to the free room of the batch into it, logging the chunk first"""
+        encoded_messages = self.network.receive_many(
+            self.batch_size - len(batch), timeout=timeout
+        )
+        if not encoded_messages:
+            return 0
+        self.received.inc(len(encoded_messages))
+        if self.wal is None:
+            self.parse_messages(encoded_messages, batch)
+        else:
+            chunk = self.parse_messages(encoded_messages)
+            self.wal_seq = self.wal.append(chunk)
+            if not batch:
+                self.batch_seq = self.wal_seq
+            batch.extend(chunk)
+        return len(encoded_messages)
+
+    def commit(self, batch: MessageBatch) -> None:
+        """Flushes the batch and commits the log once commit_interval has passed"""
+        self.flush(batch, self.batch_seq)
+        if self.wal is not None and self.clock.monotonic() >= self.next_commit:
+            self.checkpoint(self.commit_timeout)
+
+    def checkpoint(self, timeout: Optional[float] = None) -> None:
+        """Commits the log up to the last batch whose readings are all durably saved. The
+        repository gets timeout seconds to flush, if it does not the commit waits for the next
+        checkpoint."""
+        seq = self.wal_seq
+        if self.unsaved:
+            seq = min(seq, self.unsaved[0][0] - 1)
+        if self.unsaved_rollups:
+            # The batches behind the windows are not known any more
+            seq = 0
+        if self.rollups is not None:
+            oldest = self.rollups.oldest_seq()
+            if oldest is not None:
+                seq = min(seq, oldest - 1)
+        self.next_commit = self.clock.monotonic() + self.commit_interval
+        flush = getattr(self.repository, "flush", None)
+        if flush is not None and flush(timeout=timeout) is False:
+            return
+        if seq > 0:
+            self.wal.commit(seq)
+
+    def close_rollups(self) -> None:
+        """Closes and saves every open rollup window"""
+        self.rollups.close_all()
+        self.save_rollups(self.rollups.drain())
+
+    def saved_id(self) -> Optional[int]:
+        """Returns the id of the last reading the repository holds, if it can tell"""
+        last_id = getattr(self.repository, "last_id", None)
+        saved = last_id() if last_id is not None else None
+        return None if saved is None else uuid.UUID(saved).int
+
+    def replay(self) -> None:
+        """Saves the batches a previous run logged but never committed, skipping the readings
+        up to the last one the repository already holds"""
+        if self.wal is None:
+            return
+        saved = self.saved_id()
+        for seq, batch in self.wal.replay():
+            log.info("wal_replayed", seq=seq, messages=len(batch))
+            self.wal_seq = seq
+            if self.rollups is not None:
+                self.flush_rollups(batch, seq)
+            if self.keep_raw:
+                self.save(batch if saved is None else batch.after(saved), seq)
+        self.checkpoint()
 
     def run(self) -> None:
-        while True:
-            message = self.network.receive_message()
-            print(f"Receiving message: {message}")
-            message = message.split(" ")
-            message = Message(
-                id=uuid.uuid4(),
-                sensor_name=message[0],
-                value=int(message[1]),
-                timestamp=float(message[2]),
+        self.replay()
+        batch = MessageBatch()
+        deadline = self.clock.monotonic() + self.flush_interval
+        while self.runing:
+            timeout = min(
+                max(0.0, deadline - self.clock.monotonic()), self.stop_poll_interval
             )
-            self.repository.save(message=message)
+            self.receive(batch, timeout)
+            if len(batch) >= self.batch_size or self.clock.monotonic() >= deadline:
+                self.commit(batch)
+                batch = MessageBatch()
+                deadline = self.clock.monotonic() + self.flush_interval
+        while self.receive(batch, 0.0):
+            if len(batch) >= self.batch_size:
+                self.commit(batch)
+                batch = MessageBatch()
+        self.commit(batch)
+        if self.rollups is not None:
+            self.close_rollups()
+        if self.unsaved or self.unsaved_rollups:
+            log.error(
+                "unsaved_at_stop",
+                batches=len(self.unsaved),
+                windows=len(self.unsaved_rollups),
+            )
+        if self.wal is not None:
+            self.checkpoint()
+            self.wal.close()
+
+    def stop(self) -> None:
+        self.runing = False
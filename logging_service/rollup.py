@@ -0,0 +1,138 @@
+import heapq
+from typing import Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import MessageBatch
+
+DEFAULT_RESOLUTIONS: tuple[float, ...] = (1.0, 60.0, 3600.0)
+
+
+class Window:
+    """Running count, min, max, sum and last value of one open rollup window, and the
+    write-ahead log sequence number of the batch that opened it"""
+
+    __slots__ = ("start", "count", "min", "max", "total", "last", "seq")
+
+    def __init__(self, start: float, value: int, seq: int = 0):
+        self.start: float = start
+        self.seq: int = seq
+        self.count: int = 1
+        self.min: int = value
+        self.max: int = value
+        self.total: int = value
+        self.last: int = value
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def aggregate(self, sensor_name: str, duration: float) -> Aggregate:
+        return Aggregate(
+            sensor_name=sensor_name,
+            start=self.start,
+            duration=duration,
+            count=self.count,
+            min=self.min,
+            max=self.max,
+            mean=self.total / self.count,
+            last=self.last,
+        )
+
+
+class RollupStage:
+    """
+    The RollupStage class maintains tumbling-window aggregates (count, min, max, mean and last)
+    of every sensor at each of the given resolutions, in seconds, aligned to the epoch. Each
+    reading updates one open window per resolution in O(1). A window closes when its sensor
+    sends a reading for a later window, or when expire is called more than grace seconds after
+    the window ended; closed windows wait in closed until drained. A reading older than the open
+    window of its sensor at some resolution belongs to a window that was already closed: it is
+    counted in late and left out of that resolution. Readings added with the write-ahead log
+    sequence number of their batch pin it while their windows are open: oldest_seq returns the
+    lowest pinned one, so the log is not committed past readings only held in open windows.
+    """
+
+    def __init__(
+        self, resolutions: tuple[float, ...] = DEFAULT_RESOLUTIONS, grace: float = 1.0
+    ):
+        self.resolutions: tuple[float, ...] = tuple(resolutions)
+        self.grace: float = grace
+        self.windows: dict[str, list[Optional[Window]]] = {}
+        self.closed_until: dict[str, list[float]] = {}
+        self.closed: list[Aggregate] = []
+        self.late: int = 0
+        self.pinned: dict[int, int] = {}
+        self.pinned_heap: list[int] = []
+
+    def _open(self, start: float, value: int, seq: int) -> Window:
+        if seq:
+            count = self.pinned.get(seq, 0)
+            if not count:
+                heapq.heappush(self.pinned_heap, seq)
+            self.pinned[seq] = count + 1
+        return Window(start, value, seq)
+
+    def _close(self, sensor_name: str, window: Window, resolution: float) -> None:
+        self.closed.append(window.aggregate(sensor_name, resolution))
+        if window.seq:
+            self.pinned[window.seq] -= 1
+
+    def oldest_seq(self) -> Optional[int]:
+        """Returns the lowest sequence number of the batches feeding an open window"""
+        heap = self.pinned_heap
+        while heap and not self.pinned[heap[0]]:
+            del self.pinned[heapq.heappop(heap)]
+        return heap[0] if heap else None
+
+    def add(self, sensor_name: str, value: int, timestamp: float, seq: int = 0) -> None:
+        windows = self.windows.get(sensor_name)
+        if windows is None:
+            windows = self.windows[sensor_name] = [None] * len(self.resolutions)
+            self.closed_until[sensor_name] = [float("-inf")] * len(self.resolutions)
+        late = False
+        for i, resolution in enumerate(self.resolutions):
+            start = timestamp - timestamp % resolution
+            window = windows[i]
+            if window is None:
+                if start < self.closed_until[sensor_name][i]:
+                    late = True
+                    continue
+                windows[i] = self._open(start, value, seq)
+            elif start == window.start:
+                window.add(value)
+            elif start > window.start:
+                self._close(sensor_name, window, resolution)
+                windows[i] = self._open(start, value, seq)
+            else:
+                late = True
+        if late:
+            self.late += 1
+
+    def add_batch(self, batch: MessageBatch, seq: int = 0) -> None:
+        names = batch.sensor_names
+        for index, value, timestamp in zip(
+            batch.sensor_indices, batch.values, batch.timestamps
+        ):
+            self.add(names[index], value, timestamp, seq)
+
+    def expire(self, now: float) -> None:
+        """Closes every window that ended more than grace seconds before now"""
+        for sensor_name, windows in self.windows.items():
+            for i, resolution in enumerate(self.resolutions):
+                window = windows[i]
+                if window is not None and window.start + resolution + self.grace <= now:
+                    self._close(sensor_name, window, resolution)
+                    self.closed_until[sensor_name][i] = window.start + resolution
+                    windows[i] = None
+
+    def close_all(self) -> None:
+        self.expire(float("inf"))
+
+    def drain(self) -> list[Aggregate]:
+        closed, self.closed = self.closed, []
+        return closed
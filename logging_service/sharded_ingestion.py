@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+import signal
+import time
+import zlib
+from functools import partial
+from typing import Callable, Optional
+
+from logging_service.logging import Logging
+from sensors.base_sensor import SensorType
+from sensors.scheduler import SensorScheduler
+from service.repository.repository import FileRepository, Repository
+from utils.codec import BinaryCodec, SensorRegistry
+from utils.shared_memory_network import SharedMemoryNetwork
+
+RepositoryFactory = Callable[[int], Repository]
+
+
+def shard_of(sensor_name: str, num_shards: int) -> int:
+    """Stable hash partitioning, unlike hash() it gives the same shard in every process"""
+    return zlib.crc32(sensor_name.encode()) % num_shards
+
+
+def shard_file_repository(
+    shard: int, file_path: str = "./sonsor_data.csv"
+) -> FileRepository:
+    root, ext = os.path.splitext(file_path)
+    return FileRepository(file_path=f"{root}.shard{shard}{ext}")
+
+
+def _codec_for(sensor_names: list[str]) -> BinaryCodec:
+    # Both processes of a shard intern the same names in the same order, so the sensor ids
+    # written by the producer resolve to the same names in the consumer
+    registry = SensorRegistry()
+    for sensor_name in sensor_names:
+        registry.intern(sensor_name)
+    return BinaryCodec(registry)
+
+
+def _ignore_interrupts() -> None:
+    # Ctrl-C reaches the whole process group, the parent stops the children in order instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_sensors(
+    network: SharedMemoryNetwork,
+    sensors: list[tuple[SensorType, str]],
+    delay: Optional[float],
+    start_delay: tuple[float, float],
+    stopping: multiprocessing.Event,
+) -> None:
+    _ignore_interrupts()
+    codec = _codec_for([name for _, name in sensors])
+    scheduler = SensorScheduler(start_delay=start_delay)
+    for sensor_type, name in sensors:
+        sensor = sensor_type.value(network=network, name=name, codec=codec)
+        if delay is not None:
+            sensor.delay = delay
+        scheduler.register(sensor)
+    scheduler.start()
+    stopping.wait()
+    scheduler.stop()
+    scheduler.join()
+
+
+def _run_logging(
+    network: SharedMemoryNetwork,
+    sensor_names: list[str],
+    repository_factory: RepositoryFactory,
+    shard: int,
+    batch_size: int,
+    flush_interval_ms: float,
+    stopping: multiprocessing.Event,
+) -> None:
+    _ignore_interrupts()
+    repository = repository_factory(shard)
+    logging = Logging(
+        repository=repository,
+        network=network,
+        batch_size=batch_size,
+        flush_interval_ms=flush_interval_ms,
+        codec=_codec_for(sensor_names),
+    )
+    logging.start()
+    stopping.wait()
+    logging.stop()
+    logging.join()
+    close = getattr(repository, "close", None)
+    if close is not None:
+        close()
+
+
+class ShardedIngestion:
+    """
+    The ShardedIngestion class spreads the pipeline over several processes to get past the GIL.
+    Sensors are hash-partitioned by sensor name into num_shards shards; every shard runs its
+    sensors in one process (driven by a SensorScheduler) and a Logging consumer in another,
+    connected by a SharedMemoryNetwork ring of max_messages binary records, and the consumer
+    writes to its own repository built by repository_factory(shard). Throughput scales with the
+    number of shards as long as there are cores for them. stop shuts the shards down in order
+    within a timeout: the sensor processes first, then the Logging processes, which drain their
+    ring, flush and close their repository; processes still alive at the deadline are
+    terminated. The children ignore SIGINT so a Ctrl-C reaches them through stop only. The
+    shared memory of the rings is freed once stop, join or terminate has seen every process
+    exit.
+    """
+
+    def __init__(
+        self,
+        sensor_type: dict[SensorType, int],
+        num_shards: Optional[int] = None,
+        repository_factory: RepositoryFactory = shard_file_repository,
+        max_messages: int = 5,
+        batch_size: int = 100,
+        flush_interval_ms: float = 50,
+        delay: Optional[float] = None,
+        start_delay: tuple[float, float] = (1, 11),
+    ):
+        self.num_shards: int = num_shards or os.cpu_count() or 1
+        self.repository_factory: RepositoryFactory = repository_factory
+        self.batch_size: int = batch_size
+        self.flush_interval_ms: float = flush_interval_ms
+        self.delay: Optional[float] = delay
+        self.start_delay: tuple[float, float] = start_delay
+        self.shards: list[list[tuple[SensorType, str]]] = [
+            [] for _ in range(self.num_shards)
+        ]
+        for k, v in sensor_type.items():
+            for i in range(v):
+                name = f"{k.name}_{i}"
+                self.shards[shard_of(name, self.num_shards)].append((k, name))
+        self.networks: list[SharedMemoryNetwork] = [
+            SharedMemoryNetwork(max_messages=max_messages)
+            for _ in range(self.num_shards)
+        ]
+        self.sensor_processes: list[multiprocessing.Process] = []
+        self.logging_processes: list[multiprocessing.Process] = []
+        self.sensors_stopping = multiprocessing.Event()
+        self.logging_stopping = multiprocessing.Event()
+        self.unlinked: bool = False
+
+    @property
+    def processes(self) -> list[multiprocessing.Process]:
+        return self.logging_processes + self.sensor_processes
+
+    def start(self) -> None:
+        for shard, (network, sensors) in enumerate(zip(self.networks, self.shards)):
+            if not sensors:
+                continue
+            sensor_names = [name for _, name in sensors]
+            self.logging_processes.append(
+                multiprocessing.Process(
+                    target=_run_logging,
+                    args=(
+                        network,
+                        sensor_names,
+                        self.repository_factory,
+                        shard,
+                        self.batch_size,
+                        self.flush_interval_ms,
+                        self.logging_stopping,
+                    ),
+                    daemon=True,
+                )
+            )
+            self.sensor_processes.append(
+                multiprocessing.Process(
+                    target=_run_sensors,
+                    args=(
+                        network,
+                        sensors,
+                        self.delay,
+                        self.start_delay,
+                        self.sensors_stopping,
+                    ),
+                    daemon=True,
+                )
+            )
+        for process in self.processes:
+            process.start()
+
+    def _unlink(self) -> None:
+        """Frees the shared memory of the rings once their processes have exited"""
+        if self.unlinked:
+            return
+        self.unlinked = True
+        for network in self.networks:
+            network.close(unlink=True)
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        """Stops the sensors, then the Logging consumers, within timeout seconds. Returns False
+        if some process had to be terminated at the deadline."""
+        deadline = time.monotonic() + timeout
+        try:
+            self.sensors_stopping.set()
+            for process in self.sensor_processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+            self.logging_stopping.set()
+            for process in self.logging_processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+            alive = [process for process in self.processes if process.is_alive()]
+            for process in alive:
+                process.terminate()
+                process.join()
+            return not alive
+        finally:
+            self._unlink()
+
+    def join(self) -> None:
+        for process in self.processes:
+            process.join()
+        self._unlink()
+
+    def terminate(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self._unlink()
+
+
+def file_repository_factory(file_path: str) -> RepositoryFactory:
+    """Builds a picklable factory writing shard N to <file_path root>.shardN<ext>"""
+    return partial(shard_file_repository, file_path=file_path)
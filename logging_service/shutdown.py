@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from typing import Iterable, Optional
+
+from logging_service.async_logging import AsyncLogging
+from logging_service.logging import Logging
+from sensors.async_sensor import AsyncSensor
+from sensors.base_sensor import BaseSensor
+from sensors.scheduler import SensorScheduler
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.diagnostics import get_logger
+
+log = get_logger(__name__)
+
+
+def _join(thread: threading.Thread, deadline: float, clock: Clock) -> bool:
+    if thread.ident is not None:
+        thread.join(max(0.0, deadline - clock.monotonic()))
+    return not thread.is_alive()
+
+
+def shutdown(
+    logging: Logging,
+    sensors: Iterable[BaseSensor] = (),
+    scheduler: Optional[SensorScheduler] = None,
+    timeout: float = 10.0,
+    clock: Clock = SYSTEM_CLOCK,
+) -> bool:
+    """
+    Stops the pipeline in order within timeout seconds: the scheduler and the sensors first, so
+    nothing is sent once they are joined, then the logging thread, which drains the messages
+    left in the network and flushes its last batch before exiting. Returns False if the deadline
+    passed before every thread exited; what the logging thread had received by then is still in
+    its write-ahead log, if it has one, and is saved on the next start.
+    """
+    deadline = clock.monotonic() + timeout
+    sensors = list(sensors)
+    if scheduler is not None:
+        scheduler.stop()
+    for sensor in sensors:
+        sensor.stop_sensor()
+    producers = [
+        thread
+        for thread in [scheduler, *sensors]
+        if isinstance(thread, threading.Thread)
+    ]
+    stopped = all([_join(thread, deadline, clock) for thread in producers])
+    logging.stop()
+    stopped = _join(logging, deadline, clock) and stopped
+    if not stopped:
+        log.warning("shutdown_timed_out", timeout=timeout)
+    return stopped
+
+
+async def shutdown_async(
+    logging: AsyncLogging,
+    consumer: asyncio.Task,
+    sensors: Iterable[AsyncSensor] = (),
+    producers: Iterable[asyncio.Task] = (),
+    timeout: float = 10.0,
+    clock: Clock = SYSTEM_CLOCK,
+) -> bool:
+    """
+    The asyncio counterpart of shutdown: stops the sensors and cancels their tasks, which only
+    wait between readings, then stops the logging task so it drains the network and awaits its
+    last flushes. A consumer still running after timeout seconds is cancelled, it still drains
+    and flushes before it ends, and False is returned.
+    """
+    deadline = clock.monotonic() + timeout
+    producers = list(producers)
+    for sensor in sensors:
+        sensor.stop_sensor()
+    for task in producers:
+        task.cancel()
+    await asyncio.gather(*producers, return_exceptions=True)
+    logging.stop()
+    done, _ = await asyncio.wait(
+        [consumer], timeout=max(0.0, deadline - clock.monotonic())
+    )
+    if done:
+        return True
+    log.warning("shutdown_timed_out", timeout=timeout)
+    consumer.cancel()
+    return False
@@ -0,0 +1,108 @@
+import asyncio
+
+from logging_service.async_logging import AsyncLogging
+from logging_service.shutdown import shutdown_async
+from sensors.async_sensor import AsyncSensorsFactory
+from sensors.base_sensor import SensorType
+from service.repository.repository import InMemoryRepository
+from utils.async_network import AsyncNetwork
+from utils.codec import BinaryCodec
+from utils.metrics import MetricsRegistry
+
+
+class TestAsyncLogging:
+    def test_async_pipeline(self):
+        async def scenario():
+            codec = BinaryCodec()
+            repository = InMemoryRepository()
+            network = AsyncNetwork(max_messages=5)
+            logging = AsyncLogging(
+                repository=repository,
+                network=network,
+                batch_size=10,
+                flush_interval_ms=5,
+                codec=codec,
+            )
+            sensors = AsyncSensorsFactory().create_sensors(
+                network=network,
+                sensor_type={SensorType.SensorA: 50, SensorType.SensorC: 50},
+                codec=codec,
+            )
+            for sensor in sensors:
+                sensor.delay = 0.01
+            consumer = asyncio.create_task(logging.run())
+            producers = [
+                asyncio.create_task(sensor.run(start_delay=(0, 0.01)))
+                for sensor in sensors
+            ]
+            await asyncio.sleep(0.1)
+            for sensor in sensors:
+                sensor.stop_sensor()
+            await asyncio.gather(*producers)
+            logging.stop()
+            await consumer
+            return sensors, repository
+
+        sensors, repository = asyncio.run(scenario())
+        assert {message.sensor_name for message in repository.data} == {
+            sensor.name for sensor in sensors
+        }
+        for message in repository.data:
+            if message.sensor_name.startswith("SensorC"):
+                assert -12 <= message.value <= 50
+
+    def test_shutdown_drains_the_network_and_records_metrics(self):
+        async def scenario():
+            metrics = MetricsRegistry()
+            repository = InMemoryRepository()
+            network = AsyncNetwork(max_messages=50)
+            logging = AsyncLogging(
+                repository=repository,
+                network=network,
+                batch_size=1000,
+                flush_interval_ms=60_000,
+                metrics=metrics,
+            )
+            sensors = AsyncSensorsFactory().create_sensors(
+                network=network, sensor_type={SensorType.SensorA: 5}
+            )
+            for sensor in sensors:
+                sensor.delay = 60
+            consumer = asyncio.create_task(logging.run())
+            producers = [
+                asyncio.create_task(sensor.run(start_delay=(0, 0)))
+                for sensor in sensors
+            ]
+            await asyncio.sleep(0.05)
+            stopped = await shutdown_async(
+                logging, consumer, sensors, producers, timeout=5
+            )
+            return stopped, network, repository, metrics.snapshot()
+
+        stopped, network, repository, snapshot = asyncio.run(scenario())
+        assert stopped
+        assert len(network) == 0
+        assert len(repository.data) == 5
+        assert snapshot["logging_messages_total"] == 5
+        assert snapshot["logging_flushes_total"] == 1
+
+    def test_cancelled_consumer_flushes_what_it_holds(self):
+        async def scenario():
+            repository = InMemoryRepository()
+            network = AsyncNetwork(max_messages=10)
+            logging = AsyncLogging(
+                repository=repository,
+                network=network,
+                batch_size=100,
+                flush_interval_ms=60_000,
+            )
+            consumer = asyncio.create_task(logging.run())
+            await network.send_many([f"sensor1 {i} 1.0" for i in range(3)])
+            await asyncio.sleep(0.01)
+            await network.send_many([f"sensor1 {i} 1.0" for i in range(3, 5)])
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+            return repository
+
+        repository = asyncio.run(scenario())
+        assert [message.value for message in repository.data] == list(range(5))
@@ -0,0 +1,364 @@
+import random
+import threading
+import time
+
+from logging_service.logging import Logging
+from logging_service.rollup import RollupStage
+from logging_service.shutdown import shutdown
+from logging_service.write_ahead_log import WriteAheadLog
+from sensors.base_sensor import SensorType
+from sensors.scheduler import SensorScheduler
+from service.repository.composite_repository import CompositeRepository, Sink
+from service.repository.repository import (
+    FileRepository,
+    FsyncPolicy,
+    InMemoryRepository,
+    read_rows,
+)
+from utils.codec import BinaryCodec
+from utils.metrics import MetricsRegistry
+from utils.network import Network
+
+
+def wait_for(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+class TestLogging:
+    def test_parse_message(self):
+        logging = Logging(repository=InMemoryRepository(), network=Network())
+        message = logging.parse_message("sensor1 -10 123456789.5")
+        assert message.sensor_name == "sensor1"
+        assert message.value == -10
+        assert message.timestamp == 123456789.5
+        assert message.id is not None
+
+    def test_flushes_when_batch_is_full(self):
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=3,
+            flush_interval_ms=60_000,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_many([f"sensor{i} {i} 1.0" for i in range(3)])
+        assert wait_for(lambda: len(repository.data) == 3)
+
+    def test_flushes_partial_batch_after_interval(self):
+        repository = InMemoryRepository()
+        network = Network()
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=100,
+            flush_interval_ms=10,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_message("sensor1 1 1.0")
+        assert wait_for(lambda: len(repository.data) == 1)
+        assert repository.data[0].sensor_name == "sensor1"
+
+    def test_binary_codec(self):
+        codec = BinaryCodec()
+        repository = InMemoryRepository()
+        network = Network()
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=2,
+            codec=codec,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_message(codec.encode_many([("a b", -1, 1.0), ("c", 2, 2.0)]))
+        assert wait_for(lambda: len(repository.data) == 2)
+        assert [(m.sensor_name, m.value) for m in repository.data] == [
+            ("a b", -1),
+            ("c", 2),
+        ]
+
+    def test_records_metrics(self):
+        metrics = MetricsRegistry()
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=3,
+            flush_interval_ms=60_000,
+            metrics=metrics,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_many([f"sensor{i} {i} 1.0" for i in range(3)])
+        assert wait_for(lambda: metrics.snapshot()["logging_flushes_total"] == 1)
+        snapshot = metrics.snapshot()
+        assert snapshot["logging_messages_total"] == 3
+        assert snapshot["logging_batch_size"]["max"] == 3
+        assert snapshot["logging_flush_seconds"]["count"] == 1
+
+    def test_rollups_without_raw_readings(self):
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=2,
+            rollups=RollupStage(resolutions=(1.0,)),
+            keep_raw=False,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_many(["sensor1 1 10.0", "sensor1 3 10.5", "sensor1 9 11.0"])
+        assert wait_for(lambda: len(repository.aggregates) == 2)
+        first, second = sorted(repository.aggregates, key=lambda a: a.start)
+        assert (first.start, first.count, first.mean, first.last) == (10.0, 2, 2.0, 3)
+        assert (second.start, second.count) == (11.0, 1)
+        assert repository.data == []
+
+    def test_stop_drains_the_network_and_flushes(self):
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=4,
+            flush_interval_ms=60_000,
+        )
+        logging.daemon = True
+        network.send_many([f"sensor1 {i} 1.0" for i in range(10)])
+        logging.stop()
+        logging.start()
+        logging.join(2)
+        assert not logging.is_alive()
+        assert [m.value for m in repository.data] == list(range(10))
+        assert len(network) == 0
+
+    def test_uncommitted_batches_are_replayed_on_start(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        crashed = Logging(repository=InMemoryRepository(), network=Network(), wal=wal)
+        crashed.wal.append(crashed.parse_messages(["sensor1 1 1.0", "sensor2 2 2.0"]))
+        wal.close()
+        repository = InMemoryRepository()
+        logging = Logging(
+            repository=repository,
+            network=Network(),
+            wal=WriteAheadLog(str(tmp_path)),
+        )
+        logging.stop()
+        logging.start()
+        logging.join(2)
+        assert [(m.sensor_name, m.value) for m in repository.data] == [
+            ("sensor1", 1),
+            ("sensor2", 2),
+        ]
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_replay_skips_readings_already_in_the_file(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        repository = FileRepository(file_path=str(tmp_path / "data.csv"))
+        crashed = Logging(repository=repository, network=Network(), wal=wal)
+        saved = crashed.parse_messages(["sensor1 1 1.0", "sensor2 2 2.0"])
+        crashed.wal.append(saved)
+        repository.save_many(saved)
+        crashed.wal.append(crashed.parse_messages(["sensor1 3 3.0"]))
+        wal.close()
+        repository.close()
+        logging = Logging(
+            repository=repository,
+            network=Network(),
+            wal=WriteAheadLog(str(tmp_path)),
+        )
+        logging.stop()
+        logging.start()
+        logging.join(2)
+        assert [value for _, _, _, value in read_rows(repository.file_path)] == [
+            1,
+            2,
+            3,
+        ]
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_saved_batches_are_committed(self, tmp_path):
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=2,
+            wal=WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER),
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_many(["sensor1 1 1.0", "sensor1 2 2.0", "sensor1 3 3.0"])
+        assert wait_for(lambda: len(repository.data) == 3)
+        logging.stop()
+        logging.join(2)
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_open_rollup_windows_keep_their_batches_in_the_log(self, tmp_path):
+        repository = InMemoryRepository()
+        network = Network(max_messages=10)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=2,
+            rollups=RollupStage(resolutions=(3600.0,)),
+            keep_raw=False,
+            wal=WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.ALWAYS),
+            commit_interval=0,
+        )
+        logging.daemon = True
+        logging.start()
+        hour = time.time() // 3600 * 3600
+        network.send_many([f"sensor1 1 {hour}", f"sensor1 3 {hour + 1}"])
+        assert wait_for(lambda: logging.wal_seq > 0)
+        time.sleep(0.05)
+        assert logging.wal.committed == 0
+        logging.stop()
+        logging.join(2)
+        assert [(a.start, a.count) for a in repository.aggregates] == [(hour, 2)]
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_log_is_committed_only_once_the_repository_is_flushed(self, tmp_path):
+        class WriteBehindRepository(InMemoryRepository):
+            flushed = False
+
+            def flush(self, timeout=None) -> bool:
+                return self.flushed
+
+        repository = WriteBehindRepository()
+        network = Network(max_messages=10)
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.ALWAYS)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=1,
+            wal=wal,
+            commit_interval=0,
+        )
+        logging.daemon = True
+        logging.start()
+        network.send_message("sensor1 1 1.0")
+        assert wait_for(lambda: len(repository.data) == 1)
+        time.sleep(0.05)
+        assert wal.committed == 0
+        repository.flushed = True
+        logging.stop()
+        logging.join(2)
+        assert wal.committed == 1
+
+    def test_slow_sink_does_not_stall_the_checkpoints(self, tmp_path):
+        class BlockedRepository(InMemoryRepository):
+            released = threading.Event()
+
+            def save_many(self, messages):
+                self.released.wait(5)
+                super().save_many(messages)
+
+        slow = BlockedRepository()
+        network = Network(max_messages=10)
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        logging = Logging(
+            repository=CompositeRepository([Sink("slow", slow)]),
+            network=network,
+            batch_size=1,
+            wal=wal,
+            commit_interval=0,
+            commit_timeout=0.01,
+        )
+        logging.daemon = True
+        logging.start()
+        for i in range(5):
+            network.send_message(f"sensor1 {i} 1.0")
+        assert wait_for(lambda: len(network) == 0, timeout=1)
+        assert wal.committed == 0
+        slow.released.set()
+        logging.stop()
+        logging.join(2)
+        assert len(slow.data) == 5
+        assert wal.committed == 5
+
+    def test_failed_save_is_retried_and_holds_the_commit(self, tmp_path):
+        class FailingRepository(InMemoryRepository):
+            failing = True
+
+            def save_many(self, messages):
+                if self.failing:
+                    raise OSError("disk full")
+                super().save_many(messages)
+
+        repository = FailingRepository()
+        network = Network(max_messages=10)
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        logging = Logging(
+            repository=repository,
+            network=network,
+            batch_size=1,
+            wal=wal,
+            commit_interval=0,
+        )
+        logging.daemon = True
+        logging.start()
+        for i in range(3):
+            network.send_message(f"sensor1 {i} 1.0")
+        assert wait_for(lambda: len(logging.unsaved) == 3)
+        assert logging.is_alive()
+        assert wal.committed == 0
+        repository.failing = False
+        network.send_message("sensor1 3 1.0")
+        assert wait_for(lambda: len(repository.data) == 4)
+        assert [m.value for m in repository.data] == [0, 1, 2, 3]
+        logging.stop()
+        logging.join(2)
+        assert wal.committed == 4
+
+
+class TestShutdown:
+    def test_stops_sensors_and_flushes_within_the_deadline(self):
+        metrics = MetricsRegistry()
+        repository = InMemoryRepository()
+        network = Network(max_messages=5)
+        logging = Logging(
+            repository=repository, network=network, flush_interval_ms=10_000
+        )
+        scheduler = SensorScheduler(jitter=0, start_delay=(0, 0))
+        sensors = [
+            SensorType.SensorB.value(
+                network=network, name=f"SensorB_{i}", metrics=metrics
+            )
+            for i in range(3)
+        ]
+        for sensor in sensors:
+            sensor.delay = 0.01
+            scheduler.register(sensor)
+        # A sensor on its own thread, with no start delay
+        rng = random.Random(0)
+        rng.randint = lambda low, high: 0
+        threaded = SensorType.SensorA.value(
+            network=network, name="SensorA_0", rng=rng, metrics=metrics
+        )
+        threaded.delay = 0.01
+        logging.start()
+        scheduler.start()
+        threaded.start()
+        time.sleep(0.1)
+        assert shutdown(logging, [*sensors, threaded], scheduler, timeout=2)
+        assert not threaded.is_alive()
+        sent = sum(
+            value
+            for name, value in metrics.snapshot().items()
+            if name.startswith("sensor_sent_total")
+        )
+        assert sent > 0
+        assert len(repository.data) == sent
+        assert len(network) == 0
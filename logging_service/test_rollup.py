@@ -0,0 +1,63 @@
+from logging_service.rollup import RollupStage
+from service.model.aggregate import Aggregate
+from service.model.message import MessageBatch
+
+
+class TestRollupStage:
+    def test_window_closes_on_later_reading(self):
+        rollups = RollupStage(resolutions=(1.0, 60.0))
+        for value, timestamp in [(3, 10.0), (-1, 10.2), (5, 10.9), (7, 11.5)]:
+            rollups.add("s1", value, timestamp)
+        assert rollups.drain() == [Aggregate("s1", 10.0, 1.0, 3, -1, 5, 7 / 3, 5)]
+        assert rollups.drain() == []
+        rollups.close_all()
+        assert rollups.drain() == [
+            Aggregate("s1", 11.0, 1.0, 1, 7, 7, 7.0, 7),
+            Aggregate("s1", 0.0, 60.0, 4, -1, 7, 3.5, 7),
+        ]
+
+    def test_expire_closes_idle_windows_after_grace(self):
+        rollups = RollupStage(resolutions=(1.0,), grace=0.5)
+        rollups.add("s1", 1, 10.2)
+        rollups.expire(11.4)
+        assert rollups.drain() == []
+        rollups.expire(11.5)
+        assert [a.start for a in rollups.drain()] == [10.0]
+
+    def test_late_readings_are_counted_and_skipped(self):
+        rollups = RollupStage(resolutions=(1.0, 60.0))
+        rollups.add("s1", 1, 10.0)
+        rollups.add("s1", 2, 11.0)
+        rollups.add("s1", 3, 10.5)
+        assert rollups.late == 1
+        rollups.expire(100.0)
+        rollups.add("s1", 4, 11.2)
+        assert rollups.late == 2
+        closed = rollups.drain()
+        assert [(a.duration, a.start, a.count) for a in closed] == [
+            (1.0, 10.0, 1),
+            (1.0, 11.0, 1),
+            (60.0, 0.0, 3),
+        ]
+
+    def test_add_batch(self):
+        batch = MessageBatch()
+        batch.append("s1", 1, 0.5, 1)
+        batch.append("s2", 2, 0.5, 2)
+        batch.append("s1", 3, 1.5, 3)
+        rollups = RollupStage(resolutions=(1.0,))
+        rollups.add_batch(batch)
+        assert rollups.drain() == [Aggregate("s1", 0.0, 1.0, 1, 1, 1, 1.0, 1)]
+        assert set(rollups.windows) == {"s1", "s2"}
+
+    def test_open_windows_pin_their_sequence_number(self):
+        rollups = RollupStage(resolutions=(1.0, 60.0))
+        assert rollups.oldest_seq() is None
+        rollups.add("s1", 1, 10.0, seq=1)
+        rollups.add("s2", 1, 10.0, seq=2)
+        rollups.add("s1", 2, 11.0, seq=3)
+        assert rollups.oldest_seq() == 1
+        rollups.add("s1", 3, 60.0, seq=4)
+        assert rollups.oldest_seq() == 2
+        rollups.close_all()
+        assert rollups.oldest_seq() is None
@@ -0,0 +1,62 @@
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+from logging_service.sharded_ingestion import (
+    ShardedIngestion,
+    file_repository_factory,
+    shard_of,
+)
+from sensors.base_sensor import SensorType
+
+
+class TestShardedIngestion:
+    def test_partitioning_is_stable(self):
+        assert shard_of("SensorA_1", 4) == shard_of("SensorA_1", 4)
+        assert {shard_of(f"SensorA_{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+    def test_each_shard_writes_its_own_file(self, tmp_path):
+        ingestion = ShardedIngestion(
+            sensor_type={SensorType.SensorA: 4, SensorType.SensorB: 4},
+            num_shards=2,
+            repository_factory=file_repository_factory(str(tmp_path / "data.csv")),
+            flush_interval_ms=5,
+            delay=0.01,
+            start_delay=(0, 0),
+        )
+        ingestion.start()
+        try:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                files = list(tmp_path.glob("data.shard*.csv"))
+                if len(files) == 2 and all(f.stat().st_size for f in files):
+                    break
+                time.sleep(0.05)
+        finally:
+            ingestion.terminate()
+        for shard, sensors in enumerate(ingestion.shards):
+            rows = (tmp_path / f"data.shard{shard}.csv").read_text().splitlines()
+            written = {row.split(",")[2] for row in rows}
+            assert written <= {name for _, name in sensors}
+            assert written
+
+    def test_stop_flushes_and_frees_the_shared_memory(self, tmp_path):
+        ingestion = ShardedIngestion(
+            sensor_type={SensorType.SensorA: 4},
+            num_shards=2,
+            repository_factory=file_repository_factory(str(tmp_path / "data.csv")),
+            flush_interval_ms=10_000,
+            delay=0.01,
+            start_delay=(0, 0),
+        )
+        names = [network.memory.name for network in ingestion.networks]
+        ingestion.start()
+        time.sleep(0.5)
+        assert ingestion.stop(timeout=10)
+        assert not any(process.is_alive() for process in ingestion.processes)
+        # Nothing reached the 10 s flush deadline, the rows were flushed by the stop
+        assert sum(f.stat().st_size for f in tmp_path.glob("data.shard*.csv")) > 0
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
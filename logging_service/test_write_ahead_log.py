@@ -0,0 +1,115 @@
+import os
+
+from logging_service.write_ahead_log import (
+    WriteAheadLog,
+    decode_columns,
+    encode_columns,
+)
+from service.model.message import MessageBatch
+from service.repository.repository import FsyncPolicy
+
+
+def batch(count: int, start: int = 0) -> MessageBatch:
+    batch = MessageBatch()
+    for n in range(start, start + count):
+        batch.append(f"SensorA_{n % 3}", n % 100 - 50, 1700000000.0 + n, (n << 64) | n)
+    return batch
+
+
+def rows(batch: MessageBatch) -> list:
+    return list(batch.rows())
+
+
+def segments(directory) -> list[str]:
+    return sorted(name for name in os.listdir(directory) if name.endswith(".wal"))
+
+
+class TestWriteAheadLog:
+    def test_columns_round_trip(self):
+        original = batch(10)
+        assert rows(decode_columns(encode_columns(original))) == rows(original)
+        assert len(decode_columns(encode_columns(MessageBatch()))) == 0
+
+    def test_replays_uncommitted_batches(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        first, second, third = batch(3), batch(3, start=3), batch(3, start=6)
+        assert [wal.append(first), wal.append(second)] == [1, 2]
+        wal.commit(1)
+        assert wal.append(third) == 3
+        wal.close()
+        reopened = WriteAheadLog(str(tmp_path))
+        replayed = list(reopened.replay())
+        assert [seq for seq, _ in replayed] == [2, 3]
+        assert [rows(b) for _, b in replayed] == [rows(second), rows(third)]
+        assert reopened.append(batch(1)) == 4
+
+    def test_committed_log_replays_nothing(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.ALWAYS)
+        wal.commit(wal.append(batch(5)))
+        wal.close()
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_torn_tail_is_truncated(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        wal.append(batch(2))
+        wal.append(batch(2, start=2))
+        wal.close()
+        path = tmp_path / segments(tmp_path)[-1]
+        size = path.stat().st_size
+        with open(path, "r+b") as file:
+            file.truncate(size - 5)
+        reopened = WriteAheadLog(str(tmp_path))
+        assert [seq for seq, _ in reopened.replay()] == [1]
+        assert path.stat().st_size < size - 5
+        assert reopened.append(batch(1)) == 2
+
+    def test_torn_first_record_of_a_segment(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        wal.append(batch(2))
+        wal.close()
+        path = tmp_path / segments(tmp_path)[0]
+        with open(path, "r+b") as file:
+            file.truncate(5)
+        reopened = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        assert list(reopened.replay()) == []
+        assert segments(tmp_path) == []
+        assert [reopened.append(batch(1)), reopened.append(batch(1, start=1))] == [1, 2]
+        reopened.commit(1)
+        reopened.close()
+        replayed = list(WriteAheadLog(str(tmp_path)).replay())
+        assert [seq for seq, _ in replayed] == [2]
+        assert rows(replayed[0][1]) == rows(batch(1, start=1))
+
+    def test_corrupt_record_is_not_replayed(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), fsync_policy=FsyncPolicy.NEVER)
+        wal.append(batch(2))
+        wal.close()
+        path = tmp_path / segments(tmp_path)[-1]
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == []
+
+    def test_commit_below_the_last_batch_keeps_its_segment(self, tmp_path):
+        wal = WriteAheadLog(
+            str(tmp_path), fsync_policy=FsyncPolicy.NEVER, segment_bytes=1
+        )
+        for start in range(0, 9, 3):
+            wal.append(batch(3, start=start))
+        wal.commit(1)
+        wal.append(batch(3, start=9))
+        wal.commit(2)
+        wal.close()
+        replayed = WriteAheadLog(str(tmp_path)).replay()
+        assert [seq for seq, _ in replayed] == [3, 4]
+
+    def test_checkpoint_deletes_committed_segments(self, tmp_path):
+        wal = WriteAheadLog(
+            str(tmp_path), fsync_policy=FsyncPolicy.NEVER, segment_bytes=256
+        )
+        for start in range(0, 50, 5):
+            wal.commit(wal.append(batch(5, start=start)))
+        assert len(segments(tmp_path)) <= 1
+        seq = wal.append(batch(5, start=50))
+        wal.close()
+        assert [s for s, _ in WriteAheadLog(str(tmp_path)).replay()] == [seq]
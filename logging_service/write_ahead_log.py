@@ -0,0 +1,231 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import BinaryIO, Iterator, Optional
+
+from service.model.message import MessageBatch
+from service.repository.repository import FsyncPolicy
+from utils.diagnostics import get_logger
+
+log = get_logger(__name__)
+
+# crc32 of the rest of the record, body length, kind and sequence number
+RECORD = struct.Struct("<IIBQ")
+COUNTS = struct.Struct("<II")
+DATA, COMMIT = b"D"[0], b"C"[0]
+SUFFIX = ".wal"
+
+
+def encode_columns(batch: MessageBatch) -> bytes:
+    """Encodes the columns of a MessageBatch as raw machine arrays after the sensor names"""
+    names = "\n".join(batch.sensor_names).encode()
+    return b"".join(
+        (
+            COUNTS.pack(len(batch), len(names)),
+            names,
+            batch.ids_hi.tobytes(),
+            batch.ids_lo.tobytes(),
+            batch.timestamps.tobytes(),
+            batch.sensor_indices.tobytes(),
+            batch.values.tobytes(),
+        )
+    )
+
+
+def decode_columns(body: bytes) -> MessageBatch:
+    """Rebuilds the MessageBatch encoded by encode_columns"""
+    count, names_length = COUNTS.unpack_from(body)
+    offset = COUNTS.size + names_length
+    batch = MessageBatch()
+    names = body[COUNTS.size : offset].decode()
+    batch.sensor_names = names.split("\n") if names else []
+    batch.sensor_ids = {name: i for i, name in enumerate(batch.sensor_names)}
+    for column in ("ids_hi", "ids_lo", "timestamps", "sensor_indices", "values"):
+        values = getattr(batch, column)
+        end = offset + count * values.itemsize
+        values.frombytes(body[offset:end])
+        offset = end
+    return batch
+
+
+def _read_records(file: BinaryIO) -> Iterator[tuple[int, int, int, int]]:
+    """Yields the (kind, seq, body offset, body length) of the intact records of a segment
+    and stops at the first torn or corrupt one"""
+    while True:
+        start = file.tell()
+        header = file.read(RECORD.size)
+        if len(header) < RECORD.size:
+            file.seek(start)
+            return
+        crc, length, kind, seq = RECORD.unpack(header)
+        body = file.read(length)
+        if len(body) < length or zlib.crc32(body, zlib.crc32(header[4:])) != crc:
+            file.seek(start)
+            return
+        yield kind, seq, start + RECORD.size, length
+
+
+class WriteAheadLog:
+    """
+    The WriteAheadLog class is an append-only log of the batches the logging service has
+    received but not yet saved, kept as segment files in directory. append writes a batch
+    sequentially as one CRC-checked record of raw column arrays and returns its sequence
+    number; commit appends a small record marking every batch up to a sequence number as
+    saved. Records are forced to disk following the fsync_policy, as in FileRepository. Once
+    the current segment outgrows segment_bytes a new one is started, and each commit is a
+    checkpoint deleting the older segments holding only committed batches. On opening, replay
+    yields the batches that were never committed, with their original ids; a torn record at
+    the end of the log (a crash mid-append) is cut off. Column arrays are written in machine
+    byte order, the log is only meant to be read back on the same machine.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync_policy: FsyncPolicy = FsyncPolicy.EVERY_T_SECONDS,
+        fsync_every_rows: int = 1000,
+        fsync_interval: float = 0.05,
+        segment_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.directory: str = directory
+        self.fsync_policy: FsyncPolicy = fsync_policy
+        self.fsync_every_rows: int = fsync_every_rows
+        self.fsync_interval: float = fsync_interval
+        self.segment_bytes: int = segment_bytes
+        self.lock: threading.Lock = threading.Lock()
+        self.file: Optional[BinaryIO] = None
+        self.segments: list[tuple[str, int]] = []
+        self.pending: list[tuple[int, str, int, int]] = []
+        self.committed: int = 0
+        self.seq: int = 0
+        self.next_segment: int = 1
+        self.rows_since_sync: int = 0
+        self.last_sync: float = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _segment_paths(self) -> list[str]:
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(SUFFIX)
+        )
+
+    def _recover(self) -> None:
+        """Scans the segments for the last sequence number, the commit point and the batches
+        written after it, cutting off a torn tail and deleting segments left with no intact
+        record"""
+        for path in self._segment_paths():
+            number = os.path.basename(path)[: -len(SUFFIX)]
+            self.next_segment = max(self.next_segment, int(number) + 1)
+            last = self.seq
+            with open(path, "r+b") as file:
+                for kind, seq, offset, length in _read_records(file):
+                    if kind == COMMIT:
+                        self.committed = max(self.committed, seq)
+                    else:
+                        self.pending.append((seq, path, offset, length))
+                        last = max(last, seq)
+                end = file.tell()
+                if end < os.path.getsize(path):
+                    log.warning("wal_truncated", path=path, offset=end)
+                    file.truncate(end)
+            if not end:
+                os.remove(path)
+                continue
+            self.seq = last
+            self.segments.append((path, last))
+        self.pending = [entry for entry in self.pending if entry[0] > self.committed]
+
+    def replay(self) -> Iterator[tuple[int, MessageBatch]]:
+        """Yields the (seq, batch) of every batch appended before opening and never committed"""
+        for seq, path, offset, length in self.pending:
+            with open(path, "rb") as file:
+                file.seek(offset)
+                yield seq, decode_columns(file.read(length))
+        self.pending = []
+
+    def _open(self) -> BinaryIO:
+        if self.file is None:
+            # Numbered past every segment ever seen, so a live segment is never reopened
+            path = os.path.join(self.directory, f"{self.next_segment:020d}{SUFFIX}")
+            self.next_segment += 1
+            self.file = open(path, "ab")
+            self.segments.append((path, self.seq))
+        return self.file
+
+    def _sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.rows_since_sync = 0
+        self.last_sync = time.monotonic()
+
+    def _apply_fsync_policy(self) -> None:
+        if self.fsync_policy is FsyncPolicy.ALWAYS:
+            self._sync()
+        elif self.fsync_policy is FsyncPolicy.EVERY_N_ROWS:
+            if self.rows_since_sync >= self.fsync_every_rows:
+                self._sync()
+        elif self.fsync_policy is FsyncPolicy.EVERY_T_SECONDS:
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+        else:
+            self.file.flush()
+
+    def _write(self, kind: int, seq: int, body: bytes) -> None:
+        """Appends one record to the current segment. Must hold the lock."""
+        file = self._open()
+        header = RECORD.pack(0, len(body), kind, seq)[4:]
+        file.write(
+            struct.pack("<I", zlib.crc32(body, zlib.crc32(header))) + header + body
+        )
+        if kind == DATA:
+            # A commit may be below the batches of its segment, only data moves its last seq
+            path, last = self.segments[-1]
+            self.segments[-1] = (path, max(last, seq))
+
+    def append(self, batch: MessageBatch) -> int:
+        """Logs a received batch, returns its sequence number"""
+        body = encode_columns(batch)
+        with self.lock:
+            self.seq += 1
+            self._write(DATA, self.seq, body)
+            self.rows_since_sync += len(batch)
+            self._apply_fsync_policy()
+            return self.seq
+
+    def commit(self, seq: int) -> None:
+        """Marks every batch up to seq as saved and deletes the segments no longer needed"""
+        with self.lock:
+            if seq <= self.committed:
+                return
+            self.committed = seq
+            self._write(COMMIT, seq, b"")
+            self._apply_fsync_policy()
+            if self.file.tell() >= self.segment_bytes:
+                self._sync()
+                self.file.close()
+                self.file = None
+            self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """Deletes the closed segments whose batches are all committed. Must hold the lock."""
+        current = len(self.segments) - (1 if self.file is not None else 0)
+        while current > 0 and self.segments[0][1] <= self.committed:
+            path, _ = self.segments.pop(0)
+            os.remove(path)
+            current -= 1
+
+    def sync(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
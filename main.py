@@ -1,9 +1,27 @@
+import argparse
+import asyncio
+import signal
+import threading
+from typing import Optional
+
+from sensors.async_sensor import AsyncSensorsFactory
 from sensors.base_sensor import SameSensorFactory, SensorType, DifferentSensorsFactory
+from sensors.scheduler import SensorScheduler
+from utils.async_network import AsyncNetwork
 from utils.network import Network
+from utils.socket_network import SocketCollector, SocketNetwork, parse_address
+from logging_service.async_logging import AsyncLogging
 from logging_service.logging import Logging
-from service.repository.repository import FileRepository
-
-import concurrent.futures
+from logging_service.shutdown import shutdown, shutdown_async
+from logging_service.write_ahead_log import WriteAheadLog
+from logging_service.sharded_ingestion import ShardedIngestion
+from service.repository.composite_repository import CompositeRepository, Sink
+from service.repository.instrumented_repository import InstrumentedRepository
+from service.repository.repository import DatabaseRepository, FileRepository, Repository
+from utils.codec import BinaryCodec, Codec, TextCodec
+from utils.diagnostics import start_logging
+from utils.fair_network import FairNetwork, by_sensor_type
+from utils.metrics import NULL_METRICS, MetricsRegistry
 
 
 """
@@ -14,31 +32,233 @@ is 5 and a RepositoryStrategy object. It then creates a Logging object with the
 Network and RepositoryStrategy objects.
 The program then creates a list of sensors using the SensorsFactory class (SameSensorFactory and
 DifferentSensorsFactory are implemnted).
-The program then uses a ThreadPoolExecutor to start the logging and sensor threads concurrently.
+The sensors are registered with a SensorScheduler that fires every sensor on its own delay from a
+single thread, so any number of sensors can run alongside the logging thread.
+With --engine asyncio the same pipeline runs on an event loop instead: an AsyncNetwork, one
+coroutine per sensor and an AsyncLogging consumer that writes to the repository from an executor.
+With --engine processes the sensors are hash-partitioned into --shards shards, each running its
+sensors and its own Logging consumer in separate processes joined by a shared memory ring buffer.
+With --metrics-port the network, logging, sensor and repository metrics of the threads and asyncio
+engines are served on http://127.0.0.1:<port>/metrics. Diagnostic events are written to stderr by a
+background thread, at the level given with --log-level. With --fair the threads engine shares the
+network slots between sensor types by round robin instead of first come first served. With --mirror
+the data is also written to the given SQLite database, each repository written behind by its own
+thread through a CompositeRepository.
+The pipeline can also be split across processes or machines: --listen runs only the Logging
+consumer behind a collector accepting sensors on a TCP host:port or Unix socket path, and
+--connect runs only the sensors, sending to such a collector, both with the text codec.
+Every engine and the collector run until SIGINT or SIGTERM, then stop the sensors, drain the
+network and flush the last batches within --shutdown-timeout seconds. The processes engine does
+not support --wal, --mirror, --metrics-port or --fair. With --wal the received batches are first
+appended to a write-ahead log in the given directory, and the ones a crash left unsaved are
+saved on the next start.
 """
 
+SENSORS = {
+    SensorType.SensorA: 2,
+    SensorType.SensorB: 1,
+    SensorType.SensorC: 2,
+}
 
-if __name__ == "__main__":
-    network = Network(max_messages=5)
-    repository = FileRepository()
-    logging = Logging(repository=repository, network=network)
+
+def wait_for_signal() -> None:
+    """Blocks until SIGINT or SIGTERM is received"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+
+
+def close_repository(repository: Repository) -> None:
+    close = getattr(repository, "close", None)
+    if close is not None:
+        close()
+
+
+def run_threads(
+    codec: Codec,
+    repository: Repository,
+    metrics: MetricsRegistry = NULL_METRICS,
+    fair: bool = False,
+    wal: Optional[WriteAheadLog] = None,
+    shutdown_timeout: float = 10.0,
+) -> None:
+    if fair:
+        network = FairNetwork(
+            max_messages=5, metrics=metrics, codec=codec, flow_of=by_sensor_type
+        )
+    else:
+        network = Network(max_messages=5, metrics=metrics)
+    logging = Logging(
+        repository=repository, network=network, codec=codec, metrics=metrics, wal=wal
+    )
+    scheduler = SensorScheduler()
 
     # sensors = SameSensorFactory().create_sensors(
     #     network=network,
     #     sensor_type=SensorType.SensorB,
     #     number_of_sensors=5,
+    #     codec=codec,
+    #     scheduler=scheduler,
     # )
 
     sensors = DifferentSensorsFactory().create_sensors(
         network=network,
-        sensor_type={
-            SensorType.SensorA: 2,
-            SensorType.SensorB: 1,
-            SensorType.SensorC: 2,
-        },
+        sensor_type=SENSORS,
+        codec=codec,
+        scheduler=scheduler,
+        metrics=metrics,
     )
 
-    with concurrent.futures.ThreadPoolExecutor(6) as executor:
-        executor.submit(logging.start)
-        for sensor in sensors:
-            executor.submit(sensor.start)
+    logging.start()
+    scheduler.start()
+    wait_for_signal()
+    shutdown(logging, sensors, scheduler, timeout=shutdown_timeout)
+    close_repository(repository)
+
+
+def run_collector(
+    address: str,
+    codec: Codec,
+    repository: Repository,
+    metrics: MetricsRegistry = NULL_METRICS,
+    wal: Optional[WriteAheadLog] = None,
+    shutdown_timeout: float = 10.0,
+) -> None:
+    collector = SocketCollector(parse_address(address), max_messages=5, metrics=metrics)
+    collector.start()
+    logging = Logging(
+        repository=repository, network=collector, codec=codec, metrics=metrics, wal=wal
+    )
+    logging.start()
+    wait_for_signal()
+    shutdown(logging, timeout=shutdown_timeout)
+    collector.close()
+    close_repository(repository)
+
+
+def run_remote_sensors(
+    address: str, codec: Codec, metrics: MetricsRegistry = NULL_METRICS
+) -> None:
+    network = SocketNetwork(parse_address(address), metrics=metrics)
+    scheduler = SensorScheduler()
+    DifferentSensorsFactory().create_sensors(
+        network=network,
+        sensor_type=SENSORS,
+        codec=codec,
+        scheduler=scheduler,
+        metrics=metrics,
+    )
+    scheduler.start()
+    wait_for_signal()
+    scheduler.stop()
+    scheduler.join()
+    network.close()
+
+
+async def run_asyncio(
+    codec: Codec,
+    repository: Repository,
+    metrics: MetricsRegistry = NULL_METRICS,
+    shutdown_timeout: float = 10.0,
+) -> None:
+    network = AsyncNetwork(max_messages=5)
+    logging = AsyncLogging(
+        repository=repository, network=network, codec=codec, metrics=metrics
+    )
+    sensors = AsyncSensorsFactory().create_sensors(
+        network=network,
+        sensor_type=SENSORS,
+        codec=codec,
+        metrics=metrics,
+    )
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    consumer = asyncio.create_task(logging.run())
+    producers = [asyncio.create_task(sensor.run()) for sensor in sensors]
+    await stopping.wait()
+    await shutdown_async(
+        logging, consumer, sensors, producers, timeout=shutdown_timeout
+    )
+    close_repository(repository)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--engine", choices=["threads", "asyncio", "processes"], default="threads"
+    )
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument("--fair", action="store_true")
+    parser.add_argument("--mirror", default=None, metavar="DB_PATH")
+    parser.add_argument("--wal", default=None, metavar="DIRECTORY")
+    parser.add_argument("--shutdown-timeout", type=float, default=10.0)
+    remote = parser.add_mutually_exclusive_group()
+    remote.add_argument("--listen", default=None, metavar="ADDRESS")
+    remote.add_argument("--connect", default=None, metavar="ADDRESS")
+    parser.add_argument(
+        "--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO"
+    )
+    args = parser.parse_args()
+    if args.engine == "processes" and args.listen is None and args.connect is None:
+        # Every shard writes its own files, none of these apply to the shard processes
+        for flag, value in [
+            ("--wal", args.wal),
+            ("--mirror", args.mirror),
+            ("--metrics-port", args.metrics_port),
+            ("--fair", args.fair or None),
+        ]:
+            if value is not None:
+                parser.error(f"{flag} is not supported with --engine processes")
+
+    start_logging(level=args.log_level)
+
+    codec = BinaryCodec()
+    metrics = NULL_METRICS
+    if args.metrics_port is not None:
+        metrics = MetricsRegistry()
+        metrics.serve(port=args.metrics_port)
+    repository: Repository = FileRepository()
+    if args.mirror is not None:
+        repository = CompositeRepository(
+            [
+                Sink("file", repository, metrics=metrics),
+                Sink(
+                    "database", DatabaseRepository(db_name=args.mirror), metrics=metrics
+                ),
+            ]
+        )
+    repository = InstrumentedRepository(repository, metrics)
+    wal = WriteAheadLog(args.wal) if args.wal is not None else None
+    # Sensor processes intern names into their own registries, so only the self-describing
+    # text codec can be shared by independent processes
+    if args.listen is not None:
+        run_collector(
+            args.listen, TextCodec(), repository, metrics, wal, args.shutdown_timeout
+        )
+    elif args.connect is not None:
+        run_remote_sensors(args.connect, TextCodec(), metrics)
+    elif args.engine == "processes":
+        ingestion = ShardedIngestion(sensor_type=SENSORS, num_shards=args.shards)
+        ingestion.start()
+        try:
+            wait_for_signal()
+        finally:
+            ingestion.stop(timeout=args.shutdown_timeout)
+    elif args.engine == "asyncio":
+        asyncio.run(run_asyncio(codec, repository, metrics, args.shutdown_timeout))
+    else:
+        run_threads(
+            codec,
+            repository,
+            metrics,
+            fair=args.fair,
+            wal=wal,
+            shutdown_timeout=args.shutdown_timeout,
+        )
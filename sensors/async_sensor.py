@@ -0,0 +1,135 @@
+import random
+from typing import Optional
+
+from sensors.base_sensor import SensorType
+from sensors.reporting import ReportingPolicy
+from utils.async_network import AsyncNetwork
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import Codec, TextCodec
+from utils.metrics import NULL_METRICS, MetricsRegistry
+
+
+class AsyncSensor:
+    """
+    The AsyncSensor class is a coroutine-based sensor for the asyncio engine. It takes its delay,
+    value range and _generate_value from the SensorType it simulates, so an async sensor behaves
+    exactly like its threaded counterpart, but it costs one small object and one task instead of
+    an OS thread. It runs until stop_sensor is called. Like threaded sensors, it reports
+    through a Reporter of the type's (or the given) ReportingPolicy.
+    """
+
+    __slots__ = (
+        "network",
+        "sensor_type",
+        "name",
+        "codec",
+        "delay",
+        "value_range",
+        "value",
+        "timestamp",
+        "runing",
+        "clock",
+        "random",
+        "sent",
+        "dropped",
+        "suppressed",
+        "reporter",
+    )
+
+    def __init__(
+        self,
+        network: AsyncNetwork,
+        sensor_type: SensorType,
+        name: str,
+        codec: Optional[Codec] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        rng: Optional[random.Random] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+        reporting: Optional[ReportingPolicy] = None,
+    ):
+        self.network: AsyncNetwork = network
+        self.sensor_type: SensorType = sensor_type
+        self.name: str = name
+        self.codec: Codec = codec or TextCodec()
+        self.delay: float = sensor_type.value.delay
+        self.value_range: tuple[int, int] = sensor_type.value.value_range
+        self.value: int = 0
+        self.timestamp: float = 0
+        self.runing: bool = True
+        self.clock: Clock = clock
+        self.random: random.Random = rng if rng is not None else random
+        self.sent = metrics.counter("sensor_sent_total", "Messages sent", sensor=name)
+        self.dropped = metrics.counter(
+            "sensor_dropped_total", "Messages dropped by the network", sensor=name
+        )
+        self.suppressed = metrics.counter(
+            "sensor_suppressed_total",
+            "Readings held back by the reporting policy",
+            sensor=name,
+        )
+        self.reporter = (reporting or sensor_type.reporting).reporter()
+
+    def _generate_value(self) -> int:
+        return self.sensor_type.value._generate_value(self)
+
+    async def run(self, start_delay: tuple[float, float] = (1, 11)) -> None:
+        await self.clock.sleep_async(self.random.uniform(*start_delay))
+        while self.runing:
+            self.read_sensor_data()
+            await self.send_sensor_data()
+            await self.clock.sleep_async(self.delay)
+
+    def stop_sensor(self) -> None:
+        self.runing = False
+
+    def read_sensor_data(self) -> None:
+        self.timestamp = self.clock.time()
+        self.value = self._generate_value()
+
+    async def send_sensor_data(self) -> None:
+        report = self.reporter.offer(self.value, self.timestamp)
+        if report is None:
+            self.suppressed.inc()
+            return
+        encoded_message = self.codec.encode(self.name, *report)
+        if await self.network.send_message(encoded_message):
+            self.sent.inc()
+        else:
+            self.dropped.inc()
+
+    def __str__(self) -> str:
+        return f"AsyncSensor(type={self.sensor_type.name}, name={self.name}, value={self.value}, timestamp={self.timestamp}, delay={self.delay})"
+
+
+class AsyncSensorsFactory:
+    """
+    The AsyncSensorsFactory class creates AsyncSensor objects for the asyncio engine from the same
+    {SensorType: number of sensors} mapping used by DifferentSensorsFactory.
+    """
+
+    def create_sensors(
+        self,
+        network: AsyncNetwork,
+        sensor_type: dict[SensorType, int],
+        codec: Optional[Codec] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        seed: Optional[int] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+        reporting: Optional[dict[SensorType, ReportingPolicy]] = None,
+    ) -> list[AsyncSensor]:
+        rng = random.Random(seed) if seed is not None else None
+        reporting = reporting or {}
+        return [
+            AsyncSensor(
+                network,
+                k,
+                name=f"{k.name}_{i}",
+                codec=codec,
+                clock=clock,
+                rng=rng,
+                metrics=metrics,
+                reporting=reporting.get(k),
+            )
+            for k, v in sensor_type.items()
+            for i in range(v)
+        ]
@@ -1,10 +1,19 @@
 import random
-import time
-from typing import Protocol
+from typing import TYPE_CHECKING, Optional, Protocol
 from enum import Enum
 import threading
 
-from utils.network import Network
+from sensors.reporting import ALWAYS, ReportingPolicy
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import Codec, TextCodec
+from utils.diagnostics import get_logger
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import MessageSender
+
+if TYPE_CHECKING:
+    from sensors.scheduler import SensorScheduler
+
+log = get_logger(__name__).limit("message_dropped", per_second=1)
 
 
 class BaseSensor(Protocol):
@@ -14,6 +23,10 @@ class BaseSensor(Protocol):
     necessary methods to start and stop the sensor, retrieve and send sensor data.
     """
 
+    name: str
+    delay: int
+    runing: bool
+
     def run(self) -> None:
         """Starts the sensor"""
 
@@ -23,6 +36,9 @@ class BaseSensor(Protocol):
     def get_sensor_data(self) -> None:
         """Gets the sensor data"""
 
+    def read_sensor_data(self) -> None:
+        """Reads a new value and timestamp"""
+
     def send_sensor_data(self) -> None:
         """Sends the sensor data"""
 
@@ -34,150 +50,146 @@ class SensorFactory(Protocol):
     ensuring that they have the necessary methods to create sensors.
     """
 
-    def create_sensors(self, network: Network) -> list[BaseSensor]:
+    def create_sensors(self, network: MessageSender) -> list[BaseSensor]:
         """Creates a sensor"""
 
 
-class SensorTypeA(threading.Thread):
+class Sensor(threading.Thread):
     """
-    The SensorTypeA class is a subclass of the threading.Thread class and represents a sensor of type A.
-    It generates random values between -100 and 100 and sends them to a with a deley of 5 seconds
-    network using the Network class. It runs indefinitely until the stop_sensor method is called.
+    The Sensor class is a subclass of the threading.Thread class holding the behaviour shared by
+    every sensor type: it reads a random value within value_range, stamps it with the clock and
+    sends it to the network through the codec every delay seconds. Sensor types only set their
+    delay, value range and label. The clock and the random generator are injectable so runs can
+    be simulated and reproduced. Every sensor counts its sent and dropped messages in the given
+    MetricsRegistry, labelled with its name. Readings go through a Reporter of the sensor's
+    ReportingPolicy (the type's reporting unless one is given), which decides whether a reading
+    is sent; readings it holds back are counted as suppressed. stop_sensor wakes the sensor from
+    its pause, and once it returns from the pending send run exits without sending again.
     """
 
+    delay: int = 5
+    value_range: tuple[int, int] = (-100, 100)
+    label: str = ""
+    reporting: ReportingPolicy = ALWAYS
+
     def __init__(
         self,
-        network: Network,
-        name: str = "sensor_type_A",
+        network: MessageSender,
+        name: str,
+        codec: Optional[Codec] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        rng: Optional[random.Random] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+        reporting: Optional[ReportingPolicy] = None,
     ):
         super().__init__()
         self.timestamp: float = 0
         self.name: str = name
         self.value: int = 0
-        self.network: Network = network
-        self.delay: int = 5
+        self.network: MessageSender = network
+        self.codec: Codec = codec or TextCodec()
+        self.clock: Clock = clock
+        self.random: random.Random = rng if rng is not None else random
         self.runing: bool = True
+        self.condition: threading.Condition = threading.Condition()
+        self.sent = metrics.counter("sensor_sent_total", "Messages sent", sensor=name)
+        self.dropped = metrics.counter(
+            "sensor_dropped_total", "Messages dropped by the network", sensor=name
+        )
+        self.suppressed = metrics.counter(
+            "sensor_suppressed_total",
+            "Readings held back by the reporting policy",
+            sensor=name,
+        )
+        self.reporter = (reporting or self.reporting).reporter()
 
     def _generate_value(self) -> int:
-        return random.randint(-100, 100)
+        return self.random.randint(*self.value_range)
 
     def run(self) -> None:
-        print("Sensor A starting...")
-        time.sleep(random.randint(1, 11))
-        while True:
+        log.info("sensor_started", sensor=self.name, type=self.label)
+        self.pause(self.random.randint(1, 11))
+        while self.runing:
             self.read_sensor_data()
             self.send_sensor_data()
-            time.sleep(self.delay)
+            self.pause(self.delay)
+
+    def pause(self, seconds: float) -> None:
+        """Sleeps for seconds by the clock, returning early when the sensor is stopped"""
+        with self.condition:
+            if self.runing:
+                self.clock.wait_until(self.condition, self.clock.monotonic() + seconds)
 
     def stop_sensor(self) -> None:
-        print("Sensor A stopped")
-        self.runing = False
+        log.info("sensor_stopped", sensor=self.name, type=self.label)
+        with self.condition:
+            self.runing = False
+            self.condition.notify_all()
 
     def read_sensor_data(self) -> None:
-        self.timestamp = time.time()
+        self.timestamp = self.clock.time()
         self.value = self._generate_value()
 
     def send_sensor_data(self) -> None:
-        encoded_message = f"{self.name} {self.value} {self.timestamp}"
-        self.network.send_message(encoded_message=encoded_message)
+        report = self.reporter.offer(self.value, self.timestamp)
+        if report is None:
+            self.suppressed.inc()
+            return
+        encoded_message = self.codec.encode(self.name, *report)
+        if self.network.send_message(encoded_message=encoded_message):
+            self.sent.inc()
+        else:
+            self.dropped.inc()
+            log.warning("message_dropped", sensor=self.name)
 
     def __str__(self) -> str:
-        return f"SensorTypeA(name={self.name}, value={self.value}, timestamp={self.timestamp}, delay={self.delay})"
+        return f"{type(self).__name__}(name={self.name}, value={self.value}, timestamp={self.timestamp}, delay={self.delay})"
 
 
-class SensorTypeB(threading.Thread):
+class SensorTypeA(Sensor):
     """
-    The SensorTypeB class is a subclass of the threading.Thread class and represents a sensor of type B.
-    Its main functionalities are to generate random sensor data between 0 and 75, read and send sensor data to a network
-    with a delasy of 1 second using the Network class, and run continuously until stopped.
+    The SensorTypeA class is a subclass of the Sensor class and represents a sensor of type A.
+    It generates random values between -100 and 100 and sends them to a with a deley of 5 seconds
+    network using the Network class. It runs indefinitely until the stop_sensor method is called.
     """
 
-    def __init__(
-        self,
-        network: Network,
-        name: str = "sensor_type_B",
-    ):
-        super().__init__()
-        self.timestamp: int = 0
-        self.name: str = name
-        self.value: int = 0
-        self.network: Network = network
-        self.delay: int = 1
-        self.runing: bool = True
-
-    def _generate_value(self) -> int:
-        return random.randint(0, 75)
+    delay: int = 5
+    value_range: tuple[int, int] = (-100, 100)
+    label: str = "A"
 
-    def run(self) -> None:
-        print("Sensor B starting...")
-        time.sleep(random.randint(1, 11))
-        while True:
-            self.read_sensor_data()
-            self.send_sensor_data()
-            time.sleep(self.delay)
+    def __init__(self, network: MessageSender, name: str = "sensor_type_A", **kwargs):
+        super().__init__(network, name, **kwargs)
 
-    def stop_sensor(self) -> None:
-        print("Sensor B stopped")
-        self.runing = False
 
-    def read_sensor_data(self) -> None:
-        self.timestamp = time.time()
-        self.value = self._generate_value()
+class SensorTypeB(Sensor):
+    """
+    The SensorTypeB class is a subclass of the Sensor class and represents a sensor of type B.
+    Its main functionalities are to generate random sensor data between 0 and 75, read and send sensor data to a network
+    with a delasy of 1 second using the Network class, and run continuously until stopped.
+    """
 
-    def send_sensor_data(self) -> None:
-        encoded_message = f"{self.name} {self.value} {self.timestamp}"
-        self.network.send_message(encoded_message=encoded_message)
+    delay: int = 1
+    value_range: tuple[int, int] = (0, 75)
+    label: str = "B"
 
-    def __str__(self) -> str:
-        return f"SensorTypeA(name={self.name}, value={self.value}, timestamp={self.timestamp}, delay={self.delay})"
+    def __init__(self, network: MessageSender, name: str = "sensor_type_B", **kwargs):
+        super().__init__(network, name, **kwargs)
 
 
-class SensorTypeC(threading.Thread):
+class SensorTypeC(Sensor):
     """
-    The SensorTypeC class is a subclass of the threading.Thread class and represents a sensor of type C.
+    The SensorTypeC class is a subclass of the Sensor class and represents a sensor of type C.
     It generates random values within a range between -12 and 50, reads the sensor data, and sends it to
     a network using the Network class with a deley of 10 seconds. It runs on a separate thread and can be
     stopped using the stop_sensor() method.
     """
 
-    def __init__(
-        self,
-        network: Network,
-        name: str = "sensor_type_C",
-    ):
-        super().__init__()
-        self.timestamp: float = 0
-        self.name: str = name
-        self.value: int = 0
-        self.network: Network = network
-        self.delay: int = 10
-        self.runing: bool = True
-
-    def _generate_value(self) -> int:
-        return random.randint(-12, 50)
-
-    def run(self) -> None:
-        print("Sensor C starting...")
-        time.sleep(random.randint(1, 11))
-        while True:
-            self.read_sensor_data()
-            self.send_sensor_data()
-            time.sleep(self.delay)
-
-    def stop_sensor(self) -> None:
-        print("Sensor C stopped")
-        self.runing = False
+    delay: int = 10
+    value_range: tuple[int, int] = (-12, 50)
+    label: str = "C"
 
-    def read_sensor_data(self) -> None:
-        self.timestamp = time.time()
-        self.value = self._generate_value()
-
-    def send_sensor_data(self) -> None:
-        encoded_message = f"{self.name} {self.value} {self.timestamp}"
-        self.network.send_message(encoded_message=encoded_message)
-
-    def __str__(self) -> str:
-        return f"SensorTypeA(name={self.name}, value={self.value}, timestamp={self.timestamp}, delay={self.delay})"
+    def __init__(self, network: MessageSender, name: str = "sensor_type_C", **kwargs):
+        super().__init__(network, name, **kwargs)
 
 
 class SensorType(Enum):
@@ -185,6 +197,16 @@ class SensorType(Enum):
     SensorB = SensorTypeB
     SensorC = SensorTypeC
 
+    @property
+    def reporting(self) -> ReportingPolicy:
+        """The reporting policy of the sensors of the type that are not given one, ALWAYS
+        until another is set"""
+        return self.value.reporting
+
+    @reporting.setter
+    def reporting(self, policy: ReportingPolicy) -> None:
+        self.value.reporting = policy
+
 
 class SameSensorFactory:
     """
@@ -192,22 +214,40 @@ class SameSensorFactory:
     based on the specified sensor type and number of sensors. It uses the SensorType enum to
     determine the type of sensor to create and the number_of_sensors parameter to determine
     how many sensors to create. It returns a list of BaseSensor objects that can be used
-    to start, stop, retrieve and send sensor data.
+    to start, stop, retrieve and send sensor data. When a SensorScheduler is given the
+    sensors are registered with it instead of being started as threads. A seed gives all the
+    sensors one shared, seeded random generator, and metrics the registry they report to. A
+    reporting policy overrides the default one of the sensor type.
     """
 
     def create_sensors(
         self,
-        network: Network,
+        network: MessageSender,
         sensor_type: SensorType,
         number_of_sensors: int,
+        codec: Optional[Codec] = None,
+        scheduler: Optional["SensorScheduler"] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        seed: Optional[int] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+        reporting: Optional[ReportingPolicy] = None,
     ) -> list[BaseSensor]:
-        return [
+        rng = random.Random(seed) if seed is not None else None
+        sensors: list[BaseSensor] = [
             sensor_type.value(
                 network=network,
                 name=f"{sensor_type.name}_{i}",
+                codec=codec,
+                clock=clock,
+                rng=rng,
+                metrics=metrics,
+                reporting=reporting,
             )
             for i in range(number_of_sensors)
         ]
+        if scheduler is not None:
+            scheduler.register_many(sensors)
+        return sensors
 
 
 class DifferentSensorsFactory:
@@ -215,13 +255,38 @@ class DifferentSensorsFactory:
     The DifferentSensorsFactory class is responsible for creating different types of sensors
     based on the SensorType enum and the number of sensors required for each type.
     It returns a list of BaseSensor objects that can be used to start, stop, retrieve and send sensor data.
+    When a SensorScheduler is given the sensors are registered with it instead of being started as threads.
+    A seed gives all the sensors one shared, seeded random generator, and metrics the registry
+    they report to. reporting maps sensor types to the policy overriding their default one.
     """
 
     def create_sensors(
-        self, network: Network, sensor_type: dict[SensorType, int]
+        self,
+        network: MessageSender,
+        sensor_type: dict[SensorType, int],
+        codec: Optional[Codec] = None,
+        scheduler: Optional["SensorScheduler"] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        seed: Optional[int] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+        reporting: Optional[dict[SensorType, ReportingPolicy]] = None,
     ) -> list[BaseSensor]:
+        rng = random.Random(seed) if seed is not None else None
+        reporting = reporting or {}
         sensors: list[BaseSensor] = []
         for k, v in sensor_type.items():
             for i in range(v):
-                sensors.append(k.value(network, name=f"{k.name}_{i}"))
+                sensors.append(
+                    k.value(
+                        network,
+                        name=f"{k.name}_{i}",
+                        codec=codec,
+                        clock=clock,
+                        rng=rng,
+                        metrics=metrics,
+                        reporting=reporting.get(k),
+                    )
+                )
+        if scheduler is not None:
+            scheduler.register_many(sensors)
         return sensors
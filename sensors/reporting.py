@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Protocol
+
+Report = tuple[int, float]
+
+
+class Reporter(Protocol):
+    """
+    The Reporter class is a protocol for the per-sensor state of a reporting policy. offer is
+    called with every reading and returns the (value, timestamp) to send, or None to send
+    nothing this time.
+    """
+
+    def offer(self, value: int, timestamp: float) -> Optional[Report]:
+        """Returns the reading to send or None"""
+
+
+class ReportingPolicy(Protocol):
+    """
+    The ReportingPolicy class is a protocol for the configuration of how often a sensor
+    reports. A policy is shared by every sensor of a type; each sensor gets its own Reporter.
+    """
+
+    def reporter(self) -> Reporter:
+        """Returns a new Reporter holding the state of one sensor"""
+
+
+class AlwaysReporter:
+    __slots__ = ()
+
+    def offer(self, value: int, timestamp: float) -> Optional[Report]:
+        return value, timestamp
+
+
+@dataclass(frozen=True)
+class Always:
+    """The Always policy sends every reading, which is what sensors do by default."""
+
+    def reporter(self) -> Reporter:
+        return AlwaysReporter()
+
+
+class DeadbandReporter:
+    __slots__ = ("threshold", "heartbeat", "last_sent", "skipped")
+
+    def __init__(self, threshold: int, heartbeat: Optional[int]):
+        self.threshold: int = threshold
+        self.heartbeat: Optional[int] = heartbeat
+        self.last_sent: Optional[int] = None
+        self.skipped: int = 0
+
+    def offer(self, value: int, timestamp: float) -> Optional[Report]:
+        if (
+            self.last_sent is None
+            or abs(value - self.last_sent) > self.threshold
+            or (self.heartbeat is not None and self.skipped + 1 >= self.heartbeat)
+        ):
+            self.last_sent = value
+            self.skipped = 0
+            return value, timestamp
+        self.skipped += 1
+        return None
+
+
+@dataclass(frozen=True)
+class Deadband:
+    """
+    The Deadband policy sends a reading only when it differs from the last sent value by more
+    than threshold. With a heartbeat a reading is also sent once heartbeat intervals have gone
+    by without one, so consumers can tell a steady sensor from a dead one.
+    """
+
+    threshold: int
+    heartbeat: Optional[int] = None
+
+    def reporter(self) -> Reporter:
+        return DeadbandReporter(self.threshold, self.heartbeat)
+
+
+@dataclass(frozen=True)
+class SendOnChange(Deadband):
+    """The SendOnChange policy sends a reading whenever the value changes, and one every
+    heartbeat intervals otherwise."""
+
+    threshold: int = 0
+    heartbeat: Optional[int] = 10
+
+
+class Summary(Enum):
+    """The Summary enum defines which value a LocalAggregation reports for its readings."""
+
+    MEAN = "mean"
+    MIN = "min"
+    MAX = "max"
+    LAST = "last"
+
+
+class AggregationReporter:
+    __slots__ = ("readings", "summary", "count", "total", "min", "max")
+
+    def __init__(self, readings: int, summary: Summary):
+        self.readings: int = readings
+        self.summary: Summary = summary
+        self.count: int = 0
+        self.total: int = 0
+        self.min: int = 0
+        self.max: int = 0
+
+    def offer(self, value: int, timestamp: float) -> Optional[Report]:
+        if self.count == 0:
+            self.total = self.min = self.max = value
+        else:
+            self.total += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.count += 1
+        if self.count < self.readings:
+            return None
+        if self.summary is Summary.MEAN:
+            summary = round(self.total / self.count)
+        elif self.summary is Summary.MIN:
+            summary = self.min
+        elif self.summary is Summary.MAX:
+            summary = self.max
+        else:
+            summary = value
+        self.count = 0
+        return summary, timestamp
+
+
+@dataclass(frozen=True)
+class LocalAggregation:
+    """
+    The LocalAggregation policy collects readings on the sensor and sends one summary of
+    every `readings` of them (their rounded mean by default), stamped with the time of the
+    last one.
+    """
+
+    readings: int
+    summary: Summary = Summary.MEAN
+
+    def reporter(self) -> Reporter:
+        return AggregationReporter(self.readings, self.summary)
+
+
+ALWAYS = Always()
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import random
+import threading
+from typing import Optional
+
+from sensors.base_sensor import BaseSensor
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.diagnostics import get_logger
+
+log = get_logger(__name__).limit("sensor_failed", per_second=1, burst=10)
+
+
+class SensorScheduler(threading.Thread):
+    """
+    The SensorScheduler class is a subclass of the threading.Thread class that drives any number
+    of sensors from a single thread instead of one thread per sensor. Registered sensors are
+    kept in a heap ordered by their next due time; the thread sleeps until the earliest one is
+    due, reads and sends its data, and reschedules it after its own delay randomized by +/-
+    jitter (a fraction of the delay). Sensors whose runing flag is cleared by stop_sensor are
+    dropped the next time they come due. A sensor that raises while reading or sending (e.g. a
+    NetworkFullError) is logged and rescheduled, so it cannot stop the others. Time comes from
+    the given Clock; with a VirtualClock the scheduler jumps straight to the next due time, so a
+    simulation runs as fast as possible.
+    """
+
+    def __init__(
+        self,
+        jitter: float = 0.1,
+        start_delay: tuple[float, float] = (1, 11),
+        clock: Clock = SYSTEM_CLOCK,
+        rng: Optional[random.Random] = None,
+    ):
+        super().__init__(daemon=True)
+        self.clock: Clock = clock
+        self.random: random.Random = rng if rng is not None else random
+        self.jitter: float = jitter
+        self.start_delay: tuple[float, float] = start_delay
+        self.condition: threading.Condition = threading.Condition()
+        self.heap: list[tuple[float, int, BaseSensor]] = []
+        self.sequence = itertools.count()
+        self.runing: bool = True
+
+    def _push(self, due: float, sensor: BaseSensor) -> None:
+        heapq.heappush(self.heap, (due, next(self.sequence), sensor))
+
+    def _next_delay(self, sensor: BaseSensor) -> float:
+        if not self.jitter:
+            return sensor.delay
+        return sensor.delay * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+    def register(self, sensor: BaseSensor) -> None:
+        due = self.clock.monotonic() + self.random.uniform(*self.start_delay)
+        with self.condition:
+            self._push(due, sensor)
+            if self.heap[0][2] is sensor:
+                self.condition.notify()
+
+    def register_many(self, sensors: list[BaseSensor]) -> None:
+        for sensor in sensors:
+            self.register(sensor)
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.heap)
+
+    def stop(self) -> None:
+        with self.condition:
+            self.runing = False
+            self.condition.notify()
+
+    def _pop_due(self) -> Optional[BaseSensor]:
+        with self.condition:
+            while self.runing:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                due = self.heap[0][0]
+                if due <= self.clock.monotonic():
+                    return heapq.heappop(self.heap)[2]
+                self.clock.wait_until(self.condition, due)
+        return None
+
+    def run(self) -> None:
+        while True:
+            sensor = self._pop_due()
+            if sensor is None:
+                return
+            if not sensor.runing:
+                continue
+            try:
+                sensor.read_sensor_data()
+                sensor.send_sensor_data()
+            except Exception as e:
+                log.error(
+                    "sensor_failed", exc_info=e, sensor=getattr(sensor, "name", None)
+                )
+            with self.condition:
+                self._push(self.clock.monotonic() + self._next_delay(sensor), sensor)
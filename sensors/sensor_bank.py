@@ -0,0 +1,188 @@
+import itertools
+import random
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from sensors.base_sensor import SensorType
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import BinaryCodec, Codec, Encoded, TextCodec
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import MessageSender
+
+try:
+    import numpy as np
+
+    RECORD_DTYPE = np.dtype(
+        [("sensor_id", "<u4"), ("value", "<i2"), ("timestamp", "<f8")]
+    )
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from sensors.scheduler import SensorScheduler
+
+
+class SensorNameIndex(Sequence[str]):
+    """
+    The SensorNameIndex class is a compact, read-only sequence of the sensor names of a bank.
+    Names follow the "{prefix}_{i}" pattern used by the factories and are built on demand, so a
+    bank of a million sensors does not keep a million strings alive.
+    """
+
+    def __init__(self, prefix: str, size: int):
+        self.prefix: str = prefix
+        self.size: int = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("sensor index out of range")
+        return f"{self.prefix}_{index}"
+
+    def index(self, name: str, *args) -> int:
+        prefix, _, index = name.rpartition("_")
+        if prefix == self.prefix and index.isdigit() and int(index) < self.size:
+            return int(index)
+        raise ValueError(f"{name} is not in the sensor bank")
+
+
+class SensorBank:
+    """
+    The SensorBank class simulates a whole group of sensors of the same SensorType as arrays
+    instead of one object per sensor. Every read draws all values in one vectorized call within
+    the type's value_range (NumPy when installed, random.choices otherwise) and stamps them
+    with a single timestamp, and every send emits the group to the Network as packed batches of
+    up to chunk_size readings, one message each. With a BinaryCodec the sensor names are
+    interned as one range of consecutive ids, without building them, and the records are packed
+    straight from the id range and the value column. A bank has the name, delay and runing
+    attributes of a sensor, so a SensorScheduler can drive it. Sent and dropped readings are
+    counted in the given MetricsRegistry under the bank's name.
+    """
+
+    def __init__(
+        self,
+        network: MessageSender,
+        sensor_type: SensorType,
+        number_of_sensors: int,
+        codec: Optional[Codec] = None,
+        name: Optional[str] = None,
+        chunk_size: int = 1024,
+        seed: Optional[int] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ):
+        self.network: MessageSender = network
+        self.clock: Clock = clock
+        self.sensor_type: SensorType = sensor_type
+        self.name: str = name or sensor_type.name
+        self.names: SensorNameIndex = SensorNameIndex(self.name, number_of_sensors)
+        self.codec: Codec = codec or TextCodec()
+        self.delay: float = sensor_type.value.delay
+        self.value_range: tuple[int, int] = sensor_type.value.value_range
+        self.chunk_size: int = chunk_size
+        self.runing: bool = True
+        self.timestamp: float = 0
+        self.values: Sequence[int] = []
+        self.random = (
+            np.random.default_rng(seed) if np is not None else random.Random(seed)
+        )
+        self.sensor_ids: range = range(0)
+        if isinstance(self.codec, BinaryCodec):
+            first = self.codec.registry.intern_range(self.names)
+            self.sensor_ids = range(first, first + number_of_sensors)
+        self.sent = metrics.counter(
+            "sensor_sent_total", "Messages sent", sensor=self.name
+        )
+        self.dropped = metrics.counter(
+            "sensor_dropped_total", "Messages dropped by the network", sensor=self.name
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _generate_values(self) -> Sequence[int]:
+        low, high = self.value_range
+        if np is not None:
+            return self.random.integers(low, high + 1, size=len(self), dtype="<i2")
+        return self.random.choices(range(low, high + 1), k=len(self))
+
+    def stop_sensor(self) -> None:
+        self.runing = False
+
+    def read_sensor_data(self) -> None:
+        self.timestamp = self.clock.time()
+        self.values = self._generate_values()
+
+    def _encode_chunk(self, start: int, stop: int) -> Encoded:
+        values = self.values[start:stop]
+        if isinstance(self.codec, BinaryCodec):
+            if np is not None:
+                records = np.empty(stop - start, dtype=RECORD_DTYPE)
+                records["sensor_id"] = np.arange(
+                    self.sensor_ids[start], self.sensor_ids[start] + stop - start
+                )
+                records["value"] = values
+                records["timestamp"] = self.timestamp
+                return records.tobytes()
+            return self.codec.encode_columns(
+                self.sensor_ids[start:stop],
+                values,
+                itertools.repeat(self.timestamp, stop - start),
+            )
+        if np is not None:
+            values = values.tolist()
+        return self.codec.encode_many(
+            zip(self.names[start:stop], values, itertools.repeat(self.timestamp))
+        )
+
+    def send_sensor_data(self) -> None:
+        # Chunk by chunk, so the readings of exactly the chunks the network admits are counted
+        # as sent whichever chunks its policy drops; each chunk is one lock round-trip already
+        for start in range(0, len(self), self.chunk_size):
+            stop = min(start + self.chunk_size, len(self))
+            if self.network.send_message(self._encode_chunk(start, stop)):
+                self.sent.inc(stop - start)
+            else:
+                self.dropped.inc(stop - start)
+
+    def __str__(self) -> str:
+        return f"SensorBank(type={self.sensor_type.name}, name={self.name}, sensors={len(self)}, timestamp={self.timestamp}, delay={self.delay})"
+
+
+class SensorBankFactory:
+    """
+    The SensorBankFactory class creates one SensorBank per SensorType from the same
+    {SensorType: number of sensors} mapping used by DifferentSensorsFactory, optionally
+    registering the banks with a SensorScheduler.
+    """
+
+    def create_sensors(
+        self,
+        network: MessageSender,
+        sensor_type: dict[SensorType, int],
+        codec: Optional[Codec] = None,
+        scheduler: Optional["SensorScheduler"] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        seed: Optional[int] = None,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ) -> list[SensorBank]:
+        banks = [
+            SensorBank(
+                network,
+                k,
+                number_of_sensors=v,
+                codec=codec,
+                seed=None if seed is None else seed + i,
+                clock=clock,
+                metrics=metrics,
+            )
+            for i, (k, v) in enumerate(sensor_type.items())
+        ]
+        if scheduler is not None:
+            scheduler.register_many(banks)
+        return banks
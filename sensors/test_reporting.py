@@ -0,0 +1,122 @@
+import asyncio
+
+from sensors.async_sensor import AsyncSensorsFactory
+from sensors.base_sensor import DifferentSensorsFactory, SameSensorFactory, SensorType
+from sensors.reporting import (
+    ALWAYS,
+    Deadband,
+    LocalAggregation,
+    SendOnChange,
+    Summary,
+)
+from utils.async_network import AsyncNetwork
+from utils.metrics import MetricsRegistry
+from utils.network import Network
+
+
+def offer_all(policy, values):
+    reporter = policy.reporter()
+    return [reporter.offer(value, float(i)) for i, value in enumerate(values)]
+
+
+class TestReportingPolicies:
+    def test_always(self):
+        assert offer_all(ALWAYS, [1, 1]) == [(1, 0.0), (1, 1.0)]
+
+    def test_deadband(self):
+        sent = offer_all(Deadband(threshold=2), [10, 11, 12, 13, 9, 9])
+        assert sent == [(10, 0.0), None, None, (13, 3.0), (9, 4.0), None]
+
+    def test_send_on_change_with_heartbeat(self):
+        sent = offer_all(SendOnChange(heartbeat=3), [5, 5, 5, 5, 6, 6])
+        assert sent == [(5, 0.0), None, None, (5, 3.0), (6, 4.0), None]
+
+    def test_local_aggregation(self):
+        assert offer_all(LocalAggregation(readings=3), [1, 2, 4, 7, 7, 7]) == [
+            None,
+            None,
+            (2, 2.0),
+            None,
+            None,
+            (7, 5.0),
+        ]
+        assert offer_all(LocalAggregation(3, Summary.MAX), [1, 9, 4]) == [
+            None,
+            None,
+            (9, 2.0),
+        ]
+
+    def test_every_sensor_gets_its_own_state(self):
+        policy = SendOnChange(heartbeat=None)
+        first, second = policy.reporter(), policy.reporter()
+        assert first.offer(1, 0.0) == (1, 0.0)
+        assert second.offer(1, 0.0) == (1, 0.0)
+
+
+class TestSensorReporting:
+    def test_same_sensor_factory_policy(self):
+        metrics = MetricsRegistry()
+        network = Network(max_messages=100)
+        sensor = SameSensorFactory().create_sensors(
+            network=network,
+            sensor_type=SensorType.SensorB,
+            number_of_sensors=1,
+            metrics=metrics,
+            reporting=LocalAggregation(readings=5),
+        )[0]
+        for _ in range(10):
+            sensor.read_sensor_data()
+            sensor.send_sensor_data()
+        assert len(network) == 2
+        snapshot = metrics.snapshot()
+        assert snapshot['sensor_suppressed_total{sensor="SensorB_0"}'] == 8
+        assert snapshot['sensor_sent_total{sensor="SensorB_0"}'] == 2
+
+    def test_different_sensors_factory_policies_per_type(self):
+        network = Network(max_messages=100)
+        sensors = DifferentSensorsFactory().create_sensors(
+            network=network,
+            sensor_type={SensorType.SensorA: 1, SensorType.SensorC: 1},
+            reporting={SensorType.SensorA: Deadband(threshold=1000)},
+        )
+        for _ in range(4):
+            for sensor in sensors:
+                sensor.read_sensor_data()
+                sensor.send_sensor_data()
+        names = [message.rsplit(" ", 2)[0] for message in network.receive_many(100)]
+        assert names.count("SensorA_0") == 1
+        assert names.count("SensorC_0") == 4
+        assert SensorType.SensorC.reporting == ALWAYS
+
+    def test_sensor_type_default_policy(self):
+        network = Network(max_messages=100)
+        SensorType.SensorB.reporting = Deadband(threshold=1000)
+        try:
+            sensors = DifferentSensorsFactory().create_sensors(
+                network=network,
+                sensor_type={SensorType.SensorB: 1, SensorType.SensorC: 1},
+            )
+        finally:
+            SensorType.SensorB.reporting = ALWAYS
+        for _ in range(4):
+            for sensor in sensors:
+                sensor.read_sensor_data()
+                sensor.send_sensor_data()
+        names = [message.rsplit(" ", 2)[0] for message in network.receive_many(100)]
+        assert names.count("SensorB_0") == 1
+        assert names.count("SensorC_0") == 4
+
+    def test_async_sensor_policy(self):
+        async def send_all():
+            network = AsyncNetwork(max_messages=100)
+            sensor = AsyncSensorsFactory().create_sensors(
+                network=network,
+                sensor_type={SensorType.SensorB: 1},
+                reporting={SensorType.SensorB: LocalAggregation(readings=3)},
+            )[0]
+            for _ in range(6):
+                sensor.read_sensor_data()
+                await sensor.send_sensor_data()
+            return await network.receive_many(100, timeout=1)
+
+        assert len(asyncio.run(send_all())) == 2
@@ -0,0 +1,73 @@
+import time
+
+from sensors.base_sensor import SameSensorFactory, SensorType
+from sensors.scheduler import SensorScheduler
+from utils.network import Network, BackpressurePolicy
+
+
+class TestSensorScheduler:
+    def test_factory_registers_sensors(self):
+        scheduler = SensorScheduler()
+        sensors = SameSensorFactory().create_sensors(
+            network=Network(),
+            sensor_type=SensorType.SensorB,
+            number_of_sensors=50,
+            scheduler=scheduler,
+        )
+        assert len(scheduler) == 50
+        assert not any(sensor.is_alive() for sensor in sensors)
+
+    def test_fires_every_sensor_on_its_delay(self):
+        network = Network(max_messages=1000, policy=BackpressurePolicy.DROP_NEWEST)
+        scheduler = SensorScheduler(jitter=0, start_delay=(0, 0))
+        sensors = SameSensorFactory().create_sensors(
+            network=network,
+            sensor_type=SensorType.SensorB,
+            number_of_sensors=20,
+            scheduler=scheduler,
+        )
+        for sensor in sensors:
+            sensor.delay = 0.05
+        scheduler.start()
+        time.sleep(0.12)
+        scheduler.stop()
+        scheduler.join(timeout=1)
+        names = [message.rsplit(" ", 2)[0] for message in network.receive_many(1000)]
+        assert set(names) == {sensor.name for sensor in sensors}
+        assert len(names) >= 2 * len(sensors)
+
+    def test_stopped_sensor_is_dropped(self):
+        network = Network(max_messages=100, policy=BackpressurePolicy.DROP_NEWEST)
+        scheduler = SensorScheduler(jitter=0, start_delay=(0, 0))
+        sensor = SensorType.SensorA.value(network=network)
+        sensor.stop_sensor()
+        scheduler.register(sensor)
+        scheduler.start()
+        time.sleep(0.02)
+        scheduler.stop()
+        scheduler.join(timeout=1)
+        assert len(scheduler) == 0
+        assert len(network) == 0
+
+    def test_failing_sensor_does_not_stop_the_others(self):
+        network = Network(max_messages=1000, policy=BackpressurePolicy.DROP_NEWEST)
+        scheduler = SensorScheduler(jitter=0, start_delay=(0, 0))
+        failing, working = [SensorType.SensorA.value(network=network) for _ in range(2)]
+        failing.name, working.name = "SensorA_failing", "SensorA_working"
+        calls = []
+
+        def send_sensor_data():
+            calls.append(1)
+            raise RuntimeError("network down")
+
+        failing.send_sensor_data = send_sensor_data
+        for sensor in (failing, working):
+            sensor.delay = 0.01
+            scheduler.register(sensor)
+        scheduler.start()
+        time.sleep(0.1)
+        scheduler.stop()
+        scheduler.join(timeout=1)
+        names = {message.rsplit(" ", 2)[0] for message in network.receive_many(1000)}
+        assert names == {"SensorA_working"}
+        assert len(calls) >= 2
@@ -0,0 +1,105 @@
+import pytest
+
+from sensors import sensor_bank
+from sensors.base_sensor import SensorType
+from sensors.sensor_bank import SensorBank, SensorBankFactory
+from sensors.scheduler import SensorScheduler
+from utils.codec import BinaryCodec, TextCodec
+from utils.fair_network import FairNetwork, FlowConfig
+from utils.metrics import MetricsRegistry
+from utils.network import BackpressurePolicy, Network
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(sensor_bank, "np", None)
+    return request.param
+
+
+class TestSensorBank:
+    def test_names_are_a_compact_index(self):
+        bank = SensorBank(Network(), SensorType.SensorA, number_of_sensors=1_000_000)
+        assert len(bank.names) == 1_000_000
+        assert bank.names[0] == "SensorA_0"
+        assert bank.names[-1] == "SensorA_999999"
+        assert bank.names.index("SensorA_42") == 42
+
+    def test_binary_names_are_interned_as_a_range(self):
+        codec = BinaryCodec()
+        bank = SensorBank(
+            Network(), SensorType.SensorA, number_of_sensors=1_000_000, codec=codec
+        )
+        assert codec.registry.names == []
+        assert codec.registry.name(bank.sensor_ids[-1]) == "SensorA_999999"
+        assert codec.registry.intern("SensorA_42") == bank.sensor_ids[42]
+
+    def test_values_within_type_range(self, backend):
+        bank = SensorBank(Network(), SensorType.SensorC, number_of_sensors=5000, seed=1)
+        bank.read_sensor_data()
+        assert len(bank.values) == 5000
+        assert min(bank.values) >= -12 and max(bank.values) <= 50
+
+    def test_binary_emits_chunked_batches(self, backend):
+        codec = BinaryCodec()
+        network = Network(max_messages=10)
+        bank = SensorBank(
+            network,
+            SensorType.SensorB,
+            number_of_sensors=25,
+            codec=codec,
+            chunk_size=10,
+        )
+        bank.read_sensor_data()
+        bank.send_sensor_data()
+        payloads = network.receive_many(10)
+        assert len(payloads) == 3
+        readings = list(codec.decode_many(payloads))
+        assert [name for name, _, _ in readings] == list(bank.names)
+        assert [value for _, value, _ in readings] == list(bank.values)
+        assert {timestamp for _, _, timestamp in readings} == {bank.timestamp}
+
+    def test_counts_the_readings_of_the_admitted_chunks(self, backend):
+        metrics = MetricsRegistry()
+        network = FairNetwork(
+            max_messages=10,
+            policy=BackpressurePolicy.DROP_NEWEST,
+            flows={"SensorB_0": FlowConfig(rate=1.0, burst=0.0)},
+        )
+        bank = SensorBank(
+            network,
+            SensorType.SensorB,
+            number_of_sensors=25,
+            chunk_size=10,
+            metrics=metrics,
+        )
+        bank.read_sensor_data()
+        bank.send_sensor_data()
+        snapshot = metrics.snapshot()
+        assert snapshot['sensor_sent_total{sensor="SensorB"}'] == 15
+        assert snapshot['sensor_dropped_total{sensor="SensorB"}'] == 10
+
+    def test_text_codec(self, backend):
+        codec = TextCodec()
+        network = Network()
+        bank = SensorBank(network, SensorType.SensorA, number_of_sensors=3, codec=codec)
+        bank.read_sensor_data()
+        bank.send_sensor_data()
+        readings = list(codec.decode_many(network.receive_many(10)))
+        assert [name for name, _, _ in readings] == [
+            "SensorA_0",
+            "SensorA_1",
+            "SensorA_2",
+        ]
+
+    def test_factory_registers_banks(self):
+        scheduler = SensorScheduler()
+        banks = SensorBankFactory().create_sensors(
+            network=Network(),
+            sensor_type={SensorType.SensorA: 10, SensorType.SensorB: 20},
+            scheduler=scheduler,
+        )
+        assert [len(bank) for bank in banks] == [10, 20]
+        assert len(scheduler) == 2
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True)
+class Aggregate:
+    """Summary of the readings of one sensor inside the [start, start + duration) window"""
+
+    sensor_name: str
+    start: float
+    duration: float
+    count: int
+    min: int
+    max: int
+    mean: float
+    last: Optional[int] = None
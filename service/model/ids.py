@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+import uuid
+
+
+class IdGenerator:
+    """
+    The IdGenerator class produces monotonic, time-ordered 128 bit ids laid out like UUIDv7: a
+    48 bit millisecond timestamp, a 12 bit sequence counter and a 62 bit node value drawn once
+    per generator. Ids from one generator always increase, so they sort by creation time and
+    keep primary-key inserts sequential, and producing one costs a clock read and a few integer
+    operations instead of the os.urandom call behind uuid.uuid4.
+    """
+
+    _counter_bits = 12
+    _max_counter = (1 << _counter_bits) - 1
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.node: int = int.from_bytes(os.urandom(8), "big") >> 2
+        self.last_ms: int = 0
+        self.counter: int = 0
+
+    def next_int(self) -> int:
+        now_ms = time.time_ns() // 1_000_000
+        with self.lock:
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.counter = 0
+            elif self.counter < self._max_counter:
+                self.counter += 1
+            else:
+                # Sequence exhausted within this millisecond, borrow from the next one
+                self.last_ms += 1
+                self.counter = 0
+            return (
+                (self.last_ms & 0xFFFFFFFFFFFF) << 80
+                | 0x7 << 76
+                | self.counter << 64
+                | 0b10 << 62
+                | self.node
+            )
+
+    def next_id(self) -> uuid.UUID:
+        return uuid.UUID(int=self.next_int())
@@ -1,13 +1,156 @@
+from array import array
 from dataclasses import dataclass
+from typing import Iterable, Iterator, Union
 import uuid
 
+MessageId = Union[uuid.UUID, str]
 
-@dataclass
+Row = tuple[str, float, str, int]
+
+
+@dataclass(slots=True)
 class Message:
     sensor_name: str
     value: int
     timestamp: float
-    id: uuid.UUID
+    id: MessageId
 
     def __str__(self) -> str:
         return f"{self.id},{self.timestamp},{self.sensor_name},{self.value}"
+
+
+def _uuid_int(id: MessageId) -> int:
+    if isinstance(id, uuid.UUID):
+        return id.int
+    try:
+        return uuid.UUID(id).int
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(
+            f"message id {id!r} is not a UUID, a MessageBatch only holds UUID ids"
+        ) from None
+
+
+class MessageBatch:
+    """
+    The MessageBatch class stores a batch of readings column by column: 128 bit ids split in
+    two array('Q') halves, array('d') timestamps, array('h') values and array('I') indices
+    into a table of interned sensor names. Repositories can read the columns (or rows) directly
+    instead of walking one Message object per reading, iterating yields Message objects for
+    code that needs them.
+    """
+
+    __slots__ = (
+        "sensor_names",
+        "sensor_ids",
+        "sensor_indices",
+        "values",
+        "timestamps",
+        "ids_hi",
+        "ids_lo",
+    )
+
+    def __init__(self) -> None:
+        self.sensor_names: list[str] = []
+        self.sensor_ids: dict[str, int] = {}
+        self.sensor_indices: array = array("I")
+        self.values: array = array("h")
+        self.timestamps: array = array("d")
+        self.ids_hi: array = array("Q")
+        self.ids_lo: array = array("Q")
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message]) -> "MessageBatch":
+        """Builds a batch from messages whose ids are UUIDs or UUID strings; any other id
+        could not be given back as it was and raises ValueError"""
+        batch = cls()
+        for message in messages:
+            batch.append(
+                message.sensor_name,
+                message.value,
+                message.timestamp,
+                _uuid_int(message.id),
+            )
+        return batch
+
+    def _sensor_index(self, sensor_name: str) -> int:
+        index = self.sensor_ids.get(sensor_name)
+        if index is None:
+            index = self.sensor_ids[sensor_name] = len(self.sensor_names)
+            self.sensor_names.append(sensor_name)
+        return index
+
+    def append(self, sensor_name: str, value: int, timestamp: float, id: int) -> None:
+        self.sensor_indices.append(self._sensor_index(sensor_name))
+        self.values.append(value)
+        self.timestamps.append(timestamp)
+        self.ids_hi.append(id >> 64)
+        self.ids_lo.append(id & 0xFFFFFFFFFFFFFFFF)
+
+    def extend(self, other: "MessageBatch") -> None:
+        if other.sensor_names == self.sensor_names[: len(other.sensor_names)]:
+            self.sensor_indices.extend(other.sensor_indices)
+        else:
+            remap = [self._sensor_index(name) for name in other.sensor_names]
+            self.sensor_indices.extend(remap[i] for i in other.sensor_indices)
+        self.values.extend(other.values)
+        self.timestamps.extend(other.timestamps)
+        self.ids_hi.extend(other.ids_hi)
+        self.ids_lo.extend(other.ids_lo)
+
+    def after(self, id: int) -> "MessageBatch":
+        """Returns a batch of the readings whose id is greater than id"""
+        batch = MessageBatch()
+        for index, (hi, lo) in enumerate(zip(self.ids_hi, self.ids_lo)):
+            if (hi << 64) | lo > id:
+                batch.append(
+                    self.sensor_name(index),
+                    self.values[index],
+                    self.timestamps[index],
+                    (hi << 64) | lo,
+                )
+        return batch
+
+    def id(self, index: int) -> uuid.UUID:
+        return uuid.UUID(int=(self.ids_hi[index] << 64) | self.ids_lo[index])
+
+    def sensor_name(self, index: int) -> str:
+        return self.sensor_names[self.sensor_indices[index]]
+
+    def rows(self) -> Iterator[Row]:
+        """Yields (id, timestamp, sensor_name, value) tuples ready for insertion"""
+        names = self.sensor_names
+        for hi, lo, timestamp, index, value in zip(
+            self.ids_hi, self.ids_lo, self.timestamps, self.sensor_indices, self.values
+        ):
+            yield str(uuid.UUID(int=(hi << 64) | lo)), timestamp, names[index], value
+
+    def __getitem__(self, index: int) -> Message:
+        return Message(
+            sensor_name=self.sensor_name(index),
+            value=self.values[index],
+            timestamp=self.timestamps[index],
+            id=self.id(index),
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __bool__(self) -> bool:
+        return len(self.timestamps) > 0
+
+
+Messages = Union[list[Message], MessageBatch]
+
+
+def message_rows(messages: Messages) -> Iterator[Row]:
+    """Yields (id, timestamp, sensor_name, value) tuples for a list or a MessageBatch"""
+    if isinstance(messages, MessageBatch):
+        return messages.rows()
+    return (
+        (str(message.id), message.timestamp, message.sensor_name, message.value)
+        for message in messages
+    )
@@ -0,0 +1,23 @@
+import uuid
+
+from service.model.ids import IdGenerator
+
+
+class TestIdGenerator:
+    def test_ids_are_monotonic_and_unique(self):
+        generator = IdGenerator()
+        ids = [generator.next_int() for _ in range(10_000)]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_uuid_version_and_variant(self):
+        generator = IdGenerator()
+        id = generator.next_id()
+        assert isinstance(id, uuid.UUID)
+        assert id.version == 7
+        assert id.variant == uuid.RFC_4122
+
+    def test_string_ids_sort_by_creation(self):
+        generator = IdGenerator()
+        ids = [str(generator.next_id()) for _ in range(1000)]
+        assert ids == sorted(ids)
@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+
+from service.model.message import Message, MessageBatch, message_rows
+
+
+class TestMessage:
+    def test_message_is_slotted(self):
+        message = Message(sensor_name="sensor1", value=1, timestamp=1.0, id="1")
+        assert not hasattr(message, "__dict__")
+        with pytest.raises(AttributeError):
+            message.unknown = 1
+
+
+class TestMessageBatch:
+    def test_append_and_iterate(self):
+        batch = MessageBatch()
+        first, second = uuid.uuid4(), uuid.uuid4()
+        batch.append("sensor1", -10, 1.5, first.int)
+        batch.append("sensor2", 20, 2.5, second.int)
+        batch.append("sensor1", 30, 3.5, 3)
+        assert len(batch) == 3
+        assert batch.sensor_names == ["sensor1", "sensor2"]
+        assert list(batch.sensor_indices) == [0, 1, 0]
+        assert batch[0] == Message(
+            sensor_name="sensor1", value=-10, timestamp=1.5, id=first
+        )
+        assert [message.id for message in batch][:2] == [first, second]
+
+    def test_rows_match_message_rows(self):
+        messages = [
+            Message(sensor_name="sensor1", value=1, timestamp=1.0, id=uuid.uuid4()),
+            Message(sensor_name="sensor2", value=2, timestamp=2.0, id=uuid.uuid4()),
+        ]
+        batch = MessageBatch.from_messages(messages)
+        assert list(batch.rows()) == list(message_rows(messages))
+
+    def test_from_messages_keeps_uuid_strings_and_rejects_other_ids(self):
+        id = uuid.uuid4()
+        batch = MessageBatch.from_messages(
+            [Message(sensor_name="sensor1", value=1, timestamp=1.0, id=str(id))]
+        )
+        assert batch[0].id == id
+        for other in ("42", "sensor-1"):
+            with pytest.raises(ValueError):
+                MessageBatch.from_messages(
+                    [Message(sensor_name="sensor1", value=1, timestamp=1.0, id=other)]
+                )
+
+    def test_extend_remaps_sensor_indices(self):
+        left, right = MessageBatch(), MessageBatch()
+        left.append("a", 1, 1.0, 1)
+        right.append("b", 2, 2.0, 2)
+        right.append("a", 3, 3.0, 3)
+        left.extend(right)
+        assert [message.sensor_name for message in left] == ["a", "b", "a"]
+        assert list(left.values) == [1, 2, 3]
+
+    def test_after_keeps_later_ids(self):
+        batch = MessageBatch()
+        for id in (1, 2, 3):
+            batch.append(f"sensor{id}", id, float(id), id)
+        later = batch.after(1)
+        assert [(m.sensor_name, m.id.int) for m in later] == [
+            ("sensor2", 2),
+            ("sensor3", 3),
+        ]
+        assert not batch.after(3)
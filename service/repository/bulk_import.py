@@ -0,0 +1,197 @@
+import argparse
+import csv
+import gzip
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Iterator
+
+from service.model.message import Row
+from service.repository.repository import (
+    DatabaseRepository,
+    FileRepository,
+    FsyncPolicy,
+    Repository,
+    parse_row,
+    write_rows,
+)
+from utils.diagnostics import get_logger, start_logging, stop_logging
+
+log = get_logger(__name__).limit("invalid_row", per_second=1)
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+ParsedChunk = tuple[list[Row], int]
+
+
+@dataclass
+class ImportStats:
+    """Rows imported, malformed rows skipped, bytes read and duration of a bulk import"""
+
+    rows: int = 0
+    invalid: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows} rows ({self.invalid} invalid, {self.bytes / 2**20:.1f} MiB) in "
+            f"{self.seconds:.2f}s, {self.rows_per_second:,.0f} rows/s"
+        )
+
+
+def parse_lines(text: str) -> ParsedChunk:
+    """
+    Parses the "id,timestamp,sensor_name,value" CSV rows written by FileRepository into
+    (id, timestamp, sensor_name, value) tuples, returning them with the number of malformed
+    rows, which are skipped. Tuples rather than Messages keep the hand-off from worker
+    processes cheap to pickle.
+    """
+    rows: list[Row] = []
+    append = rows.append
+    invalid = 0
+    for line in text.splitlines():
+        if not line:
+            continue
+        # Only rows with a quoted sensor name need the csv module
+        fields = next(csv.reader([line])) if '"' in line else line.split(",")
+        try:
+            append(parse_row(fields))
+        except ValueError:
+            invalid += 1
+            log.warning("invalid_row", row=line[:80])
+    return rows, invalid
+
+
+def chunk_ranges(
+    path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES
+) -> Iterator[tuple[int, int]]:
+    """
+    Yields the (start, end) byte ranges splitting a CSV file into chunks of about chunk_bytes,
+    every boundary moved forward to the next line start so no row is split.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        start = 0
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                file.seek(end - 1)
+                end += len(file.readline()) - 1
+            end = min(end, size)
+            yield start, end
+            start = end
+
+
+def parse_range(path: str, start: int, end: int) -> ParsedChunk:
+    """Parses the rows of one byte range of a CSV file, in this or a worker process"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        return parse_lines(file.read(end - start).decode())
+
+
+def _parsed_chunks(
+    path: str, chunk_bytes: int, workers: int, stats: ImportStats
+) -> Iterator[ParsedChunk]:
+    """Yields the parsed chunks of a CSV file in file order, keeping at most two chunks per
+    worker in flight so memory stays bounded however large the file is."""
+    ranges = chunk_ranges(path, chunk_bytes)
+    if workers <= 1:
+        for start, end in ranges:
+            stats.bytes += end - start
+            yield parse_range(path, start, end)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight: deque[Future] = deque()
+        for start, end in ranges:
+            stats.bytes += end - start
+            in_flight.append(executor.submit(parse_range, path, start, end))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def _gzip_chunks(
+    path: str, chunk_bytes: int, stats: ImportStats
+) -> Iterator[ParsedChunk]:
+    """Yields the parsed chunks of a gzip-compressed segment, which can only be read in order"""
+    with gzip.open(path, "rb") as file:
+        rest = b""
+        while True:
+            block = file.read(chunk_bytes)
+            if not block:
+                break
+            stats.bytes += len(block)
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            rest = block[cut:]
+            yield parse_lines(block[:cut].decode())
+        if rest:
+            yield parse_lines(rest.decode())
+
+
+def import_csv(
+    path: str,
+    repository: Repository,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    workers: int = 1,
+) -> ImportStats:
+    """
+    Streams a FileRepository CSV file (or a gzip-compressed rotated segment) into repository
+    without going through the Network: the file is read in chunks of about chunk_bytes, each
+    chunk is parsed into one batch and written with a single save_rows (save_many for
+    repositories without one, such as InMemoryRepository). With workers > 1 plain files are
+    parsed in parallel by worker processes, each given a byte range, while this process writes
+    the batches in file order. Repositories with a bulk_load context
+    (DatabaseRepository) defer their index maintenance until the import ends.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    if os.fspath(path).endswith(".gz"):
+        chunks = _gzip_chunks(path, chunk_bytes, stats)
+    else:
+        chunks = _parsed_chunks(path, chunk_bytes, workers, stats)
+    bulk_load = getattr(repository, "bulk_load", None)
+    with bulk_load() if bulk_load is not None else nullcontext():
+        for rows, invalid in chunks:
+            write_rows(repository, rows)
+            stats.rows += len(rows)
+            stats.invalid += invalid
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import FileRepository CSV files into another repository"
+    )
+    parser.add_argument("sources", nargs="+")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--database", metavar="DB_PATH")
+    target.add_argument("--file", metavar="CSV_PATH")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-mib", type=int, default=DEFAULT_CHUNK_BYTES // 2**20)
+    args = parser.parse_args()
+
+    listener = start_logging(level="WARNING")
+    repository: Repository
+    if args.database is not None:
+        repository = DatabaseRepository(db_name=args.database)
+    else:
+        repository = FileRepository(file_path=args.file, fsync_policy=FsyncPolicy.NEVER)
+    for source in args.sources:
+        print(
+            source,
+            import_csv(source, repository, args.chunk_mib * 2**20, args.workers),
+        )
+    if hasattr(repository, "close"):
+        repository.close()
+    stop_logging(listener)
@@ -0,0 +1,292 @@
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, MessageBatch, Messages, Row
+from service.repository.repository import Repository, write_rows
+from service.repository.time_index import SensorSeries
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.metrics import NULL_METRICS, MetricsRegistry
+
+
+class LatestValue:
+    """The latest known reading of a sensor, trusted as the latest stored one until expires"""
+
+    __slots__ = ("message", "expires")
+
+    def __init__(self, message: Message, expires: float = 0.0):
+        self.message: Message = message
+        self.expires: float = expires
+
+
+class CachedWindow:
+    """The readings of a sensor from start onwards, read from storage and then kept current by
+    the writes going through the cache, trusted until expires"""
+
+    __slots__ = ("series", "start", "expires")
+
+    def __init__(self, series: SensorSeries, start: float, expires: float):
+        self.series: SensorSeries = series
+        self.start: float = start
+        self.expires: float = expires
+
+
+def _sensor_names(messages: Messages) -> set[str]:
+    if isinstance(messages, MessageBatch):
+        return set(messages.sensor_names)
+    return {message.sensor_name for message in messages}
+
+
+def _rows(messages: Messages) -> Iterable[Row]:
+    """Rows of the messages, keeping the ids of Message objects as they are"""
+    if isinstance(messages, MessageBatch):
+        return messages.rows()
+    return (
+        (message.id, message.timestamp, message.sensor_name, message.value)
+        for message in messages
+    )
+
+
+class CachedRepository:
+    """
+    The CachedRepository class wraps any repository with a read cache kept current by its own
+    writes, so the "current value of sensor X" and "last minutes of sensor Y" reads stop
+    reaching storage. Writes go to the wrapped repository first, then update a latest-value
+    table and the cached windows of their sensors in place (write-through), which keeps the
+    cache valid without invalidating it. A latest read from storage is trusted for ttl seconds,
+    write-through only moves it forward meanwhile. Range queries and aggregates starting less
+    than horizon seconds ago are answered from a per-sensor window: the sensor's readings from
+    the query start onwards, read once from storage and extended by every write, trimmed to the
+    horizon, and refilled once ttl seconds have passed; older ranges go to the wrapped
+    repository. query_group answers "last minutes of a group of sensors" by merging the
+    windows of its sensors, so a group costs one window per sensor and shares them with the
+    single sensor queries. At most max_windows windows are kept, the least recently used
+    evicted first, so a group only stays cached if it is no larger than max_windows. A
+    write racing with a fill keeps the fill from being cached, so the cache never misses a
+    write. Hits and misses of both caches are counted in the given MetricsRegistry, with their
+    hit ratio. Writes that do not go through the cache (another process, bulk_load) are only
+    seen once the entries expire, or after invalidate. Every other attribute is forwarded to
+    the wrapped repository.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        max_windows: int = 1024,
+        horizon: float = 3600.0,
+        ttl: float = 60.0,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ):
+        self.repository: Repository = repository
+        self.max_windows: int = max_windows
+        self.horizon: float = horizon
+        self.ttl: float = ttl
+        self.clock: Clock = clock
+        self.lock: threading.Lock = threading.Lock()
+        self.latest_values: dict[str, LatestValue] = {}
+        self.windows: OrderedDict[str, CachedWindow] = OrderedDict()
+        self.versions: dict[str, int] = {}
+        self.writing: dict[str, int] = {}
+        self.hits: dict[str, int] = {"latest": 0, "range": 0}
+        self.misses: dict[str, int] = {"latest": 0, "range": 0}
+        self.evicted: int = 0
+        for cache in self.hits:
+            metrics.counter(
+                "cache_hits_total",
+                "Reads answered by the cache",
+                lambda cache=cache: self.hits[cache],
+                cache=cache,
+            )
+            metrics.counter(
+                "cache_misses_total",
+                "Reads that went to the repository",
+                lambda cache=cache: self.misses[cache],
+                cache=cache,
+            )
+            metrics.gauge(
+                "cache_hit_ratio",
+                "Share of the reads answered by the cache",
+                lambda cache=cache: self.hit_ratio(cache),
+                cache=cache,
+            )
+        metrics.gauge(
+            "cache_windows", "Cached sensor windows", lambda: len(self.windows)
+        )
+        metrics.counter(
+            "cache_evictions_total",
+            "Windows evicted over max_windows or invalidated",
+            lambda: self.evicted,
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self.repository, name)
+
+    def hit_ratio(self, cache: str) -> float:
+        reads = self.hits[cache] + self.misses[cache]
+        return self.hits[cache] / reads if reads else 0.0
+
+    def _begin_write(self, sensor_names: Iterable[str]) -> None:
+        with self.lock:
+            for sensor_name in sensor_names:
+                self.versions[sensor_name] = self.versions.get(sensor_name, 0) + 1
+                self.writing[sensor_name] = self.writing.get(sensor_name, 0) + 1
+
+    def _end_write(self, sensor_names: Iterable[str]) -> None:
+        with self.lock:
+            for sensor_name in sensor_names:
+                self.writing[sensor_name] -= 1
+                if not self.writing[sensor_name]:
+                    del self.writing[sensor_name]
+
+    def _apply(self, rows: Iterable[Row]) -> None:
+        """Writes saved rows through to the latest-value table and the cached windows"""
+        newest: dict[str, Row] = {}
+        with self.lock:
+            windows = self.windows
+            touched: dict[str, CachedWindow] = {}
+            for row in rows:
+                id, timestamp, sensor_name, value = row
+                best = newest.get(sensor_name)
+                if best is None or timestamp >= best[1]:
+                    newest[sensor_name] = row
+                window = windows.get(sensor_name)
+                if window is not None and timestamp >= window.start:
+                    window.series.add(id, timestamp, value)
+                    touched[sensor_name] = window
+            for sensor_name, (id, timestamp, _, value) in newest.items():
+                latest = self.latest_values.get(sensor_name)
+                if latest is None or timestamp >= latest.message.timestamp:
+                    message = Message(
+                        sensor_name=sensor_name, value=value, timestamp=timestamp, id=id
+                    )
+                    if latest is None:
+                        self.latest_values[sensor_name] = LatestValue(message)
+                    else:
+                        latest.message = message
+            cutoff = self.clock.time() - self.horizon
+            for window in touched.values():
+                if window.start < cutoff:
+                    window.series.trim(cutoff)
+                    window.start = cutoff
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        if not messages:
+            return
+        sensor_names = _sensor_names(messages)
+        self._begin_write(sensor_names)
+        try:
+            self.repository.save_many(messages)
+            self._apply(_rows(messages))
+        finally:
+            self._end_write(sensor_names)
+
+    def save_rows(self, rows: Iterable[Row]) -> None:
+        """Saves (id, timestamp, sensor_name, value) rows through the save_rows of the wrapped
+        repository, or as Messages"""
+        rows = list(rows)
+        sensor_names = {row[2] for row in rows}
+        self._begin_write(sensor_names)
+        try:
+            write_rows(self.repository, rows)
+            self._apply(rows)
+        finally:
+            self._end_write(sensor_names)
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        now = self.clock.monotonic()
+        with self.lock:
+            latest = self.latest_values.get(sensor_name)
+            if latest is not None and latest.expires > now:
+                self.hits["latest"] += 1
+                return latest.message
+            self.misses["latest"] += 1
+        message = self.repository.latest(sensor_name)
+        with self.lock:
+            latest = self.latest_values.get(sensor_name)
+            if latest is not None:
+                # A write may have moved it past the stored one meanwhile
+                if message is None or latest.message.timestamp >= message.timestamp:
+                    message = latest.message
+                latest.message, latest.expires = message, now + self.ttl
+            elif message is not None:
+                self.latest_values[sensor_name] = LatestValue(message, now + self.ttl)
+        return message
+
+    def _window(self, sensor_name: str, start: float) -> Optional[CachedWindow]:
+        """Returns the cached window of the sensor covering start, filling it on a miss, or
+        None when start is beyond the horizon. A window filled while the sensor was written to
+        is returned without being cached."""
+        if start < self.clock.time() - self.horizon:
+            with self.lock:
+                self.misses["range"] += 1
+            return None
+        now = self.clock.monotonic()
+        with self.lock:
+            window = self.windows.get(sensor_name)
+            if window is not None and window.expires > now and start >= window.start:
+                self.windows.move_to_end(sensor_name)
+                self.hits["range"] += 1
+                return window
+            self.misses["range"] += 1
+            cacheable = sensor_name not in self.writing
+            version = self.versions.get(sensor_name, 0)
+        series = SensorSeries()
+        for message in self.repository.query(sensor_name, start, float("inf")):
+            series.add(message.id, message.timestamp, message.value)
+        window = CachedWindow(series, start, now + self.ttl)
+        with self.lock:
+            if cacheable and self.versions.get(sensor_name, 0) == version:
+                self.windows[sensor_name] = window
+                self.windows.move_to_end(sensor_name)
+                while len(self.windows) > self.max_windows:
+                    self.windows.popitem(last=False)
+                    self.evicted += 1
+        return window
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        window = self._window(sensor_name, start)
+        if window is None:
+            return self.repository.query(sensor_name, start, end)
+        with self.lock:
+            return window.series.query(sensor_name, start, end)
+
+    def query_group(
+        self, sensor_names: Iterable[str], start: float, end: float
+    ) -> list[Message]:
+        """Returns the readings of a group of sensors between start and end in timestamp order,
+        each sensor read like query, from its window while start is within the horizon
+        """
+        return list(
+            heapq.merge(
+                *(self.query(sensor_name, start, end) for sensor_name in sensor_names),
+                key=lambda message: message.timestamp,
+            )
+        )
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        window = self._window(sensor_name, start)
+        if window is None:
+            return self.repository.aggregate(sensor_name, start, end, bucket)
+        with self.lock:
+            return window.series.aggregate(sensor_name, start, end, bucket)
+
+    def invalidate(self, sensor_name: Optional[str] = None) -> None:
+        """Drops the cached entries of a sensor, or of every sensor, after writes that did not
+        go through the cache"""
+        with self.lock:
+            if sensor_name is None:
+                self.evicted += len(self.windows)
+                self.windows.clear()
+                self.latest_values.clear()
+                return
+            if self.windows.pop(sensor_name, None) is not None:
+                self.evicted += 1
+            self.latest_values.pop(sensor_name, None)
@@ -0,0 +1,237 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, Messages
+from service.repository.repository import Repository
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.diagnostics import get_logger
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import BackpressurePolicy, Network, NetworkFullError
+
+log = get_logger(__name__).limit("sink_write_failed", per_second=1)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    The RetryPolicy class defines how a sink retries a failed write: up to max_attempts
+    attempts in total, waiting initial_backoff seconds after the first failure and multiplier
+    times longer after each following one, capped at max_backoff.
+    """
+
+    max_attempts: int = 5
+    initial_backoff: float = 0.1
+    max_backoff: float = 5.0
+    multiplier: float = 2.0
+
+    def delays(self) -> Iterator[float]:
+        delay = self.initial_backoff
+        for _ in range(self.max_attempts - 1):
+            yield delay
+            delay = min(self.max_backoff, delay * self.multiplier)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class Sink(threading.Thread):
+    """
+    The Sink class is a daemon thread writing behind one repository of a CompositeRepository.
+    Batches wait in a bounded queue of queue_size batches, a Network whose BackpressurePolicy
+    decides what happens when the sink falls behind: BLOCK by default, so no batch is lost at
+    the cost of stalling the writers, while a sink that may lose batches (a cache, a dashboard)
+    opts in to DROP_OLDEST or DROP_NEWEST. Failed writes are retried following the RetryPolicy
+    and given up afterwards, counted in given_up. Queue depth, lag (age of the oldest batch not
+    yet written), dropped batches, written rows, retries, failures and write latency are
+    exported to the MetricsRegistry labelled with the sink name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        repository: Repository,
+        queue_size: int = 64,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        retry: RetryPolicy = RetryPolicy(),
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ):
+        super().__init__(name=f"sink-{name}", daemon=True)
+        self.sink_name: str = name
+        self.repository: Repository = repository
+        self.queue: Network = Network(
+            max_messages=queue_size, policy=policy, clock=clock
+        )
+        self.retry: RetryPolicy = retry
+        self.clock: Clock = clock
+        self.runing: bool = True
+        self.condition: threading.Condition = threading.Condition()
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.timed_out: int = 0
+        self.given_up: int = 0
+        self.in_flight: Optional[float] = None
+        metrics.gauge(
+            "sink_queue_depth", "Batches waiting", lambda: len(self.queue), sink=name
+        )
+        metrics.gauge(
+            "sink_lag_seconds", "Age of the oldest unwritten batch", self.lag, sink=name
+        )
+        metrics.counter(
+            "sink_dropped_total",
+            "Batches dropped by a full queue",
+            lambda: self.queue.dropped + self.timed_out,
+            sink=name,
+        )
+        self.rows = metrics.counter("sink_rows_total", "Rows written", sink=name)
+        self.retries = metrics.counter(
+            "sink_retries_total", "Retried writes", sink=name
+        )
+        self.failures = metrics.counter(
+            "sink_failures_total", "Batches given up", sink=name
+        )
+        self.save_latency = metrics.histogram(
+            "sink_save_seconds", "Duration of successful writes", sink=name
+        )
+
+    def submit(self, method: str, payload) -> bool:
+        """Queues a write of payload through the repository method, returns False if dropped"""
+        try:
+            sent = self.queue.send_message((self.clock.monotonic(), method, payload))
+        except NetworkFullError:
+            self.timed_out += 1
+            return False
+        with self.condition:
+            # A batch dropped on the way in is counted by queue.dropped as well
+            self.submitted += 1
+        return sent
+
+    @property
+    def pending(self) -> int:
+        """Batches submitted and neither written, given up nor dropped. Must hold condition."""
+        return self.submitted - self.completed - self.queue.dropped
+
+    def lag(self) -> float:
+        with self.queue.lock:
+            oldest = self.queue.buffer[self.queue.head][0] if self.queue.size else None
+        if self.in_flight is not None:
+            oldest = self.in_flight
+        return 0.0 if oldest is None else self.clock.monotonic() - oldest
+
+    def _write(self, method: str, payload) -> bool:
+        """Writes payload, retrying it, returns False if the batch was given up"""
+        delays = self.retry.delays()
+        while True:
+            try:
+                started = time.perf_counter()
+                getattr(self.repository, method)(payload)
+                self.save_latency.record(time.perf_counter() - started)
+                self.rows.inc(len(payload))
+                return True
+            except Exception as e:
+                delay = next(delays, None)
+                if delay is None or not self.runing:
+                    self.failures.inc()
+                    log.error("sink_write_failed", exc_info=e, sink=self.sink_name)
+                    return False
+                self.retries.inc()
+                self.clock.sleep(delay)
+
+    def run(self) -> None:
+        while self.runing or len(self.queue):
+            item = self.queue.receive_message(timeout=0.05)
+            if item is None:
+                continue
+            self.in_flight, method, payload = item
+            written = self._write(method, payload)
+            with self.condition:
+                self.in_flight = None
+                self.completed += 1
+                if not written:
+                    self.given_up += 1
+                self.condition.notify_all()
+
+    def wait_drained(self, timeout: Optional[float] = None) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending <= 0, timeout)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Writes what is queued (abandoning retries) and stops the thread"""
+        self.runing = False
+        self.join(timeout)
+
+
+class CompositeRepository:
+    """
+    The CompositeRepository class fans every write out to several repositories, each behind
+    its own Sink (bounded write-behind queue and worker thread), so save_many only queues the
+    batch and a slow or failing sink does not hold back the others or the Logging consumer
+    until its queue is full; then it blocks them, unless the sink opted in to a lossy policy.
+    save_rollups is fanned out to the sinks whose repository supports it. Reads go to the
+    repository of query_sink (the first sink by default); being written behind, they may lag
+    the latest writes. flush waits until every queue is drained and close also stops the
+    workers and closes the repositories.
+    """
+
+    def __init__(self, sinks: list[Sink], query_sink: Optional[str] = None):
+        if not sinks:
+            raise ValueError("a CompositeRepository needs at least one sink")
+        self.sinks: dict[str, Sink] = {sink.sink_name: sink for sink in sinks}
+        self.query_repository = self.sinks[query_sink or sinks[0].sink_name].repository
+        for sink in sinks:
+            sink.start()
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        if not messages:
+            return
+        for sink in self.sinks.values():
+            sink.submit("save_many", messages)
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        if not aggregates:
+            return
+        for sink in self.sinks.values():
+            if hasattr(sink.repository, "save_rollups"):
+                sink.submit("save_rollups", aggregates)
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        return self.query_repository.query(sensor_name, start, end)
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        return self.query_repository.latest(sensor_name)
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        return self.query_repository.aggregate(sensor_name, start, end, bucket)
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        return self.query_repository.rollups(sensor_name, duration, start, end)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every sink has written its queue. Returns False on timeout, and once a
+        sink has given up a batch, since that batch is not saved anywhere it was meant to be:
+        a write-ahead log is then never committed past it and replays it on the next start.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        drained = True
+        for sink in self.sinks.values():
+            remaining = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            drained = sink.wait_drained(remaining) and drained
+        return drained and not any(sink.given_up for sink in self.sinks.values())
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        for sink in self.sinks.values():
+            sink.stop(timeout)
+            if hasattr(sink.repository, "close"):
+                sink.repository.close()
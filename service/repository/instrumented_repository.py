@@ -0,0 +1,69 @@
+import time
+from typing import Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, Messages
+from service.repository.repository import Repository
+from utils.metrics import NULL_METRICS, MetricsRegistry
+
+
+class InstrumentedRepository:
+    """
+    The InstrumentedRepository class wraps any repository and records, labelled with the
+    repository name (its class name by default), the saved rows and the latency of save_many
+    and of the QueryRepository reads in a MetricsRegistry. Every other attribute (flush, close,
+    ...) is forwarded to the wrapped repository.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        metrics: MetricsRegistry = NULL_METRICS,
+        name: Optional[str] = None,
+    ):
+        self.repository: Repository = repository
+        self.metrics: MetricsRegistry = metrics
+        name = name or type(repository).__name__
+        self.rows = metrics.counter(
+            "repository_rows_total", "Rows saved", repository=name
+        )
+        self.save_latency = metrics.histogram(
+            "repository_save_seconds", "Duration of save_many", repository=name
+        )
+        self.query_latency = metrics.histogram(
+            "repository_query_seconds",
+            "Duration of query, latest and aggregate",
+            repository=name,
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self.repository, name)
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        started = time.perf_counter()
+        self.repository.save_many(messages)
+        self.save_latency.record(time.perf_counter() - started)
+        self.rows.inc(len(messages))
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        started = time.perf_counter()
+        messages = self.repository.query(sensor_name, start, end)
+        self.query_latency.record(time.perf_counter() - started)
+        return messages
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        started = time.perf_counter()
+        message = self.repository.latest(sensor_name)
+        self.query_latency.record(time.perf_counter() - started)
+        return message
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        started = time.perf_counter()
+        aggregates = self.repository.aggregate(sensor_name, start, end, bucket)
+        self.query_latency.record(time.perf_counter() - started)
+        return aggregates
@@ -1,11 +1,30 @@
+import csv
+import gzip
 import os
+import re
+import shutil
+import time
 import threading
-from typing import Protocol
+import uuid
+from contextlib import contextmanager
+from enum import Enum
+from queue import Queue
+from typing import Iterable, Iterator, Optional, Protocol, TextIO
 from dataclasses import dataclass, field
 import sqlite3
-from queue import Queue
 
-from service.model.message import Message
+from service.model.aggregate import Aggregate
+from service.model.message import Message, Messages, Row, message_rows
+from service.repository.time_index import TimeSeriesIndex
+from utils.diagnostics import get_logger
+
+log = (
+    get_logger(__name__)
+    .limit("invalid_message", per_second=1)
+    .limit("invalid_row", per_second=1)
+)
+
+_NEEDS_QUOTES = re.compile(r'[,"\r\n]')
 
 
 class Repository(Protocol):
@@ -18,61 +37,591 @@ class Repository(Protocol):
     def save(self, message: Message) -> None:
         """Saves the data to the repository"""
 
+    def save_many(self, messages: Messages) -> None:
+        """Saves a list of messages or a MessageBatch to the repository in a single write"""
+
+
+class QueryRepository(Protocol):
+    """
+    The QueryRepository class is a protocol that defines the read side of a repository:
+    time range lookups, the latest reading and bucketed aggregates for a single sensor.
+    Ranges include both start and end, and buckets are aligned to start.
+    """
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        """Returns the readings of a sensor between start and end, ordered by timestamp"""
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        """Returns the most recent reading of a sensor"""
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        """Returns min/max/mean/count of a sensor for every non-empty bucket in the range"""
+
+
+class RollupRepository(Protocol):
+    """
+    The RollupRepository class is a protocol that defines how windowed aggregates computed by
+    the logging service are stored and read back, one Aggregate per sensor, resolution
+    (duration) and window start.
+    """
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        """Saves closed rollup windows"""
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        """Returns the windows of a resolution starting between start and end, ordered by start"""
+
+
+def _select_rollups(
+    aggregates: Iterable[Aggregate],
+    sensor_name: str,
+    duration: float,
+    start: float,
+    end: float,
+) -> list[Aggregate]:
+    # A window saved again (a WAL replay re-saves the windows it closes) replaces the earlier
+    # copy, like the INSERT OR REPLACE of the database
+    windows = {
+        aggregate.start: aggregate
+        for aggregate in aggregates
+        if aggregate.sensor_name == sensor_name
+        and aggregate.duration == duration
+        and start <= aggregate.start <= end
+    }
+    return [windows[window_start] for window_start in sorted(windows)]
+
+
+ROLLUP_COLUMNS = (
+    "sensor_name",
+    "start",
+    "duration",
+    "count",
+    "min",
+    "max",
+    "mean",
+    "last",
+)
+
+
+def _parse_rollup(row: list[str]) -> Aggregate:
+    sensor_name, start, duration, count, min_value, max_value, mean, last = row
+    return Aggregate(
+        sensor_name=sensor_name,
+        start=float(start),
+        duration=float(duration),
+        count=int(count),
+        min=int(min_value),
+        max=int(max_value),
+        mean=float(mean),
+        # csv writes None as an empty field, files written before that hold "None"
+        last=None if last in ("", "None") else int(last),
+    )
+
+
+def format_row(id: str, timestamp: float, sensor_name: str, value: int) -> str:
+    """Formats a row as a CSV line, quoting the sensor name like the csv module when it
+    contains a comma, a quote or a line break"""
+    if _NEEDS_QUOTES.search(sensor_name):
+        sensor_name = '"' + sensor_name.replace('"', '""') + '"'
+    return f"{id},{timestamp},{sensor_name},{value}\n"
+
+
+def parse_row(fields: list[str]) -> Row:
+    """Parses the fields of a CSV row written by format_row, raises ValueError if malformed"""
+    id, timestamp, sensor_name, value = fields
+    return id, float(timestamp), sensor_name, int(value)
+
+
+def read_rows(path: str) -> Iterator[Row]:
+    """Yields the rows of a CSV data file, gzip-compressed if its name ends with .gz, skipping
+    malformed rows"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as file:
+        for fields in csv.reader(file):
+            try:
+                yield parse_row(fields)
+            except ValueError:
+                if fields:
+                    log.warning("invalid_row", path=path, row=",".join(fields)[:80])
+
+
+def _last_row(path: str, tail_bytes: int = 4096) -> Optional[Row]:
+    """Returns the last well-formed row of a data file, None if it has none or does not exist.
+    Only the tail of an uncompressed file is read"""
+    if not os.path.exists(path):
+        return None
+    if path.endswith(".gz"):
+        last = None
+        for last in read_rows(path):
+            pass
+        return last
+    with open(path, "rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        file.seek(max(0, size - tail_bytes))
+        lines = file.read().decode("utf-8", errors="replace").splitlines()
+    if size > tail_bytes:
+        # The first line is cut
+        lines = lines[1:]
+    for fields in reversed(list(csv.reader(lines))):
+        try:
+            return parse_row(fields)
+        except ValueError:
+            continue
+    return None
+
+
+def write_rows(repository: Repository, rows: list[Row]) -> None:
+    """Saves (id, timestamp, sensor_name, value) rows through the save_rows of repository,
+    building Messages only for repositories without one"""
+    save_rows = getattr(repository, "save_rows", None)
+    if save_rows is not None:
+        save_rows(rows)
+    else:
+        repository.save_many(
+            [
+                Message(sensor_name, value, timestamp, id)
+                for id, timestamp, sensor_name, value in rows
+            ]
+        )
+
+
+class FsyncPolicy(Enum):
+    """
+    The FsyncPolicy enum defines when the FileRepository forces written rows to disk: never
+    (left to the OS), after every fsync_every_rows rows, after fsync_interval seconds, or
+    after every save call.
+    """
+
+    NEVER = "never"
+    EVERY_N_ROWS = "every_n_rows"
+    EVERY_T_SECONDS = "every_t_seconds"
+    ALWAYS = "always"
+
 
 @dataclass
 class FileRepository:
     """
     The FileRepository class is responsible for saving Message objects to a text file format.
+    The file handle is kept open behind a lock and rows go through a buffer of buffer_size
+    bytes, the fsync_policy decides how often buffered rows are forced to disk. When
+    rotate_max_bytes or rotate_interval is set the current file is closed and renamed to a
+    timestamped segment once it grows past the size or outlives the time window, and with
+    compress_rotated the closed segments are gzip-compressed by a background thread. The first
+    query loads the rotated segments (compressed or not) and the current file into a
+    TimeSeriesIndex that is kept up to date with every later write. Sensor names holding a
+    comma, quote or line break are quoted as in CSV. Rollup windows are appended to a separate
+    CSV file, rollup_file_path (the data file path with a .rollups suffix by default); a window
+    saved again, as after a WAL replay, is appended once more and the last copy wins on read.
+    Rows are only appended, so saving a row twice writes it twice; last_id gives the id of the
+    last row written, which lets a WAL replay skip the readings that are already in the file.
     """
 
     file_path: str = "./sonsor_data.csv"
+    buffer_size: int = 64 * 1024
+    fsync_policy: FsyncPolicy = FsyncPolicy.ALWAYS
+    fsync_every_rows: int = 1000
+    fsync_interval: float = 1.0
+    rotate_max_bytes: Optional[int] = None
+    rotate_interval: Optional[float] = None
+    compress_rotated: bool = False
+    rollup_file_path: Optional[str] = None
+    _index: Optional[TimeSeriesIndex] = field(default=None, init=False, repr=False)
+    _file: Optional[TextIO] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+    _bytes_written: int = field(default=0, init=False, repr=False)
+    _rows_since_sync: int = field(default=0, init=False, repr=False)
+    _last_sync: float = field(default=0.0, init=False, repr=False)
+    _segment_started: float = field(default=0.0, init=False, repr=False)
+    _segment_index: int = field(default=0, init=False, repr=False)
+    _compress_queue: Optional[Queue] = field(default=None, init=False, repr=False)
+    _compressor: Optional[threading.Thread] = field(
+        default=None, init=False, repr=False
+    )
 
-    def save(self, message: Message) -> None:
-        if not message.sensor_name or not message.value or not message.timestamp:
-            print("Message data is invalid")
+    def _to_row(self, id: str, timestamp: float, sensor_name: str, value: int) -> str:
+        if not sensor_name or not value or not timestamp:
+            log.warning("invalid_message", id=id, sensor=sensor_name, value=value)
             # raise ValueError("Message data is invalid")
-        with open(self.file_path, "a") as file:
-            file.write(
-                f"{message.id},{message.timestamp},{message.sensor_name},{message.value}\n"
+        return format_row(id, timestamp, sensor_name, value)
+
+    def _open(self) -> TextIO:
+        if self._file is None:
+            self._file = open(self.file_path, "a", buffering=self.buffer_size)
+            self._bytes_written = self._file.tell()
+            self._segment_started = self._last_sync = time.monotonic()
+        return self._file
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._rows_since_sync = 0
+        self._last_sync = time.monotonic()
+
+    def _apply_fsync_policy(self) -> None:
+        if self.fsync_policy is FsyncPolicy.ALWAYS:
+            self._sync()
+        elif self.fsync_policy is FsyncPolicy.EVERY_N_ROWS:
+            if self._rows_since_sync >= self.fsync_every_rows:
+                self._sync()
+        elif self.fsync_policy is FsyncPolicy.EVERY_T_SECONDS:
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _should_rotate(self) -> bool:
+        if self.rotate_max_bytes is not None:
+            if self._bytes_written >= self.rotate_max_bytes:
+                return True
+        if self.rotate_interval is not None:
+            if time.monotonic() - self._segment_started >= self.rotate_interval:
+                return True
+        return False
+
+    def _rotate(self) -> None:
+        self._sync()
+        self._file.close()
+        self._file = None
+        root, ext = os.path.splitext(os.fspath(self.file_path))
+        self._segment_index += 1
+        segment_path = (
+            f"{root}.{time.strftime('%Y%m%dT%H%M%S')}.{self._segment_index:04d}{ext}"
+        )
+        os.replace(self.file_path, segment_path)
+        if self.compress_rotated:
+            self._compress_in_background(segment_path)
+
+    def _compress_in_background(self, segment_path: str) -> None:
+        if self._compressor is None:
+            self._compress_queue = Queue()
+            self._compressor = threading.Thread(
+                target=self._compress_segments, daemon=True
             )
+            self._compressor.start()
+        self._compress_queue.put(segment_path)
+
+    def _compress_segments(self) -> None:
+        while True:
+            segment_path = self._compress_queue.get()
+            if segment_path is None:
+                return
+            try:
+                with open(segment_path, "rb") as source:
+                    with gzip.open(f"{segment_path}.gz", "wb") as target:
+                        shutil.copyfileobj(source, target)
+                os.remove(segment_path)
+            except OSError as e:
+                log.error("compression_failed", exc_info=e, path=segment_path)
+
+    def _write(self, rows: list[Row]) -> None:
+        lines = [self._to_row(*row) for row in rows]
+        text = "".join(lines)
+        with self._lock:
+            file = self._open()
+            file.write(text)
+            # Bytes like the tell() the count starts from, a sensor name may not be ASCII
+            self._bytes_written += len(text.encode(file.encoding))
+            self._rows_since_sync += len(lines)
+            self._apply_fsync_policy()
+            if self._should_rotate():
+                self._rotate()
+            if self._index is not None:
+                self._index.add_many(rows)
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        if not messages:
+            return
+        self._write(list(message_rows(messages)))
+
+    def save_rows(self, rows: Iterable[Row]) -> None:
+        """Saves (id, timestamp, sensor_name, value) rows without building Messages"""
+        rows = list(rows)
+        if rows:
+            self._write(rows)
+
+    def _segment_paths(self) -> list[str]:
+        """Returns the rotated segments of the data file, a segment still being compressed
+        by its uncompressed path"""
+        root, ext = os.path.splitext(os.fspath(self.file_path))
+        directory, prefix = os.path.split(root)
+        pattern = re.compile(
+            re.escape(prefix) + r"\.\d{8}T\d{6}\.\d{4}" + re.escape(ext) + r"(\.gz)?$"
+        )
+        names = set(os.listdir(directory or "."))
+        return [
+            os.path.join(directory, name)
+            for name in sorted(names)
+            if pattern.match(name)
+            and not (name.endswith(".gz") and name[: -len(".gz")] in names)
+        ]
+
+    def _read_segment(self, path: str) -> Iterator[Row]:
+        try:
+            yield from read_rows(path)
+        except FileNotFoundError:
+            # Compressed and removed since it was listed
+            yield from read_rows(f"{path}.gz")
+
+    def _load_index(self) -> TimeSeriesIndex:
+        with self._lock:
+            if self._index is None:
+                if self._file is not None:
+                    self._file.flush()
+                index = TimeSeriesIndex()
+                for path in self._segment_paths():
+                    index.add_many(self._read_segment(path))
+                if os.path.exists(self.file_path):
+                    index.add_many(read_rows(os.fspath(self.file_path)))
+                self._index = index
+            return self._index
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        return self._load_index().query(sensor_name, start, end)
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        return self._load_index().latest(sensor_name)
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        return self._load_index().aggregate(sensor_name, start, end, bucket)
+
+    def last_id(self) -> Optional[str]:
+        """Returns the id of the last row written to the current file, or to the newest rotated
+        segment when the current file is empty, None if there is none or it is not a UUID
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            row = _last_row(os.fspath(self.file_path))
+            for path in reversed(self._segment_paths()):
+                if row is not None:
+                    break
+                row = _last_row(path) or _last_row(f"{path}.gz")
+        if row is None:
+            return None
+        try:
+            return str(uuid.UUID(row[0]))
+        except ValueError:
+            return None
+
+    def _rollup_path(self) -> str:
+        return self.rollup_file_path or f"{self.file_path}.rollups"
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        if not aggregates:
+            return
+        rows = [
+            [getattr(aggregate, column) for column in ROLLUP_COLUMNS]
+            for aggregate in aggregates
+        ]
+        with self._lock:
+            with open(self._rollup_path(), "a", newline="") as file:
+                csv.writer(file).writerows(rows)
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        with self._lock:
+            if not os.path.exists(self._rollup_path()):
+                return []
+            with open(self._rollup_path(), "r", newline="") as file:
+                rows = list(csv.reader(file))
+        return _select_rollups(
+            (_parse_rollup(row) for row in rows), sensor_name, duration, start, end
+        )
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Forces the written rows to disk; synchronous, so timeout is not used"""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+        if self._compressor is not None:
+            self._compress_queue.put(None)
+            self._compressor.join()
+            self._compressor = None
 
 
 @dataclass
 class InMemoryRepository:
     """
     The InMemoryRepository class is responsible for storing Message objects in an in-memory list.
-    It provides a save method to add new messages to the list.
+    It provides a save method to add new messages to the list, and indexes them in a
+    TimeSeriesIndex to answer queries. Rollup windows are kept in the aggregates list, where
+    the last copy of a window saved twice wins.
     """
 
     data: list[Message] = field(default_factory=list)
+    index: TimeSeriesIndex = field(default_factory=TimeSeriesIndex, repr=False)
+    aggregates: list[Aggregate] = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        self._index_from(0)
+
+    def _index_from(self, start: int) -> None:
+        self.index.add_many(
+            (message.id, message.timestamp, message.sensor_name, message.value)
+            for message in self.data[start:]
+        )
 
     def save(self, message: Message) -> None:
-        self.data.append(message)
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        start = len(self.data)
+        self.data.extend(messages)
+        self._index_from(start)
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        return self.index.query(sensor_name, start, end)
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        return self.index.latest(sensor_name)
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        return self.index.aggregate(sensor_name, start, end, bucket)
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        self.aggregates.extend(aggregates)
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        return _select_rollups(self.aggregates, sensor_name, duration, start, end)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available before the timeout expires."""
 
 
 class ConnectionPool:
     """
     The ConnectionPool class provides a way to manage a pool of SQLite database connections.
     It limits the number of connections that can be created and allows for reusing connections
-    to improve performance.
+    to improve performance. Acquiring a connection blocks (up to timeout seconds) while all
+    max_connections are in use, and every thread gets back the connection it used last when
+    it is idle, so a writer thread keeps a warm connection and page cache. New connections are
+    opened with the configured journal_mode (WAL lets readers run alongside the writer) and
+    synchronous level.
     """
 
-    def __init__(self, max_connections: int):
+    def __init__(
+        self,
+        max_connections: int,
+        timeout: Optional[float] = 5.0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
         self.max_connections = max_connections
-        self.connections: Queue[sqlite3.Connection] = Queue(maxsize=max_connections)
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.connections: list[sqlite3.Connection] = []
         self.number_of_connections = 0
+        self._db_names: dict[sqlite3.Connection, str] = {}
+        self._affinity = threading.local()
+        self._condition = threading.Condition(threading.Lock())
 
-    def get_connection(self, db_name: str) -> sqlite3.Connection:
-        if self.number_of_connections == self.max_connections:
-            return None
-        if self.number_of_connections < self.max_connections:
-            self.number_of_connections += 1
-            self.connections.put(sqlite3.connect(db_name))
-        return self.connections.get()
+    def _connect(self, db_name: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            db_name, timeout=self.busy_timeout, check_same_thread=False
+        )
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _take_idle(self, db_name: str) -> Optional[sqlite3.Connection]:
+        preferred = getattr(self._affinity, "connection", None)
+        if preferred is not None and preferred in self.connections:
+            if self._db_names[preferred] == str(db_name):
+                self.connections.remove(preferred)
+                return preferred
+        for conn in reversed(self.connections):
+            if self._db_names[conn] == str(db_name):
+                self.connections.remove(conn)
+                return conn
+        return None
+
+    def get_connection(
+        self, db_name: str, timeout: Optional[float] = None
+    ) -> sqlite3.Connection:
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                conn = self._take_idle(db_name)
+                if conn is not None:
+                    break
+                if self.number_of_connections < self.max_connections:
+                    self.number_of_connections += 1
+                    break
+                if self.connections:
+                    # Idle connections to another database are closed to make room
+                    stale = self.connections.pop(0)
+                    del self._db_names[stale]
+                    stale.close()
+                    self.number_of_connections -= 1
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No connection available after {timeout} seconds"
+                    )
+                self._condition.wait(remaining)
+        if conn is None:
+            try:
+                conn = self._connect(db_name)
+            except sqlite3.Error:
+                with self._condition:
+                    self.number_of_connections -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._db_names[conn] = str(db_name)
+        self._affinity.connection = conn
+        return conn
 
     def release_connection(self, conn: sqlite3.Connection) -> None:
-        self.number_of_connections -= 1
-        self.connections.put(conn)
+        with self._condition:
+            self.connections.append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(
+        self, db_name: str, timeout: Optional[float] = None
+    ) -> Iterator[sqlite3.Connection]:
+        conn = self.get_connection(db_name, timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
+
+    def close_all(self) -> None:
+        with self._condition:
+            for conn in self.connections:
+                del self._db_names[conn]
+                conn.close()
+                self.number_of_connections -= 1
+            self.connections.clear()
 
     def __str__(self) -> str:
         return f"ConnectionPool(max_connections={self.max_connections}, connections={self.number_of_connections})"
@@ -83,49 +632,239 @@ class DatabaseRepository:
     """
     The DatabaseRepository class provides a way to save sensor data to an SQLite database.
     It uses a ConnectionPool to manage a pool of database connections and limit the number of
-    connections that can be created. It also initializes the database if it does not exist.
-    NOTE: I have not properly test this class yet.
+    connections that can be created. It initializes the schema (table and the
+    (sensor_name, timestamp) index) on first use and writes batches with executemany inside a
+    single transaction. Queries are answered by SQLite through the same index. Rollup windows
+    go to the sensors_rollups table, keyed by sensor, duration and start. bulk_load defers the
+    index maintenance of large imports to a single rebuild. Readings whose id is already stored
+    are skipped, so saving a batch again (a write-ahead log replay) is harmless.
     """
 
     db_name: str = "./sensors_data.db"
     connection_pool: ConnectionPool = field(default_factory=lambda: ConnectionPool(5))
-    db_exists: bool = os.path.exists(db_name)
+    initialized: bool = field(default=False, init=False)
+    _init_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+    _loading: threading.local = field(
+        default_factory=threading.local, init=False, repr=False, compare=False
+    )
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Yields the connection held by a bulk_load of this thread, else a pooled one"""
+        conn = getattr(self._loading, "connection", None)
+        if conn is not None:
+            yield conn
+            return
+        with self.connection_pool.connection(self.db_name) as conn:
+            yield conn
 
     def initialize_database(self) -> None:
         try:
-            with self.connection_pool.get_connection(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
+            with self.connection_pool.connection(self.db_name) as conn:
+                with conn:
+                    conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS sensors_data (
+                            id TEXT PRIMARY KEY,
+                            timestamp REAL,
+                            sensor_name TEXT,
+                            value INTEGER
+                        )
                     """
-                    CREATE TABLE IF NOT EXISTS sensors_data (
-                        id TEXT PRIMARY KEY,
-                        timestamp REAL,
-                        sensor_name TEXT,
-                        value INTEGER
                     )
-                """
-                )
-                conn.commit()
-            self.connection_pool.release_connection(conn)
+                    conn.execute(
+                        """
+                        CREATE INDEX IF NOT EXISTS idx_sensors_data_sensor_timestamp
+                        ON sensors_data (sensor_name, timestamp)
+                    """
+                    )
+                    conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS sensors_rollups (
+                            sensor_name TEXT,
+                            duration REAL,
+                            start REAL,
+                            count INTEGER,
+                            min INTEGER,
+                            max INTEGER,
+                            mean REAL,
+                            last INTEGER,
+                            PRIMARY KEY (sensor_name, duration, start)
+                        )
+                    """
+                    )
+            self.initialized = True
         except sqlite3.Error as e:
-            print(f"Error while initializing database: {e}")
+            log.error(
+                "database_initialization_failed", exc_info=e, db_name=self.db_name
+            )
+
+    def _ensure_initialized(self) -> None:
+        if self.initialized:
+            return
+        with self._init_lock:
+            if not self.initialized:
+                self.initialize_database()
 
     def save(self, message: Message) -> None:
-        if not self.db_exists:
-            self.initialize_database()
-            self.db_exists = True
-        with self.connection_pool.get_connection(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO sensors_data (id, timestamp, sensor_name, value)
-                VALUES (?, ?, ?, ?)
-            """,
-                (
-                    str(message.id),
-                    message.timestamp,
-                    message.sensor_name,
-                    message.value,
-                ),
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        if not messages:
+            return
+        self.save_rows(message_rows(messages))
+
+    def save_rows(self, rows: Iterable[Row]) -> None:
+        """Saves (id, timestamp, sensor_name, value) rows without building Messages"""
+        self._ensure_initialized()
+        with self._connection() as conn:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO sensors_data (id, timestamp, sensor_name, value)
+                    VALUES (?, ?, ?, ?)
+                """,
+                    rows,
+                )
+
+    @contextmanager
+    def bulk_load(self, cache_kib: int = 256 * 1024) -> Iterator[None]:
+        """
+        Drops the (sensor_name, timestamp) index for the duration of a bulk load, so inserts
+        only append to the table and its primary key, and rebuilds it in one sorted pass at the
+        end. One pooled connection is held for the whole load: the saves and queries of the
+        loading thread go through it, and its page cache grows to cache_kib meanwhile, keeping
+        the primary key pages in memory. Queries of other threads run without the index until
+        the load ends, so they fall back to full table scans.
+        """
+        self._ensure_initialized()
+        with self.connection_pool.connection(self.db_name) as conn:
+            cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+            conn.execute(f"PRAGMA cache_size=-{cache_kib}")
+            with conn:
+                conn.execute("DROP INDEX IF EXISTS idx_sensors_data_sensor_timestamp")
+            self._loading.connection = conn
+            try:
+                yield
+            finally:
+                self._loading.connection = None
+                conn.execute(f"PRAGMA cache_size={cache_size}")
+                with conn:
+                    conn.execute(
+                        """
+                        CREATE INDEX IF NOT EXISTS idx_sensors_data_sensor_timestamp
+                        ON sensors_data (sensor_name, timestamp)
+                    """
+                    )
+
+    def _read(self, sql: str, parameters: tuple) -> list[tuple]:
+        self._ensure_initialized()
+        with self._connection() as conn:
+            return conn.execute(sql, parameters).fetchall()
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        rows = self._read(
+            """
+            SELECT id, timestamp, sensor_name, value FROM sensors_data
+            WHERE sensor_name = ? AND timestamp BETWEEN ? AND ?
+            ORDER BY timestamp
+        """,
+            (sensor_name, start, end),
+        )
+        return [
+            Message(id=id, timestamp=timestamp, sensor_name=sensor_name, value=value)
+            for id, timestamp, sensor_name, value in rows
+        ]
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        rows = self._read(
+            """
+            SELECT id, timestamp, sensor_name, value FROM sensors_data
+            WHERE sensor_name = ? ORDER BY timestamp DESC LIMIT 1
+        """,
+            (sensor_name,),
+        )
+        if not rows:
+            return None
+        id, timestamp, sensor_name, value = rows[0]
+        return Message(id=id, timestamp=timestamp, sensor_name=sensor_name, value=value)
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        rows = self._read(
+            """
+            SELECT CAST((timestamp - ?) / ? AS INTEGER) AS bucket,
+                COUNT(*), MIN(value), MAX(value), AVG(value)
+            FROM sensors_data
+            WHERE sensor_name = ? AND timestamp BETWEEN ? AND ?
+            GROUP BY bucket ORDER BY bucket
+        """,
+            (start, bucket, sensor_name, start, end),
+        )
+        return [
+            Aggregate(
+                sensor_name=sensor_name,
+                start=start + number * bucket,
+                duration=bucket,
+                count=count,
+                min=min_value,
+                max=max_value,
+                mean=mean,
+            )
+            for number, count, min_value, max_value, mean in rows
+        ]
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        if not aggregates:
+            return
+        self._ensure_initialized()
+        with self._connection() as conn:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO sensors_rollups
+                        (sensor_name, duration, start, count, min, max, mean, last)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        (
+                            aggregate.sensor_name,
+                            aggregate.duration,
+                            aggregate.start,
+                            aggregate.count,
+                            aggregate.min,
+                            aggregate.max,
+                            aggregate.mean,
+                            aggregate.last,
+                        )
+                        for aggregate in aggregates
+                    ),
+                )
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        rows = self._read(
+            """
+            SELECT start, count, min, max, mean, last FROM sensors_rollups
+            WHERE sensor_name = ? AND duration = ? AND start BETWEEN ? AND ?
+            ORDER BY start
+        """,
+            (sensor_name, duration, start, end),
+        )
+        return [
+            Aggregate(
+                sensor_name=sensor_name,
+                start=window_start,
+                duration=duration,
+                count=count,
+                min=min_value,
+                max=max_value,
+                mean=mean,
+                last=last,
             )
-            conn.commit()
+            for window_start, count, min_value, max_value, mean, last in rows
+        ]
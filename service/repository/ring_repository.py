@@ -0,0 +1,289 @@
+import threading
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, MessageId, Messages, Row, message_rows
+from service.repository.repository import Repository, _select_rollups, write_rows
+from utils.clock import SYSTEM_CLOCK, Clock
+
+
+class SensorRing:
+    """
+    Circular timestamp and value columns preallocated for the capacity most recent readings of
+    a single sensor, oldest first from head. disorder counts the adjacent readings that are out
+    of timestamp order, so range lookups know when they can binary search.
+    """
+
+    __slots__ = ("capacity", "timestamps", "values", "ids", "head", "size", "disorder")
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.timestamps: array = array("d", bytes(8 * capacity))
+        self.values: array = array("h", bytes(2 * capacity))
+        self.ids: list[Optional[MessageId]] = [None] * capacity
+        self.head: int = 0
+        self.size: int = 0
+        self.disorder: int = 0
+
+    def slot(self, position: int) -> int:
+        """Returns the slot of the reading at position, counted from the oldest"""
+        return (self.head + position) % self.capacity
+
+    def append(self, id: MessageId, timestamp: float, value: int) -> None:
+        """Appends a reading, the ring must not be full"""
+        if self.size and timestamp < self.timestamps[self.slot(self.size - 1)]:
+            self.disorder += 1
+        slot = self.slot(self.size)
+        self.timestamps[slot] = timestamp
+        self.values[slot] = value
+        self.ids[slot] = id
+        self.size += 1
+
+    def pop_oldest(self, sensor_name: str) -> Row:
+        head = self.head
+        if self.size > 1 and self.timestamps[head] > self.timestamps[self.slot(1)]:
+            self.disorder -= 1
+        row = (self.ids[head], self.timestamps[head], sensor_name, self.values[head])
+        self.ids[head] = None
+        self.head = (head + 1) % self.capacity
+        self.size -= 1
+        return row
+
+    def _bisect(self, timestamp: float, right: bool) -> int:
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            found = self.timestamps[self.slot(middle)]
+            if found < timestamp or (right and found == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start: float, end: float) -> Iterator[int]:
+        """Yields the slots of the readings between start and end, in timestamp order when the
+        ring is ordered and in arrival order otherwise"""
+        if not self.disorder:
+            for position in range(self._bisect(start, False), self._bisect(end, True)):
+                yield self.slot(position)
+            return
+        for position in range(self.size):
+            slot = self.slot(position)
+            if start <= self.timestamps[slot] <= end:
+                yield slot
+
+    def views(self) -> list[tuple[memoryview, memoryview]]:
+        """Returns the (timestamps, values) memoryviews of the one or two contiguous runs of
+        readings, oldest first, without copying"""
+        end = self.head + self.size
+        runs = [(self.head, min(end, self.capacity))]
+        if end > self.capacity:
+            runs.append((0, end - self.capacity))
+        timestamps, values = memoryview(self.timestamps), memoryview(self.values)
+        return [
+            (timestamps[first:last], values[first:last])
+            for first, last in runs
+            if last > first
+        ]
+
+
+@dataclass
+class RingBufferRepository:
+    """
+    The RingBufferRepository class is a memory-bounded in-memory repository: every sensor keeps
+    its max_readings most recent readings in a preallocated SensorRing of array columns
+    (array('d') timestamps and array('h') values, the MessageBatch value type) instead of one
+    Message object per reading. With max_age readings older than max_age seconds by the clock
+    are evicted too, on every write of their sensor and on expire. Evicted readings are written
+    to the spill repository when one is given (a FileRepository to keep them on disk), which is
+    how it serves as a hot cache in front of durable storage. Spills are written under the lock
+    in eviction order; the rows of a spill that raised are written first by the next one. window
+    and views read the rings in place without copying. Rollup windows are kept up to
+    max_rollups, oldest dropped first.
+    """
+
+    max_readings: int = 10_000
+    max_age: Optional[float] = None
+    spill: Optional[Repository] = None
+    clock: Clock = SYSTEM_CLOCK
+    max_rollups: int = 10_000
+    evicted: int = field(default=0, init=False)
+    _rings: dict[str, SensorRing] = field(default_factory=dict, init=False, repr=False)
+    _unspilled: list[Row] = field(default_factory=list, init=False, repr=False)
+    _aggregates: deque = field(init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if self.max_readings < 1:
+            raise ValueError("max_readings must be positive")
+        self._aggregates = deque(maxlen=self.max_rollups)
+
+    def _expire(
+        self, sensor_name: str, ring: SensorRing, cutoff: float, evicted: list[Row]
+    ) -> None:
+        while ring.size and ring.timestamps[ring.head] < cutoff:
+            evicted.append(ring.pop_oldest(sensor_name))
+
+    def _spill(self, evicted: list[Row]) -> None:
+        """Writes evicted rows to the spill repository after the rows kept by a failed spill.
+        Must hold the lock, so spills are written in eviction order."""
+        if self.spill is None:
+            return
+        rows = self._unspilled + evicted
+        if not rows:
+            return
+        self._unspilled = []
+        try:
+            write_rows(self.spill, rows)
+        except Exception:
+            self._unspilled = rows
+            raise
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        if not messages:
+            return
+        self.save_rows(message_rows(messages))
+
+    def save_rows(self, rows: Iterable[Row]) -> None:
+        """Saves (id, timestamp, sensor_name, value) rows without building Messages"""
+        evicted: list[Row] = []
+        written: dict[str, SensorRing] = {}
+        with self._lock:
+            for id, timestamp, sensor_name, value in rows:
+                ring = self._rings.get(sensor_name)
+                if ring is None:
+                    ring = self._rings[sensor_name] = SensorRing(self.max_readings)
+                written[sensor_name] = ring
+                if ring.size == ring.capacity:
+                    evicted.append(ring.pop_oldest(sensor_name))
+                ring.append(id, timestamp, value)
+            if self.max_age is not None:
+                cutoff = self.clock.time() - self.max_age
+                for sensor_name, ring in written.items():
+                    self._expire(sensor_name, ring, cutoff, evicted)
+            self.evicted += len(evicted)
+            self._spill(evicted)
+
+    def expire(self) -> None:
+        """Evicts the readings of every sensor older than max_age"""
+        if self.max_age is None:
+            return
+        evicted: list[Row] = []
+        with self._lock:
+            cutoff = self.clock.time() - self.max_age
+            for sensor_name, ring in self._rings.items():
+                self._expire(sensor_name, ring, cutoff, evicted)
+            self.evicted += len(evicted)
+            self._spill(evicted)
+
+    def _message(self, sensor_name: str, ring: SensorRing, slot: int) -> Message:
+        return Message(
+            sensor_name=sensor_name,
+            value=ring.values[slot],
+            timestamp=ring.timestamps[slot],
+            id=ring.ids[slot],
+        )
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        with self._lock:
+            ring = self._rings.get(sensor_name)
+            if ring is None:
+                return []
+            messages = [
+                self._message(sensor_name, ring, slot)
+                for slot in ring.range(start, end)
+            ]
+            if ring.disorder:
+                messages.sort(key=lambda message: message.timestamp)
+            return messages
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        with self._lock:
+            ring = self._rings.get(sensor_name)
+            if ring is None or not ring.size:
+                return None
+            if ring.disorder:
+                slot = max(
+                    (ring.slot(position) for position in range(ring.size)),
+                    key=ring.timestamps.__getitem__,
+                )
+            else:
+                slot = ring.slot(ring.size - 1)
+            return self._message(sensor_name, ring, slot)
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        buckets: dict[int, list[int]] = {}
+        with self._lock:
+            ring = self._rings.get(sensor_name)
+            if ring is None:
+                return []
+            for slot in ring.range(start, end):
+                number = int((ring.timestamps[slot] - start) // bucket)
+                buckets.setdefault(number, []).append(ring.values[slot])
+        return [
+            Aggregate(
+                sensor_name=sensor_name,
+                start=start + number * bucket,
+                duration=bucket,
+                count=len(values),
+                min=min(values),
+                max=max(values),
+                mean=sum(values) / len(values),
+            )
+            for number, values in sorted(buckets.items())
+        ]
+
+    def window(
+        self, sensor_name: str, start: float = float("-inf"), end: float = float("inf")
+    ) -> Iterator[tuple[float, int]]:
+        """
+        Iterates over the (timestamp, value) readings of a sensor between start and end straight
+        from the ring columns, without copying them or building Messages; in timestamp order
+        if they arrived in order. The iteration does not hold the lock, readings written to
+        the sensor meanwhile may or may not be seen.
+        """
+        ring = self._rings.get(sensor_name)
+        if ring is None:
+            return
+        timestamps, values = ring.timestamps, ring.values
+        for slot in ring.range(start, end):
+            yield timestamps[slot], values[slot]
+
+    def views(self, sensor_name: str) -> list[tuple[memoryview, memoryview]]:
+        """
+        Returns zero-copy (timestamps, values) memoryviews over the readings of a sensor,
+        oldest first, in one or two runs as the ring wraps. The views stay valid but see later
+        writes, so read them before the sensor receives max_readings more readings.
+        """
+        with self._lock:
+            ring = self._rings.get(sensor_name)
+            return [] if ring is None else ring.views()
+
+    def sensor_names(self) -> list[str]:
+        with self._lock:
+            return list(self._rings)
+
+    def save_rollups(self, aggregates: list[Aggregate]) -> None:
+        with self._lock:
+            self._aggregates.extend(aggregates)
+
+    def rollups(
+        self, sensor_name: str, duration: float, start: float, end: float
+    ) -> list[Aggregate]:
+        with self._lock:
+            aggregates = list(self._aggregates)
+        return _select_rollups(aggregates, sensor_name, duration, start, end)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(ring.size for ring in self._rings.values())
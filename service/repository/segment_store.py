@@ -0,0 +1,464 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, TextIO
+from urllib.parse import quote, unquote
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, Messages, message_rows
+from service.repository.repository import FsyncPolicy
+from service.repository.time_index import TimeSeriesIndex
+from utils.diagnostics import get_logger
+
+log = get_logger(__name__)
+
+MAGIC = b"SSEG"
+BLOCK = struct.Struct("<ddIQII")
+TRAILER = struct.Struct("<IQ4s")
+# quote() escapes "#", so no sensor directory can have the name of the pending log
+PENDING_LOG = "#pending.log"
+
+
+def _zigzag(n: int) -> int:
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(n: int) -> int:
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _write_varint(buffer: bytearray, n: int) -> None:
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def _read_varints(view: memoryview, count: int) -> list[int]:
+    numbers = []
+    n = shift = 0
+    for byte in view:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        numbers.append(n)
+        if len(numbers) == count:
+            break
+        n = shift = 0
+    return numbers
+
+
+def _float_bits(timestamps: list[float]) -> array:
+    return array("q", array("d", timestamps).tobytes())
+
+
+def _bits_float(bits: list[int]) -> array:
+    return array("d", array("q", bits).tobytes())
+
+
+def encode_block(timestamps: list[float], values: list[int]) -> tuple[bytes, bytes]:
+    """
+    Encodes a block of sorted timestamps as delta-of-delta of their IEEE-754 bit patterns and
+    the values as deltas, both zigzag varints. Working on the bit patterns keeps timestamps
+    lossless, and since current epoch timestamps share an exponent their bit patterns grow
+    linearly with time, so regular intervals still produce zeros and tiny varints.
+    """
+    timestamp_bytes, value_bytes = bytearray(), bytearray()
+    previous, previous_delta = 0, 0
+    for bits in _float_bits(timestamps):
+        delta = bits - previous
+        _write_varint(timestamp_bytes, _zigzag(delta - previous_delta))
+        previous, previous_delta = bits, delta
+    previous = 0
+    for value in values:
+        _write_varint(value_bytes, _zigzag(value - previous))
+        previous = value
+    return bytes(timestamp_bytes), bytes(value_bytes)
+
+
+def decode_block(
+    timestamp_view: memoryview, value_view: memoryview, count: int
+) -> tuple[array, list[int]]:
+    bits, previous, delta = [], 0, 0
+    for delta_of_delta in _read_varints(timestamp_view, count):
+        delta += _unzigzag(delta_of_delta)
+        previous += delta
+        bits.append(previous)
+    values, previous = [], 0
+    for delta in _read_varints(value_view, count):
+        previous += _unzigzag(delta)
+        values.append(previous)
+    return _bits_float(bits), values
+
+
+def write_segment(
+    path: str, timestamps: list[float], values: list[int], block_rows: int
+) -> None:
+    """Writes sorted readings to a sealed segment file: MAGIC, the encoded blocks, a sparse
+    time index with one (first, last, count, offset, sizes) entry per block and a trailer
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        offset = len(MAGIC)
+        index = bytearray()
+        for start in range(0, len(timestamps), block_rows):
+            block_timestamps = timestamps[start : start + block_rows]
+            timestamp_bytes, value_bytes = encode_block(
+                block_timestamps, values[start : start + block_rows]
+            )
+            index += BLOCK.pack(
+                block_timestamps[0],
+                block_timestamps[-1],
+                len(block_timestamps),
+                offset,
+                len(timestamp_bytes),
+                len(value_bytes),
+            )
+            file.write(timestamp_bytes)
+            file.write(value_bytes)
+            offset += len(timestamp_bytes) + len(value_bytes)
+        file.write(index)
+        file.write(TRAILER.pack(len(index) // BLOCK.size, offset, MAGIC))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+class Segment:
+    """
+    The Segment class reads a sealed segment file through a read-only mmap. The sparse block
+    index from the footer is loaded once; queries pick the blocks overlapping the range and
+    decode their varints straight out of the mapped pages, without copying the file. The file
+    is only mapped while it is read: the first read maps it and close unmaps it, so an owner
+    can bound the segments kept mapped.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.map: Optional[mmap.mmap] = None
+        self.view: Optional[memoryview] = None
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < len(MAGIC) + TRAILER.size or file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a segment file")
+            file.seek(size - TRAILER.size)
+            blocks, index_offset, magic = TRAILER.unpack(file.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a segment file")
+            file.seek(index_offset)
+            index = file.read(blocks * BLOCK.size)
+        self.blocks: list[tuple[float, float, int, int, int, int]] = list(
+            BLOCK.iter_unpack(index)
+        )
+        self.first: float = self.blocks[0][0] if self.blocks else 0.0
+        self.last: float = self.blocks[-1][1] if self.blocks else 0.0
+
+    def __len__(self) -> int:
+        return sum(block[2] for block in self.blocks)
+
+    @property
+    def is_open(self) -> bool:
+        return self.map is not None
+
+    def open(self) -> memoryview:
+        if self.view is None:
+            with open(self.path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+        return self.view
+
+    def read(self, start: float, end: float) -> Iterator[tuple[float, int]]:
+        view = self.open()
+        for first, last, count, offset, timestamp_size, value_size in self.blocks:
+            if last < start:
+                continue
+            if first > end:
+                break
+            timestamps, values = decode_block(
+                view[offset : offset + timestamp_size],
+                view[offset + timestamp_size : offset + timestamp_size + value_size],
+                count,
+            )
+            for timestamp, value in zip(timestamps, values):
+                if start <= timestamp <= end:
+                    yield timestamp, value
+
+    def close(self) -> None:
+        if self.view is not None:
+            self.view.release()
+            self.map.close()
+            self.view = self.map = None
+
+
+@dataclass
+class SegmentRepository:
+    """
+    The SegmentRepository class stores readings in per-sensor columnar segment files under
+    directory, one sub directory per sensor. Readings are buffered per sensor and sealed into
+    a segment once segment_rows of them are pending (or on flush/close); a segment holds blocks
+    of block_rows readings with delta-of-delta encoded timestamps and delta encoded values as
+    zigzag varints, and a sparse per-block time index in its footer. Sealed segments are read
+    through mmap, at most max_open_segments of them mapped at once, the least recently read
+    unmapped first. Pending readings are first appended to a pending log, forced to disk following
+    the fsync_policy as in FileRepository, together with a marker naming the segment each seal
+    writes; on opening, the readings of the log not in a completed segment are pending again.
+    The log is rewritten with only the pending readings once it holds more than segment_rows
+    stale lines. Only sensor name, value and timestamp are kept: the ids carried by messages
+    are not stored, and messages returned by queries have id None.
+    """
+
+    directory: str = "./segments"
+    segment_rows: int = 8192
+    block_rows: int = 1024
+    fsync_policy: FsyncPolicy = FsyncPolicy.ALWAYS
+    fsync_every_rows: int = 1000
+    fsync_interval: float = 1.0
+    max_open_segments: int = 256
+    _pending: dict[str, tuple[list[float], list[int]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _segments: dict[str, list[Segment]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _lock: threading.RLock = field(
+        default_factory=threading.RLock, init=False, repr=False, compare=False
+    )
+    _open_segments: OrderedDict[str, Segment] = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _log: Optional[TextIO] = field(default=None, init=False, repr=False)
+    _log_lines: int = field(default=0, init=False, repr=False)
+    _pending_rows: int = field(default=0, init=False, repr=False)
+    _rows_since_sync: int = field(default=0, init=False, repr=False)
+    _last_sync: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.max_open_segments < 1:
+            raise ValueError("max_open_segments must be at least 1")
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+
+    def _sensor_directory(self, sensor_name: str) -> str:
+        return os.path.join(self.directory, quote(sensor_name, safe=""))
+
+    def _segment_path(self, sensor_name: str, number: int) -> str:
+        return os.path.join(self._sensor_directory(sensor_name), f"{number:08d}.seg")
+
+    def _load_segments(self, sensor_name: str) -> list[Segment]:
+        segments = self._segments.get(sensor_name)
+        if segments is None:
+            directory = self._sensor_directory(sensor_name)
+            names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+            segments = self._segments[sensor_name] = [
+                Segment(os.path.join(directory, name))
+                for name in names
+                if name.endswith(".seg")
+            ]
+        return segments
+
+    def _opened(self, segment: Segment) -> Segment:
+        """Marks the segment as the most recently read one, unmapping the least recently read
+        ones over max_open_segments. Must hold the lock."""
+        self._open_segments[segment.path] = segment
+        self._open_segments.move_to_end(segment.path)
+        while len(self._open_segments) > self.max_open_segments:
+            _, evicted = self._open_segments.popitem(last=False)
+            evicted.close()
+        return segment
+
+    def sensor_names(self) -> list[str]:
+        with self._lock:
+            names = set(self._pending)
+            names.update(
+                unquote(name)
+                for name in os.listdir(self.directory)
+                if name != PENDING_LOG
+            )
+            return sorted(names)
+
+    def _recover(self) -> None:
+        """Reads back the pending log of the last run, dropping the readings of every seal
+        whose segment was written, then rewrites it. A torn last line is ignored."""
+        path = os.path.join(self.directory, PENDING_LOG)
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    try:
+                        kind, name, *fields = line.rstrip("\n").split("\t")
+                        sensor_name = unquote(name)
+                        if not line.endswith("\n"):
+                            raise ValueError("torn line")
+                        if kind == "R":
+                            timestamp, value = float(fields[0]), int(fields[1])
+                            pending = self._pending.setdefault(sensor_name, ([], []))
+                            pending[0].append(timestamp)
+                            pending[1].append(value)
+                        elif kind == "S":
+                            number = int(fields[0])
+                            if os.path.exists(self._segment_path(sensor_name, number)):
+                                self._pending.pop(sensor_name, None)
+                    except (ValueError, IndexError):
+                        log.warning("pending_log_truncated", path=path)
+                        break
+        self._pending_rows = sum(len(pending[0]) for pending in self._pending.values())
+        self._rewrite_log()
+
+    def _rewrite_log(self) -> None:
+        """Replaces the pending log with the pending readings only"""
+        path = os.path.join(self.directory, PENDING_LOG)
+        if self._log is not None:
+            self._log.close()
+        with open(f"{path}.tmp", "w") as file:
+            for sensor_name, (timestamps, values) in self._pending.items():
+                name = quote(sensor_name, safe="")
+                file.writelines(
+                    f"R\t{name}\t{timestamp!r}\t{value}\n"
+                    for timestamp, value in zip(timestamps, values)
+                )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{path}.tmp", path)
+        self._log = open(path, "a")
+        self._log_lines = self._pending_rows
+        self._rows_since_sync = 0
+        self._last_sync = time.monotonic()
+
+    def _sync_log(self) -> None:
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._rows_since_sync = 0
+        self._last_sync = time.monotonic()
+
+    def _apply_fsync_policy(self) -> None:
+        if self.fsync_policy is FsyncPolicy.ALWAYS:
+            self._sync_log()
+        elif self.fsync_policy is FsyncPolicy.EVERY_N_ROWS:
+            if self._rows_since_sync >= self.fsync_every_rows:
+                self._sync_log()
+        elif self.fsync_policy is FsyncPolicy.EVERY_T_SECONDS:
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_log()
+        else:
+            self._log.flush()
+
+    def _seal(self, sensor_name: str) -> None:
+        timestamps, values = self._pending.pop(sensor_name, ([], []))
+        if not timestamps:
+            return
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        segments = self._load_segments(sensor_name)
+        os.makedirs(self._sensor_directory(sensor_name), exist_ok=True)
+        path = self._segment_path(sensor_name, len(segments))
+        # The marker is on disk before the segment, so a written segment is never replayed
+        self._log.write(f"S\t{quote(sensor_name, safe='')}\t{len(segments)}\n")
+        self._log_lines += 1
+        self._sync_log()
+        write_segment(
+            path,
+            [timestamps[i] for i in order],
+            [values[i] for i in order],
+            self.block_rows,
+        )
+        segments.append(Segment(path))
+        self._pending_rows -= len(timestamps)
+
+    def _compact_log(self) -> None:
+        if self._log_lines - self._pending_rows > self.segment_rows:
+            self._rewrite_log()
+
+    def save(self, message: Message) -> None:
+        self.save_many([message])
+
+    def save_many(self, messages: Messages) -> None:
+        rows = list(message_rows(messages))
+        with self._lock:
+            self._log.writelines(
+                f"R\t{quote(sensor_name, safe='')}\t{timestamp!r}\t{value}\n"
+                for _, timestamp, sensor_name, value in rows
+            )
+            self._log_lines += len(rows)
+            self._rows_since_sync += len(rows)
+            self._apply_fsync_policy()
+            for _, timestamp, sensor_name, value in rows:
+                pending = self._pending.get(sensor_name)
+                if pending is None:
+                    pending = self._pending[sensor_name] = ([], [])
+                pending[0].append(timestamp)
+                pending[1].append(value)
+                self._pending_rows += 1
+                if len(pending[0]) >= self.segment_rows:
+                    self._seal(sensor_name)
+            self._compact_log()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Seals every pending reading; synchronous, so timeout is not used"""
+        with self._lock:
+            for sensor_name in list(self._pending):
+                self._seal(sensor_name)
+            self._compact_log()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._log.close()
+            for segment in self._open_segments.values():
+                segment.close()
+            self._open_segments.clear()
+            self._segments.clear()
+
+    def _read(
+        self, sensor_name: str, start: float, end: float
+    ) -> list[tuple[float, int]]:
+        with self._lock:
+            readings = [
+                reading
+                for segment in self._load_segments(sensor_name)
+                if segment.last >= start and segment.first <= end
+                for reading in self._opened(segment).read(start, end)
+            ]
+            timestamps, values = self._pending.get(sensor_name, ([], []))
+            readings.extend(
+                (timestamp, value)
+                for timestamp, value in zip(timestamps, values)
+                if start <= timestamp <= end
+            )
+        readings.sort(key=lambda reading: reading[0])
+        return readings
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        return [
+            Message(sensor_name=sensor_name, value=value, timestamp=timestamp, id=None)
+            for timestamp, value in self._read(sensor_name, start, end)
+        ]
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        with self._lock:
+            segments = self._load_segments(sensor_name)
+            timestamps, _ = self._pending.get(sensor_name, ([], []))
+            newest = max(
+                [segment.last for segment in segments] + list(timestamps), default=None
+            )
+        if newest is None:
+            return None
+        timestamp, value = self._read(sensor_name, newest, newest)[-1]
+        return Message(
+            sensor_name=sensor_name, value=value, timestamp=timestamp, id=None
+        )
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        index = TimeSeriesIndex()
+        index.add_many(
+            (None, timestamp, sensor_name, value)
+            for timestamp, value in self._read(sensor_name, start, end)
+        )
+        return index.aggregate(sensor_name, start, end, bucket)
@@ -0,0 +1,90 @@
+import gzip
+import shutil
+import sqlite3
+
+from service.model.message import Message
+from service.repository.bulk_import import chunk_ranges, import_csv, parse_lines
+from service.repository.repository import (
+    DatabaseRepository,
+    FileRepository,
+    FsyncPolicy,
+    InMemoryRepository,
+)
+
+
+def write_csv(path, count: int) -> list[Message]:
+    messages = [
+        Message(
+            id=f"id-{i}",
+            sensor_name=f"SensorA_{i % 3}",
+            value=i % 100 + 1,
+            timestamp=1700000000.0 + i,
+        )
+        for i in range(count)
+    ]
+    repository = FileRepository(file_path=path, fsync_policy=FsyncPolicy.NEVER)
+    repository.save_many(messages)
+    repository.close()
+    return messages
+
+
+class TestBulkImport:
+    def test_parse_lines_skips_malformed_rows(self):
+        rows, invalid = parse_lines("a,1.5,SensorA_0,3\nbroken\nb,x,SensorA_0,4\n\n")
+        assert rows == [("a", 1.5, "SensorA_0", 3)]
+        assert invalid == 2
+
+    def test_parse_lines_reads_quoted_sensor_names(self):
+        rows, invalid = parse_lines('a,1.5,"room 1, ""north""",3\n')
+        assert rows == [("a", 1.5, 'room 1, "north"', 3)]
+        assert invalid == 0
+
+    def test_chunk_ranges_cover_the_file_on_line_boundaries(self, tmp_path):
+        path = tmp_path / "data.csv"
+        write_csv(path, 100)
+        content = path.read_bytes()
+        ranges = list(chunk_ranges(path, chunk_bytes=97))
+        assert len(ranges) > 1
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(content)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert content[end - 1 : end] == b"\n"
+
+    def test_import_into_memory_keeps_every_row_in_order(self, tmp_path):
+        path = tmp_path / "data.csv"
+        messages = write_csv(path, 500)
+        repository = InMemoryRepository()
+        stats = import_csv(path, repository, chunk_bytes=1000)
+        assert repository.data == messages
+        assert stats.rows == 500 and stats.invalid == 0
+        assert stats.bytes == path.stat().st_size
+
+    def test_import_gzip_segment(self, tmp_path):
+        path = tmp_path / "data.csv"
+        messages = write_csv(path, 300)
+        with open(path, "rb") as source, gzip.open(f"{path}.gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        repository = InMemoryRepository()
+        stats = import_csv(f"{path}.gz", repository, chunk_bytes=1000)
+        assert repository.data == messages
+        assert stats.rows == 300
+
+    def test_parallel_import_into_database_rebuilds_the_index(self, tmp_path):
+        path = tmp_path / "data.csv"
+        messages = write_csv(path, 2000)
+        with open(path, "a") as file:
+            file.write("not a row\n")
+        repository = DatabaseRepository(db_name=str(tmp_path / "data.db"))
+        stats = import_csv(path, repository, chunk_bytes=4096, workers=2)
+        assert stats.rows == 2000 and stats.invalid == 1
+        assert repository.query("SensorA_1", 0, 2e9) == [
+            message for message in messages if message.sensor_name == "SensorA_1"
+        ]
+        with sqlite3.connect(tmp_path / "data.db") as conn:
+            indexes = [
+                name
+                for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )
+            ]
+        assert "idx_sensors_data_sensor_timestamp" in indexes
@@ -0,0 +1,196 @@
+from service.model.message import Message, MessageBatch
+from service.repository.cached_repository import CachedRepository
+from service.repository.repository import DatabaseRepository, InMemoryRepository
+from utils.clock import VirtualClock
+from utils.metrics import MetricsRegistry
+
+NOW = 1_700_000_000.0
+
+
+class CountingRepository(InMemoryRepository):
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self.reads = 0
+
+    def query(self, sensor_name, start, end):
+        self.reads += 1
+        return super().query(sensor_name, start, end)
+
+    def latest(self, sensor_name):
+        self.reads += 1
+        return super().latest(sensor_name)
+
+    def aggregate(self, sensor_name, start, end, bucket):
+        self.reads += 1
+        return super().aggregate(sensor_name, start, end, bucket)
+
+
+def readings(
+    count: int, sensor_name: str = "SensorA_0", start: float = NOW - 100
+) -> list:
+    return [
+        Message(id=str(n), sensor_name=sensor_name, value=n % 100, timestamp=start + n)
+        for n in range(count)
+    ]
+
+
+def cache(**kwargs) -> tuple[CachedRepository, CountingRepository]:
+    storage = CountingRepository()
+    kwargs.setdefault("clock", VirtualClock(start=NOW))
+    return CachedRepository(storage, **kwargs), storage
+
+
+class TestCachedRepository:
+    def test_latest_is_read_once_then_written_through(self):
+        repository, storage = cache()
+        storage.save_many(readings(3))
+        assert repository.latest("SensorA_0") == readings(3)[-1]
+        repository.save_many(readings(5)[3:])
+        assert repository.latest("SensorA_0") == readings(5)[-1]
+        assert storage.reads == 1
+        assert repository.latest("SensorB_0") is None
+        assert repository.hits["latest"] == 1
+
+    def test_late_write_does_not_replace_the_latest(self):
+        repository, storage = cache()
+        repository.save_many(readings(5))
+        assert repository.latest("SensorA_0") == readings(5)[-1]
+        repository.save(readings(2)[0])
+        assert repository.latest("SensorA_0") == readings(5)[-1]
+
+    def test_recent_queries_are_served_from_the_window(self):
+        repository, storage = cache()
+        repository.save_many(readings(10))
+        assert repository.query("SensorA_0", NOW - 95, NOW) == readings(10)[5:]
+        repository.save_many(readings(15)[10:])
+        assert repository.query("SensorA_0", NOW - 93, NOW - 88) == readings(15)[7:13]
+        assert repository.query("SensorA_0", NOW - 95, NOW) == readings(15)[5:]
+        assert storage.reads == 1
+        assert repository.hits["range"] == 2
+
+    def test_group_queries_merge_the_windows_of_their_sensors(self):
+        repository, storage = cache()
+        first, second = readings(4), readings(4, "SensorB_0", start=NOW - 98.5)
+        repository.save_many(first + second)
+        group = ["SensorA_0", "SensorB_0"]
+        by_time = lambda message: message.timestamp
+        assert repository.query_group(group, NOW - 100, NOW) == sorted(
+            first + second, key=by_time
+        )
+        repository.save_many(readings(5)[4:])
+        recent = [m for m in readings(5) + second if m.timestamp >= NOW - 97]
+        assert repository.query_group(group, NOW - 97, NOW) == sorted(
+            recent, key=by_time
+        )
+        assert storage.reads == 2
+
+    def test_late_readings_are_inserted_in_the_window(self):
+        repository, storage = cache()
+        messages = readings(6)
+        repository.save_many(messages[:3])
+        repository.query("SensorA_0", NOW - 100, NOW)
+        repository.save_many([messages[5], messages[3], messages[4]])
+        assert repository.query("SensorA_0", NOW - 100, NOW) == messages
+        assert storage.reads == 1
+
+    def test_aggregates_match_the_repository(self):
+        repository, storage = cache()
+        batch = MessageBatch()
+        for message in readings(20):
+            batch.append(
+                message.sensor_name, message.value, message.timestamp, int(message.id)
+            )
+        repository.save_many(batch)
+        expected = storage.aggregate("SensorA_0", NOW - 100, NOW, 5)
+        assert repository.aggregate("SensorA_0", NOW - 100, NOW, 5) == expected
+        assert repository.aggregate("SensorA_0", NOW - 90, NOW, 5) == storage.aggregate(
+            "SensorA_0", NOW - 90, NOW, 5
+        )
+        assert storage.reads == 3
+
+    def test_ranges_beyond_the_horizon_go_to_the_repository(self):
+        repository, storage = cache(horizon=50)
+        repository.save_many(readings(10))
+        assert repository.query("SensorA_0", NOW - 100, NOW) == readings(10)
+        assert repository.query("SensorA_0", NOW - 100, NOW) == readings(10)
+        assert storage.reads == 2
+        assert repository.misses["range"] == 2
+
+    def test_earlier_start_refills_the_window(self):
+        repository, storage = cache()
+        repository.save_many(readings(10))
+        repository.query("SensorA_0", NOW - 95, NOW)
+        assert repository.query("SensorA_0", NOW - 98, NOW) == readings(10)[2:]
+        assert storage.reads == 2
+        assert repository.query("SensorA_0", NOW - 97, NOW) == readings(10)[3:]
+        assert storage.reads == 2
+
+    def test_entries_expire_after_ttl(self):
+        clock = VirtualClock(start=NOW)
+        repository, storage = cache(ttl=10, clock=clock)
+        repository.save_many(readings(3))
+        repository.latest("SensorA_0")
+        repository.query("SensorA_0", NOW - 100, NOW)
+        storage.save_many(readings(4)[3:])
+        assert repository.latest("SensorA_0") == readings(3)[-1]
+        clock.advance(10)
+        assert repository.latest("SensorA_0") == readings(4)[-1]
+        assert repository.query("SensorA_0", NOW - 100, NOW) == readings(4)
+        assert storage.reads == 4
+
+    def test_windows_are_trimmed_to_the_horizon(self):
+        clock = VirtualClock(start=NOW)
+        repository, _ = cache(horizon=100, clock=clock)
+        repository.save_many(readings(10))
+        repository.query("SensorA_0", NOW - 100, NOW)
+        clock.advance(5)
+        repository.save_many(readings(11)[10:])
+        window = repository.windows["SensorA_0"]
+        assert window.start == NOW - 95
+        assert list(window.series.timestamps) == [NOW - 95 + n for n in range(6)]
+
+    def test_least_recently_used_window_is_evicted(self):
+        repository, storage = cache(max_windows=2)
+        for sensor_name in ("SensorA_0", "SensorB_0", "SensorC_0"):
+            repository.save_many(readings(3, sensor_name=sensor_name))
+        repository.query("SensorA_0", NOW - 100, NOW)
+        repository.query("SensorB_0", NOW - 100, NOW)
+        repository.query("SensorA_0", NOW - 100, NOW)
+        repository.query("SensorC_0", NOW - 100, NOW)
+        assert list(repository.windows) == ["SensorA_0", "SensorC_0"]
+        assert repository.evicted == 1
+
+    def test_fill_racing_with_a_write_is_not_cached(self):
+        repository, storage = cache()
+        repository._begin_write(["SensorA_0"])
+        assert repository.query("SensorA_0", NOW - 100, NOW) == []
+        repository._end_write(["SensorA_0"])
+        assert "SensorA_0" not in repository.windows
+
+    def test_invalidate(self):
+        repository, storage = cache()
+        repository.save_many(readings(3))
+        repository.latest("SensorA_0")
+        repository.query("SensorA_0", NOW - 100, NOW)
+        repository.invalidate("SensorA_0")
+        assert repository.windows == {} and repository.latest_values == {}
+
+    def test_hit_ratio_metrics(self):
+        metrics = MetricsRegistry()
+        repository, _ = cache(metrics=metrics)
+        repository.save_many(readings(3))
+        for _ in range(4):
+            repository.latest("SensorA_0")
+        snapshot = metrics.snapshot()
+        assert snapshot['cache_hits_total{cache="latest"}'] == 3
+        assert snapshot['cache_misses_total{cache="latest"}'] == 1
+        assert snapshot['cache_hit_ratio{cache="latest"}'] == 0.75
+
+    def test_database_repository(self, tmp_path):
+        database = DatabaseRepository(db_name=str(tmp_path / "cache.db"))
+        repository = CachedRepository(database, clock=VirtualClock(start=NOW))
+        repository.save_many(readings(5))
+        assert repository.query("SensorA_0", NOW - 100, NOW) == readings(5)
+        repository.save_many(readings(8)[5:])
+        assert repository.query("SensorA_0", NOW - 100, NOW) == readings(8)
+        assert repository.latest("SensorA_0") == database.latest("SensorA_0")
@@ -0,0 +1,202 @@
+import threading
+
+import pytest
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message
+from service.repository.composite_repository import (
+    NO_RETRY,
+    CompositeRepository,
+    RetryPolicy,
+    Sink,
+)
+from service.repository.repository import InMemoryRepository
+from utils.metrics import MetricsRegistry
+from utils.network import BackpressurePolicy
+
+
+def messages(count: int, start: int = 0) -> list[Message]:
+    return [
+        Message(id=str(i), sensor_name="SensorA_0", value=i, timestamp=float(i))
+        for i in range(start, start + count)
+    ]
+
+
+class BlockedRepository(InMemoryRepository):
+    """An InMemoryRepository whose writes wait until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def save_many(self, messages):
+        self.released.wait(5)
+        super().save_many(messages)
+
+
+class FailingRepository(InMemoryRepository):
+    """An InMemoryRepository failing its first `failures` writes"""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    def save_many(self, messages):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OSError("unavailable")
+        super().save_many(messages)
+
+
+class TestRetryPolicy:
+    def test_delays_back_off_exponentially_up_to_the_cap(self):
+        policy = RetryPolicy(
+            max_attempts=5, initial_backoff=1, max_backoff=5, multiplier=2
+        )
+        assert list(policy.delays()) == [1, 2, 4, 5]
+
+    def test_no_retry_has_no_delays(self):
+        assert list(NO_RETRY.delays()) == []
+
+
+class TestCompositeRepository:
+    def test_fans_out_to_every_sink(self):
+        first, second = InMemoryRepository(), InMemoryRepository()
+        repository = CompositeRepository([Sink("first", first), Sink("second", second)])
+        repository.save_many(messages(3))
+        repository.save(messages(1, start=3)[0])
+        assert repository.flush(timeout=2)
+        assert first.data == second.data == messages(4)
+        assert repository.query("SensorA_0", 0, 10) == messages(4)
+        repository.close(timeout=2)
+
+    def test_slow_sink_does_not_hold_back_writers_or_other_sinks(self):
+        fast, slow = InMemoryRepository(), BlockedRepository()
+        repository = CompositeRepository([Sink("fast", fast), Sink("slow", slow)])
+        repository.save_many(messages(2))
+        assert repository.sinks["fast"].wait_drained(timeout=2)
+        assert fast.data == messages(2)
+        assert slow.data == []
+        assert not repository.flush(timeout=0.05)
+        slow.released.set()
+        assert repository.flush(timeout=2)
+        assert slow.data == messages(2)
+        repository.close(timeout=2)
+
+    def test_failed_writes_are_retried(self):
+        metrics = MetricsRegistry()
+        failing = FailingRepository(failures=2)
+        retry = RetryPolicy(max_attempts=3, initial_backoff=0.001)
+        repository = CompositeRepository(
+            [Sink("failing", failing, retry=retry, metrics=metrics)]
+        )
+        repository.save_many(messages(2))
+        assert repository.flush(timeout=2)
+        assert failing.data == messages(2)
+        snapshot = metrics.snapshot()
+        assert snapshot['sink_retries_total{sink="failing"}'] == 2
+        assert snapshot['sink_failures_total{sink="failing"}'] == 0
+        assert snapshot['sink_rows_total{sink="failing"}'] == 2
+        repository.close(timeout=2)
+
+    def test_batch_is_given_up_after_max_attempts(self):
+        metrics = MetricsRegistry()
+        failing = FailingRepository(failures=3)
+        healthy = InMemoryRepository()
+        retry = RetryPolicy(max_attempts=2, initial_backoff=0.001)
+        repository = CompositeRepository(
+            [
+                Sink("healthy", healthy, metrics=metrics),
+                Sink("failing", failing, retry=retry, metrics=metrics),
+            ]
+        )
+        repository.save_many(messages(1))
+        repository.save_many(messages(1, start=1))
+        # The batch given up is not saved, flush must not report it as written
+        assert not repository.flush(timeout=2)
+        assert repository.sinks["failing"].given_up == 1
+        assert healthy.data == messages(2)
+        assert failing.data == messages(1, start=1)
+        assert metrics.snapshot()['sink_failures_total{sink="failing"}'] == 1
+        repository.close(timeout=2)
+
+    def test_full_queue_drops_oldest_batches(self):
+        metrics = MetricsRegistry()
+        slow = BlockedRepository()
+        sink = Sink(
+            "slow",
+            slow,
+            queue_size=2,
+            policy=BackpressurePolicy.DROP_OLDEST,
+            metrics=metrics,
+        )
+        repository = CompositeRepository([sink])
+        for i in range(6):
+            repository.save_many(messages(1, start=i))
+        assert sink.queue.dropped >= 3
+        assert metrics.snapshot()['sink_queue_depth{sink="slow"}'] <= 2
+        slow.released.set()
+        assert repository.flush(timeout=2)
+        assert slow.data[-2:] == messages(2, start=4)
+        assert metrics.snapshot()['sink_dropped_total{sink="slow"}'] == 6 - len(
+            slow.data
+        )
+        repository.close(timeout=2)
+
+    def test_lag_reports_the_oldest_unwritten_batch(self):
+        metrics = MetricsRegistry()
+        slow = BlockedRepository()
+        repository = CompositeRepository([Sink("slow", slow, metrics=metrics)])
+        repository.save_many(messages(1))
+        repository.save_many(messages(1, start=1))
+        assert metrics.snapshot()['sink_lag_seconds{sink="slow"}'] > 0
+        slow.released.set()
+        assert repository.flush(timeout=2)
+        snapshot = metrics.snapshot()
+        assert snapshot['sink_lag_seconds{sink="slow"}'] == 0
+        assert snapshot['sink_queue_depth{sink="slow"}'] == 0
+        repository.close(timeout=2)
+
+    def test_rollups_go_to_sinks_supporting_them(self):
+        class Plain:
+            def __init__(self):
+                self.messages = []
+
+            def save_many(self, messages):
+                self.messages.extend(messages)
+
+        rollups, plain = InMemoryRepository(), Plain()
+        repository = CompositeRepository(
+            [Sink("rollups", rollups), Sink("plain", plain)]
+        )
+        aggregate = Aggregate(
+            sensor_name="SensorA_0",
+            start=0.0,
+            duration=1.0,
+            count=1,
+            min=1,
+            max=1,
+            mean=1.0,
+        )
+        repository.save_rollups([aggregate])
+        repository.save_many(messages(1))
+        assert repository.flush(timeout=2)
+        assert rollups.aggregates == [aggregate]
+        assert plain.messages == messages(1)
+        assert repository.rollups("SensorA_0", 1.0, 0.0, 10.0) == [aggregate]
+        repository.close(timeout=2)
+
+    def test_close_writes_the_queue_and_stops_the_workers(self):
+        memory = InMemoryRepository()
+        sink = Sink("memory", memory, queue_size=2)
+        repository = CompositeRepository([sink])
+        for i in range(10):
+            repository.save_many(messages(1, start=i))
+        repository.close(timeout=2)
+        assert not sink.is_alive()
+        assert memory.data == messages(10)
+
+    def test_needs_a_sink(self):
+        with pytest.raises(ValueError):
+            CompositeRepository([])
@@ -1,11 +1,24 @@
+import concurrent.futures
+import gzip
+import os
 import sqlite3
+import threading
+import uuid
+
+import pytest
 
 from service.repository.repository import (
     FileRepository,
+    InMemoryRepository,
     ConnectionPool,
     DatabaseRepository,
+    PoolTimeoutError,
+    FsyncPolicy,
 )
+from service.repository.instrumented_repository import InstrumentedRepository
+from service.model.aggregate import Aggregate
 from service.model.message import Message
+from utils.metrics import MetricsRegistry
 
 
 class TestFileRepository:
@@ -22,6 +35,123 @@ class TestFileRepository:
                 == f"{message.id},{message.timestamp},{message.sensor_name},{message.value}\n"
             )
 
+    def test_save_many_writes_all_rows(self, tmp_path):
+        file_path = tmp_path / "temp_test_data.txt"
+        messages = [
+            Message(id=str(i), sensor_name="temperature", value=i, timestamp=1.0 + i)
+            for i in range(1, 4)
+        ]
+        repo = FileRepository(file_path=file_path)
+        repo.save_many(messages)
+        with open(file_path, "r") as file:
+            assert file.read() == "".join(f"{message}\n" for message in messages)
+
+    def test_buffered_rows_are_written_on_close(self, tmp_path):
+        file_path = tmp_path / "temp_test_data.txt"
+        repo = FileRepository(file_path=file_path, fsync_policy=FsyncPolicy.NEVER)
+        message = Message(id="1", sensor_name="temperature", value=1, timestamp=1.0)
+        repo.save(message)
+        repo.close()
+        with open(file_path, "r") as file:
+            assert file.read() == f"{message}\n"
+
+    def test_fsync_every_n_rows(self, tmp_path, monkeypatch):
+        synced = []
+        monkeypatch.setattr(os, "fsync", synced.append)
+        repo = FileRepository(
+            file_path=tmp_path / "temp_test_data.txt",
+            fsync_policy=FsyncPolicy.EVERY_N_ROWS,
+            fsync_every_rows=3,
+        )
+        for i in range(1, 7):
+            repo.save(Message(id=str(i), sensor_name="s", value=i, timestamp=1.0))
+        assert len(synced) == 2
+
+    def test_rotate_by_size_with_compression(self, tmp_path):
+        file_path = tmp_path / "data.csv"
+        repo = FileRepository(
+            file_path=file_path, rotate_max_bytes=50, compress_rotated=True
+        )
+        messages = [
+            Message(id=str(i), sensor_name="temperature", value=i, timestamp=1.0 + i)
+            for i in range(1, 10)
+        ]
+        repo.save_many(messages[:5])
+        repo.save_many(messages[5:])
+        repo.close()
+        segments = sorted(tmp_path.glob("data.*.csv.gz"))
+        assert len(segments) == 2
+        content = "".join(gzip.open(segment, "rt").read() for segment in segments)
+        assert content == "".join(f"{message}\n" for message in messages)
+        assert not file_path.exists() or file_path.read_text() == ""
+
+    def test_rotation_counts_encoded_bytes(self, tmp_path):
+        file_path = tmp_path / "data.csv"
+        repo = FileRepository(file_path=file_path, rotate_max_bytes=60)
+        # 39 characters, 69 bytes in UTF-8
+        repo.save(Message(id="1", sensor_name="é" * 30, value=1, timestamp=1.0))
+        repo.close()
+        assert len(list(tmp_path.glob("data.*.csv"))) == 1
+
+    def test_queries_include_rotated_segments(self, tmp_path):
+        file_path = tmp_path / "data.csv"
+        repo = FileRepository(
+            file_path=file_path, rotate_max_bytes=50, compress_rotated=True
+        )
+        messages = [
+            Message(id=str(i), sensor_name="temperature", value=i, timestamp=1.0 + i)
+            for i in range(1, 10)
+        ]
+        repo.save_many(messages[:5])
+        repo.save_many(messages[5:7])
+        repo.close()
+        repo.save_many(messages[7:])
+        reopened = FileRepository(file_path=file_path)
+        assert reopened.query("temperature", 0, 100) == messages
+        assert reopened.latest("temperature") == messages[-1]
+
+    def test_last_id_reads_the_newest_row(self, tmp_path):
+        file_path = tmp_path / "data.csv"
+        repo = FileRepository(file_path=file_path, rotate_max_bytes=100)
+        assert repo.last_id() is None
+        ids = [uuid.uuid4() for _ in range(3)]
+        repo.save_many(
+            [
+                Message(id=id, sensor_name="temperature", value=1, timestamp=1.0)
+                for id in ids[:2]
+            ]
+        )
+        # Rotated, so only the segment holds the last row
+        assert not file_path.exists()
+        assert repo.last_id() == str(ids[1])
+        repo.save(Message(id=ids[2], sensor_name="a,b", value=1, timestamp=2.0))
+        assert FileRepository(file_path=file_path).last_id() == str(ids[2])
+        repo.save(Message(id="42", sensor_name="temperature", value=1, timestamp=3.0))
+        assert repo.last_id() is None
+
+    def test_sensor_names_with_commas_and_quotes(self, tmp_path):
+        repo = FileRepository(file_path=tmp_path / "data.csv")
+        messages = [
+            Message(id="1", sensor_name='room 1, "north"', value=5, timestamp=1.0),
+            Message(id="2", sensor_name="plain", value=6, timestamp=2.0),
+        ]
+        repo.save_many(messages)
+        repo.close()
+        reopened = FileRepository(file_path=tmp_path / "data.csv")
+        assert reopened.query('room 1, "north"', 0, 10) == messages[:1]
+        assert reopened.query("plain", 0, 10) == messages[1:]
+
+
+class TestInMemoryRepository:
+    def test_save_many(self):
+        messages = [
+            Message(id=str(i), sensor_name="temperature", value=i, timestamp=1.0 + i)
+            for i in range(3)
+        ]
+        repo = InMemoryRepository()
+        repo.save_many(messages)
+        assert repo.data == messages
+
 
 class TestConnectionPool:
     def test_get_connection(self, tmp_path):
@@ -35,19 +165,52 @@ class TestConnectionPool:
         db_name = tmp_path / "test.db"
         conn = conn_pool.get_connection(db_name)
         conn_pool.release_connection(conn)
-        assert conn_pool.connections.qsize() == 1
+        assert len(conn_pool.connections) == 1
 
     def test_get_connection_edge(self, tmp_path):
-        conn_pool = ConnectionPool(0)
         db_name = tmp_path / "test.db"
-        conn = conn_pool.get_connection(db_name)
-        assert conn is None
+        conn_pool = ConnectionPool(0)
+        with pytest.raises(PoolTimeoutError):
+            conn_pool.get_connection(db_name, timeout=0.01)
 
         conn_pool = ConnectionPool(1)
         conn1 = conn_pool.get_connection(db_name)
-        conn2 = conn_pool.get_connection(db_name)
         assert conn1 is not None
-        assert conn2 is None
+        with pytest.raises(PoolTimeoutError):
+            conn_pool.get_connection(db_name, timeout=0.01)
+
+    def test_get_connection_blocks_until_released(self, tmp_path):
+        conn_pool = ConnectionPool(1)
+        db_name = tmp_path / "test.db"
+        conn1 = conn_pool.get_connection(db_name)
+        timer = threading.Timer(0.05, conn_pool.release_connection, args=(conn1,))
+        timer.start()
+        conn2 = conn_pool.get_connection(db_name, timeout=2)
+        timer.join()
+        assert conn2 is conn1
+
+    def test_thread_affinity(self, tmp_path):
+        conn_pool = ConnectionPool(2)
+        db_name = tmp_path / "test.db"
+        worker_connections = []
+
+        def worker():
+            with conn_pool.connection(db_name) as conn:
+                worker_connections.append(conn)
+
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            main_conn = conn_pool.get_connection(db_name)
+            executor.submit(worker).result()
+            conn_pool.release_connection(main_conn)
+            executor.submit(worker).result()
+        assert worker_connections[0] is worker_connections[1]
+        assert worker_connections[0] is not main_conn
+
+    def test_wal_journal_mode(self, tmp_path):
+        conn_pool = ConnectionPool(1, synchronous="FULL")
+        with conn_pool.connection(tmp_path / "test.db") as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
 
 
 class TestDatabaseRepository:
@@ -64,6 +227,12 @@ class TestDatabaseRepository:
             )
             result = cursor.fetchone()
             assert result[0] == "sensors_data"
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='sensors_data';"
+            )
+            assert "idx_sensors_data_sensor_timestamp" in [
+                row[0] for row in cursor.fetchall()
+            ]
 
     def test_save_single_message(self, tmp_path):
         db_name = tmp_path / "test.db"
@@ -100,3 +269,143 @@ class TestDatabaseRepository:
             cursor.execute("SELECT COUNT(*) FROM sensors_data")
             result = cursor.fetchone()
             assert result[0] == len(messages)
+
+    def test_save_many(self, tmp_path):
+        db_name = tmp_path / "test.db"
+        repo = DatabaseRepository(db_name=db_name)
+        messages = [
+            Message(sensor_name=f"sensor{i}", value=i, timestamp=1.0 + i, id=str(i))
+            for i in range(10)
+        ]
+
+        repo.save_many(messages)
+        repo.save_many(messages[:0])
+
+        with repo.connection_pool.get_connection(repo.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM sensors_data")
+            result = cursor.fetchone()
+            assert result[0] == len(messages)
+
+    def test_save_does_not_exhaust_pool(self, tmp_path):
+        db_name = tmp_path / "test.db"
+        repo = DatabaseRepository(
+            db_name=db_name, connection_pool=ConnectionPool(1, timeout=0.5)
+        )
+        for i in range(10):
+            repo.save(
+                Message(sensor_name="sensor1", value=i, timestamp=1.0 + i, id=str(i))
+            )
+
+        with repo.connection_pool.connection(repo.db_name) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sensors_data").fetchone()[0] == 10
+
+    def test_bulk_load_holds_one_connection(self, tmp_path):
+        repo = DatabaseRepository(
+            db_name=str(tmp_path / "test.db"),
+            connection_pool=ConnectionPool(1, timeout=0.1),
+        )
+        message = Message(sensor_name="sensor1", value=1, timestamp=1.0, id="1")
+        with repo.bulk_load(cache_kib=1024):
+            # The only connection is held, so these must go through it
+            repo.save(message)
+            assert repo.latest("sensor1") == message
+        with repo.connection_pool.connection(repo.db_name) as conn:
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -2000
+            assert conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name = ?",
+                ("idx_sensors_data_sensor_timestamp",),
+            ).fetchone()
+
+
+@pytest.fixture(params=["file", "memory", "database"])
+def query_repository(request, tmp_path):
+    if request.param == "file":
+        return FileRepository(file_path=tmp_path / "data.csv")
+    if request.param == "memory":
+        return InMemoryRepository()
+    return DatabaseRepository(db_name=tmp_path / "test.db")
+
+
+class TestQueryRepository:
+    def test_query_latest_and_aggregate(self, query_repository):
+        query_repository.save_many(
+            [
+                Message(
+                    sensor_name=name, value=i + 1, timestamp=float(i), id=f"{name}{i}"
+                )
+                for i in range(10)
+                for name in ("s1", "s2")
+            ]
+        )
+        assert [m.value for m in query_repository.query("s1", 2.0, 4.0)] == [3, 4, 5]
+        assert query_repository.latest("s2").value == 10
+        assert query_repository.latest("s3") is None
+        aggregates = query_repository.aggregate("s1", 0.0, 9.0, 5.0)
+        assert [(a.start, a.count, a.min, a.max, a.mean) for a in aggregates] == [
+            (0.0, 5, 1, 5, 3.0),
+            (5.0, 5, 6, 10, 8.0),
+        ]
+
+    def test_file_index_loads_existing_rows(self, tmp_path):
+        file_path = tmp_path / "data.csv"
+        FileRepository(file_path=file_path).save(
+            Message(sensor_name="s1", value=5, timestamp=1.0, id="1")
+        )
+        repo = FileRepository(file_path=file_path)
+        repo.save(Message(sensor_name="s1", value=6, timestamp=2.0, id="2"))
+        assert [m.value for m in repo.query("s1", 0, 10)] == [5, 6]
+        repo.save(Message(sensor_name="s1", value=7, timestamp=3.0, id="3"))
+        assert repo.latest("s1").value == 7
+
+    def test_rollups_round_trip(self, query_repository):
+        query_repository.save_rollups(
+            [
+                Aggregate("s1", 60.0, 60.0, 3, -1, 5, 2.0, 4),
+                Aggregate("s1", 0.0, 60.0, 2, 1, 2, 1.5, 2),
+                Aggregate("s1", 0.0, 1.0, 1, 1, 1, 1.0, 1),
+                Aggregate("s2", 0.0, 60.0, 1, 9, 9, 9.0, 9),
+            ]
+        )
+        rollups = query_repository.rollups("s1", 60.0, 0.0, 3600.0)
+        assert rollups == [
+            Aggregate("s1", 0.0, 60.0, 2, 1, 2, 1.5, 2),
+            Aggregate("s1", 60.0, 60.0, 3, -1, 5, 2.0, 4),
+        ]
+        assert query_repository.rollups("s1", 60.0, 30.0, 3600.0)[0].start == 60.0
+        assert query_repository.rollups("s3", 60.0, 0.0, 3600.0) == []
+
+    def test_rollup_saved_again_replaces_the_window(self, query_repository):
+        query_repository.save_rollups([Aggregate("s,1", 0.0, 60.0, 2, 1, 2, 1.5, 2)])
+        query_repository.save_rollups(
+            [
+                Aggregate("s,1", 0.0, 60.0, 3, 1, 4, 2.0, 4),
+                Aggregate("s,1", 60.0, 60.0, 0, 0, 0, 0.0, None),
+            ]
+        )
+        assert query_repository.rollups("s,1", 60.0, 0.0, 3600.0) == [
+            Aggregate("s,1", 0.0, 60.0, 3, 1, 4, 2.0, 4),
+            Aggregate("s,1", 60.0, 60.0, 0, 0, 0, 0.0, None),
+        ]
+
+
+class TestInstrumentedRepository:
+    def test_records_rows_and_latencies(self):
+        metrics = MetricsRegistry()
+        repository = InstrumentedRepository(InMemoryRepository(), metrics)
+        repository.save_many(
+            [
+                Message(
+                    id=str(i), sensor_name="temperature", value=i, timestamp=float(i)
+                )
+                for i in range(1, 4)
+            ]
+        )
+        assert len(repository.query("temperature", 0.0, 10.0)) == 3
+        assert len(repository.data) == 3
+        snapshot = metrics.snapshot()
+        assert snapshot['repository_rows_total{repository="InMemoryRepository"}'] == 3
+        save = snapshot['repository_save_seconds{repository="InMemoryRepository"}']
+        assert save["count"] == 1
+        query = snapshot['repository_query_seconds{repository="InMemoryRepository"}']
+        assert query["count"] == 1
@@ -0,0 +1,157 @@
+import tracemalloc
+
+import pytest
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, MessageBatch
+from service.repository.repository import (
+    FileRepository,
+    FsyncPolicy,
+    InMemoryRepository,
+)
+from service.repository.ring_repository import RingBufferRepository
+from utils.clock import VirtualClock
+
+
+def readings(
+    count: int, sensor_name: str = "SensorA_0", start: float = 0.0
+) -> list[Message]:
+    return [
+        Message(id=str(n), sensor_name=sensor_name, value=n % 100, timestamp=float(n))
+        for n in range(int(start), int(start) + count)
+    ]
+
+
+class TestRingBufferRepository:
+    def test_keeps_the_most_recent_readings_of_every_sensor(self):
+        repository = RingBufferRepository(max_readings=3)
+        repository.save_many(readings(5) + readings(2, sensor_name="SensorB_0"))
+        assert repository.query("SensorA_0", 0, 10) == readings(5)[2:]
+        assert repository.query("SensorB_0", 0, 10) == readings(
+            2, sensor_name="SensorB_0"
+        )
+        assert repository.latest("SensorA_0") == readings(5)[-1]
+        assert len(repository) == 5
+        assert repository.evicted == 2
+
+    def test_query_ranges_across_the_wrap(self):
+        repository = RingBufferRepository(max_readings=4)
+        for message in readings(10):
+            repository.save(message)
+        assert repository.query("SensorA_0", 7, 8) == readings(10)[7:9]
+        assert repository.query("SensorA_0", 0, 5) == []
+        assert repository.latest("SensorB_0") is None
+
+    def test_late_readings_are_found_in_timestamp_order(self):
+        repository = RingBufferRepository(max_readings=4)
+        messages = readings(4)
+        repository.save_many([messages[0], messages[2], messages[1], messages[3]])
+        assert repository.query("SensorA_0", 0, 10) == messages
+        repository.save_many(readings(3, start=4))
+        assert repository.query("SensorA_0", 0, 10) == readings(7)[3:]
+
+    def test_readings_older_than_max_age_are_evicted(self):
+        clock = VirtualClock(start=100.0)
+        repository = RingBufferRepository(max_age=10, clock=clock)
+        repository.save_many(readings(5, start=95.0))
+        assert len(repository) == 5
+        clock.advance(10)
+        repository.save_many(readings(1, sensor_name="SensorB_0", start=110.0))
+        assert len(repository) == 6
+        repository.expire()
+        assert repository.query("SensorA_0", 0, 200) == []
+        assert repository.query("SensorB_0", 0, 200) == readings(
+            1, "SensorB_0", start=110.0
+        )
+        assert repository.evicted == 5
+
+    def test_evicted_readings_spill_to_disk(self, tmp_path):
+        spill = FileRepository(
+            file_path=tmp_path / "spill.csv", fsync_policy=FsyncPolicy.NEVER
+        )
+        repository = RingBufferRepository(max_readings=2, spill=spill)
+        repository.save_many(readings(5))
+        spill.close()
+        assert spill.query("SensorA_0", 0, 10) == readings(3)
+        assert repository.query("SensorA_0", 0, 10) == readings(5)[3:]
+
+    def test_spill_to_repository_without_save_rows(self):
+        spill = InMemoryRepository()
+        repository = RingBufferRepository(max_readings=2, spill=spill)
+        batch = MessageBatch()
+        for message in readings(3):
+            batch.append(
+                message.sensor_name, message.value, message.timestamp, int(message.id)
+            )
+        repository.save_many(batch)
+        assert [message.value for message in spill.data] == [0]
+
+    def test_rows_of_a_failed_spill_are_written_first_by_the_next(self):
+        class FlakyRepository(InMemoryRepository):
+            failures = 1
+
+            def save_many(self, messages):
+                if self.failures:
+                    self.failures -= 1
+                    raise OSError("disk full")
+                super().save_many(messages)
+
+        spill = FlakyRepository()
+        repository = RingBufferRepository(max_readings=2, spill=spill)
+        with pytest.raises(OSError):
+            repository.save_many(readings(3))
+        repository.save_many(readings(2, start=3))
+        assert [message.value for message in spill.data] == [0, 1, 2]
+
+    def test_window_and_views_read_in_place(self):
+        repository = RingBufferRepository(max_readings=4)
+        repository.save_many(readings(6))
+        assert list(repository.window("SensorA_0", 3, 4)) == [(3.0, 3), (4.0, 4)]
+        views = repository.views("SensorA_0")
+        assert len(views) == 2
+        assert [t for timestamps, _ in views for t in timestamps] == [
+            2.0,
+            3.0,
+            4.0,
+            5.0,
+        ]
+        assert [v for _, values in views for v in values] == [2, 3, 4, 5]
+        assert repository.views("SensorB_0") == []
+
+    def test_aggregate_buckets(self):
+        repository = RingBufferRepository()
+        repository.save_many(readings(10))
+        aggregates = repository.aggregate("SensorA_0", 0, 9, 5)
+        assert [(a.start, a.count, a.min, a.max, a.mean) for a in aggregates] == [
+            (0, 5, 0, 4, 2.0),
+            (5, 5, 5, 9, 7.0),
+        ]
+
+    def test_rollups_are_bounded(self):
+        repository = RingBufferRepository(max_rollups=2)
+        aggregates = [
+            Aggregate(
+                sensor_name="SensorA_0",
+                start=float(i),
+                duration=1.0,
+                count=1,
+                min=i,
+                max=i,
+                mean=i,
+            )
+            for i in range(3)
+        ]
+        repository.save_rollups(aggregates)
+        assert repository.rollups("SensorA_0", 1.0, 0, 10) == aggregates[1:]
+
+    def test_memory_stays_bounded(self):
+        repository = RingBufferRepository(max_readings=1000)
+        repository.save_many(readings(1000))
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for start in range(1000, 20_000, 1000):
+            repository.save_many(readings(1000, start=start))
+        grown = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        assert len(repository) == 1000
+        assert grown < 200_000
@@ -0,0 +1,104 @@
+import random
+
+from service.model.message import Message
+from service.repository.segment_store import (
+    Segment,
+    SegmentRepository,
+    decode_block,
+    encode_block,
+    write_segment,
+)
+
+
+class TestBlockEncoding:
+    def test_round_trip_is_lossless(self):
+        timestamps = sorted(1_700_000_000 + random.random() * 1000 for _ in range(500))
+        values = [random.randint(-100, 100) for _ in range(500)]
+        timestamp_bytes, value_bytes = encode_block(timestamps, values)
+        decoded_timestamps, decoded_values = decode_block(
+            memoryview(timestamp_bytes), memoryview(value_bytes), 500
+        )
+        assert list(decoded_timestamps) == timestamps
+        assert decoded_values == values
+
+    def test_regular_timestamps_compress(self):
+        timestamps = [1_700_000_000.0 + i * 5 for i in range(1000)]
+        values = [20 + i % 3 for i in range(1000)]
+        timestamp_bytes, value_bytes = encode_block(timestamps, values)
+        assert len(timestamp_bytes) + len(value_bytes) < 1000 * 3
+
+
+class TestSegment:
+    def test_sparse_index_range_read(self, tmp_path):
+        path = str(tmp_path / "0.seg")
+        timestamps = [float(i) for i in range(100)]
+        write_segment(path, timestamps, list(range(100)), block_rows=16)
+        segment = Segment(path)
+        try:
+            assert len(segment.blocks) == 7
+            assert len(segment) == 100
+            assert (segment.first, segment.last) == (0.0, 99.0)
+            assert list(segment.read(30.0, 34.0)) == [
+                (float(i), i) for i in range(30, 35)
+            ]
+        finally:
+            segment.close()
+
+
+class TestSegmentRepository:
+    def messages(self, name, count, offset=0):
+        return [
+            Message(
+                sensor_name=name, value=i % 50, timestamp=1_700_000_000.0 + i, id=None
+            )
+            for i in range(offset, offset + count)
+        ]
+
+    def test_save_seal_and_query(self, tmp_path):
+        repo = SegmentRepository(directory=str(tmp_path), segment_rows=40, block_rows=8)
+        repo.save_many(self.messages("room 1/a", 100) + self.messages("b", 10))
+        assert len(list((tmp_path / "room%201%2Fa").glob("*.seg"))) == 2
+        result = repo.query("room 1/a", 1_700_000_035.0, 1_700_000_085.0)
+        assert [m.value for m in result] == [i % 50 for i in range(35, 86)]
+        assert repo.latest("room 1/a").timestamp == 1_700_000_099.0
+        assert repo.latest("b").value == 9
+        assert repo.sensor_names() == ["b", "room 1/a"]
+        aggregates = repo.aggregate("b", 1_700_000_000.0, 1_700_000_009.0, 5)
+        assert [(a.count, a.min, a.max) for a in aggregates] == [(5, 0, 4), (5, 5, 9)]
+        repo.close()
+
+    def test_reopen_reads_sealed_segments(self, tmp_path):
+        repo = SegmentRepository(directory=str(tmp_path))
+        repo.save_many(self.messages("a", 20))
+        repo.close()
+        reopened = SegmentRepository(directory=str(tmp_path))
+        reopened.save_many(self.messages("a", 5, offset=20))
+        assert len(reopened.query("a", 0, 2e9)) == 25
+        reopened.close()
+        reopened = SegmentRepository(directory=str(tmp_path))
+        assert len(reopened.query("a", 0, 2e9)) == 25
+        reopened.close()
+
+    def test_pending_readings_survive_a_crash(self, tmp_path):
+        repo = SegmentRepository(directory=str(tmp_path), segment_rows=10)
+        repo.save_many(self.messages("a", 15) + self.messages("b", 3))
+        # No close: the 5 + 3 readings not sealed yet are only in the pending log
+        with open(tmp_path / "#pending.log", "a") as file:
+            file.write("R\ta\t1700000099.0")
+        reopened = SegmentRepository(directory=str(tmp_path), segment_rows=10)
+        assert [m.value for m in reopened.query("a", 0, 2e9)] == list(range(15))
+        assert len(reopened.query("b", 0, 2e9)) == 3
+        assert reopened.sensor_names() == ["a", "b"]
+        reopened.close()
+
+    def test_mapped_segments_are_capped(self, tmp_path):
+        repo = SegmentRepository(
+            directory=str(tmp_path), segment_rows=10, max_open_segments=2
+        )
+        repo.save_many(self.messages("a", 30) + self.messages("b", 10))
+        assert len(repo.query("a", 0, 2e9)) == 30
+        assert len(repo.query("b", 0, 2e9)) == 10
+        segments = repo._segments["a"] + repo._segments["b"]
+        assert [segment.is_open for segment in segments] == [False, False, True, True]
+        repo.close()
+        assert not any(segment.is_open for segment in segments)
@@ -0,0 +1,34 @@
+from service.repository.time_index import TimeSeriesIndex
+
+
+class TestTimeSeriesIndex:
+    def test_query_is_sorted_and_inclusive(self):
+        index = TimeSeriesIndex()
+        index.add_many(
+            [
+                ("3", 3.0, "a", 30),
+                ("1", 1.0, "a", 10),
+                ("2", 2.0, "a", 20),
+                ("4", 4.0, "b", 40),
+            ]
+        )
+        assert [m.value for m in index.query("a", 1.0, 2.0)] == [10, 20]
+        assert [m.id for m in index.query("a", 0, 10)] == ["1", "2", "3"]
+        assert index.query("missing", 0, 10) == []
+        assert len(index) == 4
+
+    def test_latest(self):
+        index = TimeSeriesIndex()
+        assert index.latest("a") is None
+        index.add_many([("2", 2.0, "a", 20), ("1", 1.0, "a", 10)])
+        assert index.latest("a").value == 20
+
+    def test_aggregate_buckets(self):
+        index = TimeSeriesIndex()
+        index.add_many((str(i), float(i), "a", i) for i in range(10))
+        aggregates = index.aggregate("a", 0.0, 9.0, 4.0)
+        assert [(a.start, a.count, a.min, a.max, a.mean) for a in aggregates] == [
+            (0.0, 4, 0, 3, 1.5),
+            (4.0, 4, 4, 7, 5.5),
+            (8.0, 2, 8, 9, 8.5),
+        ]
@@ -0,0 +1,130 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional
+
+from service.model.aggregate import Aggregate
+from service.model.message import Message, MessageId
+
+
+class SensorSeries:
+    """Timestamp-sorted columns holding the readings of a single sensor"""
+
+    __slots__ = ("timestamps", "values", "ids")
+
+    def __init__(self) -> None:
+        self.timestamps: array = array("d")
+        self.values: array = array("q")
+        self.ids: list[MessageId] = []
+
+    def add(self, id: MessageId, timestamp: float, value: int) -> None:
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+            self.ids.append(id)
+            return
+        position = bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(position, timestamp)
+        self.values.insert(position, value)
+        self.ids.insert(position, id)
+
+    def range(self, start: float, end: float) -> tuple[int, int]:
+        return bisect_left(self.timestamps, start), bisect_right(self.timestamps, end)
+
+    def trim(self, cutoff: float) -> None:
+        """Drops the readings older than cutoff"""
+        count = bisect_left(self.timestamps, cutoff)
+        if count:
+            del self.timestamps[:count]
+            del self.values[:count]
+            del self.ids[:count]
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        first, last = self.range(start, end)
+        return [
+            Message(
+                sensor_name=sensor_name,
+                value=self.values[i],
+                timestamp=self.timestamps[i],
+                id=self.ids[i],
+            )
+            for i in range(first, last)
+        ]
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        first, last = self.range(start, end)
+        aggregates = []
+        while first < last:
+            bucket_start = start + (self.timestamps[first] - start) // bucket * bucket
+            stop = bisect_left(self.timestamps, bucket_start + bucket, first, last)
+            stop = max(stop, first + 1)
+            values = self.values[first:stop]
+            aggregates.append(
+                Aggregate(
+                    sensor_name=sensor_name,
+                    start=bucket_start,
+                    duration=bucket,
+                    count=len(values),
+                    min=min(values),
+                    max=max(values),
+                    mean=sum(values) / len(values),
+                )
+            )
+            first = stop
+        return aggregates
+
+
+class TimeSeriesIndex:
+    """
+    The TimeSeriesIndex class keeps the readings of every sensor in timestamp-sorted columns so
+    range lookups cost two binary searches instead of a scan. In-order readings are appended,
+    late ones are inserted at their position. It is thread-safe and backs the query side of the
+    file and in-memory repositories.
+    """
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.series: dict[str, SensorSeries] = {}
+
+    def add_many(self, rows: Iterable[tuple[MessageId, float, str, int]]) -> None:
+        """Adds (id, timestamp, sensor_name, value) rows"""
+        with self.lock:
+            for id, timestamp, sensor_name, value in rows:
+                series = self.series.get(sensor_name)
+                if series is None:
+                    series = self.series[sensor_name] = SensorSeries()
+                series.add(id, timestamp, value)
+
+    def query(self, sensor_name: str, start: float, end: float) -> list[Message]:
+        with self.lock:
+            series = self.series.get(sensor_name)
+            if series is None:
+                return []
+            return series.query(sensor_name, start, end)
+
+    def latest(self, sensor_name: str) -> Optional[Message]:
+        with self.lock:
+            series = self.series.get(sensor_name)
+            if series is None or not series.timestamps:
+                return None
+            return Message(
+                sensor_name=sensor_name,
+                value=series.values[-1],
+                timestamp=series.timestamps[-1],
+                id=series.ids[-1],
+            )
+
+    def aggregate(
+        self, sensor_name: str, start: float, end: float, bucket: float
+    ) -> list[Aggregate]:
+        with self.lock:
+            series = self.series.get(sensor_name)
+            if series is None:
+                return []
+            return series.aggregate(sensor_name, start, end, bucket)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(len(series.timestamps) for series in self.series.values())
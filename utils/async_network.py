@@ -0,0 +1,97 @@
+import asyncio
+from typing import Iterable, Optional
+
+from utils.network import BackpressurePolicy, NetworkFullError
+
+
+class AsyncNetwork:
+    """
+    The AsyncNetwork class is the asyncio counterpart of the Network class. Messages wait in an
+    asyncio.Queue bounded to max_messages, so the same cap applies to coroutine producers, and
+    the configured BackpressurePolicy decides whether a producer awaits room, times out or
+    drops a message when the queue is full. It must only be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 5,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if max_messages < 1:
+            raise ValueError("max_messages must be at least 1")
+        self.max_messages: int = max_messages
+        self.policy: BackpressurePolicy = policy
+        self.timeout: Optional[float] = timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_messages)
+        self.dropped: int = 0
+
+    def __len__(self) -> int:
+        return self.queue.qsize()
+
+    async def send_message(self, encoded_message) -> bool:
+        """Sends one message, returns False if it was dropped by the backpressure policy"""
+        if not self.queue.full() or self.policy is BackpressurePolicy.BLOCK:
+            await self.queue.put(encoded_message)
+            return True
+        if self.policy is BackpressurePolicy.DROP_NEWEST:
+            self.dropped += 1
+            return False
+        if self.policy is BackpressurePolicy.DROP_OLDEST:
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.queue.put_nowait(encoded_message)
+            return True
+        try:
+            await asyncio.wait_for(self.queue.put(encoded_message), self.timeout)
+        except asyncio.TimeoutError:
+            raise NetworkFullError("The maximum number of messages has been reached.")
+        return True
+
+    async def send_many(self, encoded_messages: Iterable) -> int:
+        sent = 0
+        for encoded_message in encoded_messages:
+            sent += await self.send_message(encoded_message)
+        return sent
+
+    async def receive_message(self, timeout: Optional[float] = None):
+        """Receives one message, waiting for it. Returns None if the timeout expires, a
+        timeout of zero only takes a message that is already queued. Unlike asyncio.wait_for,
+        which can return a message it received while its task was being cancelled and so drop
+        the cancellation, a cancelled receive leaves the message in the queue"""
+        if timeout is not None and timeout <= 0:
+            return None if self.queue.empty() else self.queue.get_nowait()
+        if timeout is None:
+            return await self.queue.get()
+        task = asyncio.current_task()
+        expired = False
+
+        def expire() -> None:
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        timer = asyncio.get_running_loop().call_later(timeout, expire)
+        try:
+            return await self.queue.get()
+        except asyncio.CancelledError:
+            if expired:
+                uncancel = getattr(task, "uncancel", None)
+                if uncancel is not None:
+                    # Python 3.11+ counts the cancellation requests of a task
+                    uncancel()
+                return None
+            raise
+        finally:
+            timer.cancel()
+
+    async def receive_many(self, max_n: int, timeout: Optional[float] = None) -> list:
+        """Waits until at least one message is available (or the timeout expires) and
+        drains up to max_n messages without awaiting again"""
+        first = await self.receive_message(timeout)
+        if first is None:
+            return []
+        messages = [first]
+        while len(messages) < max_n and not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from typing import Optional, Protocol
+
+
+class Clock(Protocol):
+    """
+    The Clock class is a protocol that defines every time related call of the pipeline: wall
+    time for reading timestamps, monotonic time for deadlines, sleeping and timed waits on a
+    condition. Sensors, the scheduler, Network and Logging take a Clock so a simulation can
+    swap the system clock for a VirtualClock.
+    """
+
+    def time(self) -> float:
+        """Returns the wall clock time in seconds since the epoch"""
+
+    def monotonic(self) -> float:
+        """Returns a monotonic time in seconds used for deadlines"""
+
+    def sleep(self, seconds: float) -> None:
+        """Blocks the calling thread for the given seconds"""
+
+    async def sleep_async(self, seconds: float) -> None:
+        """Suspends the calling coroutine for the given seconds"""
+
+    def wait(self, condition: threading.Condition, timeout: Optional[float]) -> bool:
+        """Waits on a held condition, returns False if the timeout expired"""
+
+    def wait_until(self, condition: threading.Condition, deadline: float) -> bool:
+        """Waits on a held condition until the monotonic deadline, used by the thread that
+        drives time forward (the sensor scheduler). Returns False if the deadline passed
+        """
+
+
+class SystemClock:
+    """The SystemClock class implements the Clock protocol with the real time functions."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    def wait(self, condition: threading.Condition, timeout: Optional[float]) -> bool:
+        return condition.wait(timeout)
+
+    def wait_until(self, condition: threading.Condition, deadline: float) -> bool:
+        return condition.wait(max(0.0, deadline - time.monotonic()))
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock:
+    """
+    The VirtualClock class is a simulated Clock that runs as fast as possible. Time only moves
+    when someone drives it: sleep moves the clock forward instead of blocking, and wait_until
+    (used by the sensor scheduler) jumps straight to its deadline. Plain timed waits, used by
+    consumers such as Network and Logging, block for at most max_real_wait real seconds so other
+    threads can notify them, and never move the clock. Starting from a fixed epoch makes
+    timestamps, and together with a seeded random generator and a single scheduler thread whole
+    runs, reproducible.
+    """
+
+    def __init__(self, start: float = 1_700_000_000.0, max_real_wait: float = 0.001):
+        self.lock: threading.Lock = threading.Lock()
+        self.start: float = start
+        self.elapsed: float = 0.0
+        self.max_real_wait: float = max_real_wait
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def advance(self, seconds: float) -> None:
+        if seconds > 0:
+            with self.lock:
+                self.elapsed += seconds
+
+    def advance_to(self, monotonic: float) -> None:
+        with self.lock:
+            self.elapsed = max(self.elapsed, monotonic)
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    async def sleep_async(self, seconds: float) -> None:
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    def wait(self, condition: threading.Condition, timeout: Optional[float]) -> bool:
+        if timeout is None:
+            return condition.wait()
+        return condition.wait(min(timeout, self.max_real_wait))
+
+    def wait_until(self, condition: threading.Condition, deadline: float) -> bool:
+        self.advance_to(deadline)
+        return False
@@ -0,0 +1,181 @@
+import bisect
+import struct
+import threading
+from typing import Iterable, Iterator, Optional, Protocol, Sequence, Union
+
+Reading = tuple[str, int, float]
+Encoded = Union[str, bytes]
+# Ids from here on are handed out by SensorRegistry.intern_range
+RANGE_BASE = 1 << 31
+
+
+class Codec(Protocol):
+    """
+    The Codec class is a protocol that defines how a sensor reading (sensor name, value and
+    timestamp) is turned into the payload carried by the Network and back. Consumers decode
+    whole batches through decode_many so a codec can amortize its work across messages.
+    """
+
+    def encode(self, sensor_name: str, value: int, timestamp: float) -> Encoded:
+        """Encodes a single reading"""
+
+    def encode_many(self, readings: Iterable[Reading]) -> Encoded:
+        """Encodes several readings into a single payload"""
+
+    def decode(self, encoded_message: Encoded) -> Reading:
+        """Decodes a single payload holding one reading"""
+
+    def decode_many(self, encoded_messages: Iterable[Encoded]) -> Iterator[Reading]:
+        """Decodes a batch of payloads into readings"""
+
+    def sensor_name(self, encoded_message: Encoded) -> str:
+        """Returns the sensor name of the (first) reading of a payload without decoding it"""
+
+
+class TextCodec:
+    """
+    The TextCodec class implements the original space separated "{name} {value} {timestamp}"
+    protocol. Value and timestamp are split from the right so sensor names may contain spaces,
+    and encode_many joins readings with new lines.
+    """
+
+    def encode(self, sensor_name: str, value: int, timestamp: float) -> str:
+        return f"{sensor_name} {value} {timestamp}"
+
+    def encode_many(self, readings: Iterable[Reading]) -> str:
+        return "\n".join(self.encode(*reading) for reading in readings)
+
+    def decode(self, encoded_message: str) -> Reading:
+        sensor_name, value, timestamp = encoded_message.rsplit(" ", 2)
+        return sensor_name, int(value), float(timestamp)
+
+    def decode_many(self, encoded_messages: Iterable[str]) -> Iterator[Reading]:
+        for encoded_message in encoded_messages:
+            for line in encoded_message.split("\n"):
+                yield self.decode(line)
+
+    def sensor_name(self, encoded_message: str) -> str:
+        return encoded_message.split("\n", 1)[0].rsplit(" ", 2)[0]
+
+
+class SensorRegistry:
+    """
+    The SensorRegistry class interns sensor names into small integer ids so binary records
+    carry a fixed size id instead of the name. It is thread-safe and shared by every producer
+    and consumer using the same BinaryCodec. intern_range interns a whole sequence of names
+    (a SensorNameIndex building them on demand) as consecutive ids from RANGE_BASE on, keeping
+    the sequence instead of one string per name.
+    """
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.range_starts: list[int] = []
+        self.ranges: list[Sequence[str]] = []
+        self.next_range: int = RANGE_BASE
+
+    def _range_id(self, sensor_name: str) -> Optional[int]:
+        for start, names in zip(self.range_starts, self.ranges):
+            try:
+                return start + names.index(sensor_name)
+            except ValueError:
+                pass
+        return None
+
+    def intern(self, sensor_name: str) -> int:
+        sensor_id = self.ids.get(sensor_name)
+        if sensor_id is not None:
+            return sensor_id
+        with self.lock:
+            sensor_id = self.ids.get(sensor_name)
+            if sensor_id is None:
+                sensor_id = self._range_id(sensor_name)
+            if sensor_id is None:
+                sensor_id = len(self.names)
+                self.names.append(sensor_name)
+                self.ids[sensor_name] = sensor_id
+            return sensor_id
+
+    def intern_range(self, names: Sequence[str]) -> int:
+        """Interns every name of the sequence, returns the id of the first one; the others
+        follow it. The sequence's index method should not scan it."""
+        with self.lock:
+            start = self.next_range
+            if start + len(names) > 1 << 32:
+                raise OverflowError("sensor ids exhausted")
+            self.range_starts.append(start)
+            self.ranges.append(names)
+            self.next_range += len(names)
+            return start
+
+    def name(self, sensor_id: int) -> str:
+        if sensor_id < RANGE_BASE:
+            return self.names[sensor_id]
+        i = bisect.bisect_right(self.range_starts, sensor_id) - 1
+        return self.ranges[i][sensor_id - self.range_starts[i]]
+
+    def __len__(self) -> int:
+        return len(self.names) + self.next_range - RANGE_BASE
+
+
+class BinaryCodec:
+    """
+    The BinaryCodec class encodes readings as fixed-layout little endian records of an
+    interned uint32 sensor id, an int16 value and a float64 timestamp (14 bytes). Several
+    records can be packed into one contiguous buffer with encode_many, and decode_many joins a
+    batch of payloads and walks it with struct.iter_unpack over a memoryview, so no strings
+    are built while decoding apart from the interned sensor names.
+    """
+
+    record = struct.Struct("<Ihd")
+
+    def __init__(self, registry: Optional[SensorRegistry] = None) -> None:
+        self.registry: SensorRegistry = (
+            registry if registry is not None else SensorRegistry()
+        )
+
+    def encode(self, sensor_name: str, value: int, timestamp: float) -> bytes:
+        return self.record.pack(self.registry.intern(sensor_name), value, timestamp)
+
+    def encode_many(self, readings: Iterable[Reading]) -> bytes:
+        readings = list(readings)
+        buffer = bytearray(self.record.size * len(readings))
+        for i, (sensor_name, value, timestamp) in enumerate(readings):
+            self.record.pack_into(
+                buffer,
+                i * self.record.size,
+                self.registry.intern(sensor_name),
+                value,
+                timestamp,
+            )
+        return bytes(buffer)
+
+    def encode_columns(
+        self,
+        sensor_ids: Sequence[int],
+        values: Sequence[int],
+        timestamps: Sequence[float],
+    ) -> bytes:
+        """Packs already interned sensor ids with their values and timestamps"""
+        buffer = bytearray(self.record.size * len(sensor_ids))
+        pack_into, size = self.record.pack_into, self.record.size
+        for i, reading in enumerate(zip(sensor_ids, values, timestamps)):
+            pack_into(buffer, i * size, *reading)
+        return bytes(buffer)
+
+    def decode(self, encoded_message: bytes) -> Reading:
+        sensor_id, value, timestamp = self.record.unpack(encoded_message)
+        return self.registry.name(sensor_id), value, timestamp
+
+    def decode_many(self, encoded_messages: Iterable[bytes]) -> Iterator[Reading]:
+        names, name = self.registry.names, self.registry.name
+        buffer = memoryview(b"".join(encoded_messages))
+        for sensor_id, value, timestamp in self.record.iter_unpack(buffer):
+            if sensor_id < RANGE_BASE:
+                yield names[sensor_id], value, timestamp
+            else:
+                yield name(sensor_id), value, timestamp
+
+    def sensor_name(self, encoded_message: bytes) -> str:
+        return self.registry.name(self.record.unpack_from(encoded_message)[0])
@@ -0,0 +1,189 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+"""
+Diagnostic logging for the pipeline, built on the standard logging module. Components get a
+DiagnosticLogger with get_logger(__name__) and log named events with key=value fields. Every
+logger lives under the "pipeline" logger, which only has a NullHandler until start_logging
+installs a QueueHandler: from then on a log call only builds a record and puts it on a queue,
+and a background QueueListener thread formats and writes it, so no I/O happens on the caller's
+thread or inside its critical sections. High rate events can be rate limited or sampled per
+event name.
+"""
+
+ROOT_LOGGER = "pipeline"
+
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    The StructuredFormatter class formats a record as one logfmt line: time, level, logger,
+    event and the record fields as key=value pairs, or as one JSON object when as_json is set.
+    """
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json: bool = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        if self.as_json:
+            return json.dumps(fields, default=str)
+        return " ".join(f"{key}={self._quote(value)}" for key, value in fields.items())
+
+    @staticmethod
+    def _quote(value) -> str:
+        text = str(value)
+        if not text or any(character in text for character in ' "=\n'):
+            return json.dumps(text)
+        return text
+
+
+class RateLimit:
+    """
+    The RateLimit class is a token bucket allowing per_second events on average with bursts of
+    up to burst events. It counts the events it rejects so the next allowed one can report them.
+    """
+
+    def __init__(self, per_second: float, burst: int = 1):
+        self.lock: threading.Lock = threading.Lock()
+        self.per_second: float = per_second
+        self.burst: int = burst
+        self.tokens: float = burst
+        self.updated: float = time.monotonic()
+        self.suppressed: int = 0
+
+    def allow(self) -> tuple[bool, int]:
+        """Returns whether the event is allowed and, if so, how many were suppressed before"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.per_second
+            )
+            self.updated = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False, 0
+            self.tokens -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+class Sample:
+    """The Sample class lets the first of every `every` events through and counts the others."""
+
+    def __init__(self, every: int):
+        self.every: int = every
+        self.counter = iter(range(sys.maxsize))
+
+    def allow(self) -> tuple[bool, int]:
+        n = next(self.counter)
+        if n % self.every:
+            return False, 0
+        return True, self.every - 1 if n else 0
+
+
+class DiagnosticLogger:
+    """
+    The DiagnosticLogger class wraps a standard logger to log named events with structured
+    fields, e.g. log.warning("message_dropped", sensor=name). Events registered with limit or
+    sample are rate limited or sampled before a record is even created; allowed records carry
+    a suppressed field with the number of events skipped since the previous one.
+    """
+
+    def __init__(self, name: str):
+        self.logger: logging.Logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self.filters: dict[str, object] = {}
+
+    def limit(
+        self, event: str, per_second: float, burst: int = 1
+    ) -> "DiagnosticLogger":
+        self.filters[event] = RateLimit(per_second, burst)
+        return self
+
+    def sample(self, event: str, every: int) -> "DiagnosticLogger":
+        self.filters[event] = Sample(every)
+        return self
+
+    def log(self, level: int, event: str, exc_info=None, **fields) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        event_filter = self.filters.get(event)
+        if event_filter is not None:
+            allowed, suppressed = event_filter.allow()
+            if not allowed:
+                return
+            if suppressed:
+                fields["suppressed"] = suppressed
+        self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, exc_info=None, **fields) -> None:
+        self.log(logging.ERROR, event, exc_info=exc_info, **fields)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    The RecordQueueHandler class puts records on the queue as they are. The standard
+    QueueHandler formats the message (and any traceback) on the caller's thread so records can
+    be pickled; an in-process queue does not need that, so all formatting is left to the
+    listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def get_logger(name: str) -> DiagnosticLogger:
+    return DiagnosticLogger(name)
+
+
+def start_logging(
+    level: int = logging.INFO,
+    stream: Optional[TextIO] = None,
+    as_json: bool = False,
+) -> QueueListener:
+    """Routes the pipeline loggers through a queue to a background thread writing to stream
+    (stderr by default). Returns the listener, to be passed to stop_logging"""
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(StructuredFormatter(as_json))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.propagate = False
+    root.handlers = [RecordQueueHandler(records)]
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: QueueListener) -> None:
+    """Writes the queued records and restores the default, silent, pipeline logger"""
+    listener.stop()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [logging.NullHandler()]
+    root.propagate = True
+    root.setLevel(logging.NOTSET)
@@ -0,0 +1,274 @@
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable, Hashable, Iterable, Optional
+
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.codec import Codec, TextCodec
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import BackpressurePolicy, Network
+
+
+class PriorityClass(IntEnum):
+    """
+    The PriorityClass enum orders flows for dequeue and admission: every message of a higher
+    class (lower value) is received before any message of a lower one, and when the network is
+    full a higher class message pushes out a queued message of a lower class.
+    """
+
+    CRITICAL = 0
+    NORMAL = 1
+    BULK = 2
+
+
+@dataclass(frozen=True)
+class FlowConfig:
+    """
+    The FlowConfig class configures one flow of a FairNetwork: its weight in the deficit round
+    robin of its priority class (messages per round, fractions allowed), its priority class and
+    an optional token bucket limiting it to rate messages per second with bursts of burst.
+    """
+
+    weight: float = 1.0
+    priority: PriorityClass = PriorityClass.NORMAL
+    rate: Optional[float] = None
+    burst: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        if self.weight <= 0:
+            raise ValueError("weight must be positive")
+
+
+class Flow:
+    """Queue, round robin deficit, token bucket and counts of one flow"""
+
+    __slots__ = (
+        "key",
+        "config",
+        "queue",
+        "deficit",
+        "in_turn",
+        "active",
+        "tokens",
+        "updated",
+        "admitted",
+        "dropped",
+    )
+
+    def __init__(self, key: Hashable, config: FlowConfig, now: float):
+        self.key: Hashable = key
+        self.config: FlowConfig = config
+        self.queue: deque = deque()
+        self.deficit: float = 0.0
+        self.in_turn: bool = False
+        self.active: bool = False
+        self.tokens: float = self.capacity
+        self.updated: float = now
+        self.admitted: int = 0
+        self.dropped: int = 0
+
+    @property
+    def capacity(self) -> float:
+        if self.config.burst is not None:
+            return self.config.burst
+        return max(1.0, self.config.rate or 0.0)
+
+    def take_token(self, now: float) -> bool:
+        if self.config.rate is None:
+            return True
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.config.rate
+        )
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def by_sensor_type(sensor_name: str) -> str:
+    """Maps the sensor names given by the factories ("SensorB_3") to their type ("SensorB")"""
+    return sensor_name.rsplit("_", 1)[0]
+
+
+class FairNetwork(Network):
+    """
+    The FairNetwork class is a Network that shares its max_messages slots fairly between flows
+    instead of first come first served. Each message is classified into a flow from its sensor
+    name (read through the codec), by sensor or, with flow_of=by_sensor_type, by sensor type.
+    Every flow has its own queue; receivers serve priority classes strictly in order and the
+    flows of a class by deficit round robin in proportion to their weights, so a fast sensor
+    cannot crowd out a slow one. Flows with a rate are limited by a token bucket, over-rate
+    messages are dropped. When the network is full a message pushes out the oldest message of
+    the longest queue of a lower priority class, otherwise the BackpressurePolicy applies, with
+    DROP_OLDEST evicting from the longest queue of its own or a lower class. Admitted and
+    dropped counts are kept per flow and exported to the MetricsRegistry.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 5,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        timeout: Optional[float] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+        codec: Optional[Codec] = None,
+        flows: Optional[dict[Hashable, FlowConfig]] = None,
+        default_flow: FlowConfig = FlowConfig(),
+        flow_of: Callable[[str], Hashable] = lambda sensor_name: sensor_name,
+    ) -> None:
+        super().__init__(max_messages, policy, timeout, clock, metrics)
+        self.buffer = []
+        self.metrics: MetricsRegistry = metrics
+        self.codec: Codec = codec or TextCodec()
+        self.flow_configs: dict[Hashable, FlowConfig] = dict(flows or {})
+        self.default_flow: FlowConfig = default_flow
+        self.flow_of: Callable[[str], Hashable] = flow_of
+        self.flows: dict[Hashable, Flow] = {}
+        self.active: dict[PriorityClass, deque[Flow]] = {
+            priority: deque() for priority in PriorityClass
+        }
+
+    def _flow(self, encoded_message) -> Flow:
+        """Returns the flow of a message, creating it on first use. Must hold the lock."""
+        key = self.flow_of(self.codec.sensor_name(encoded_message))
+        flow = self.flows.get(key)
+        if flow is None:
+            config = self.flow_configs.get(key, self.default_flow)
+            flow = self.flows[key] = Flow(key, config, self.clock.monotonic())
+            self.metrics.counter(
+                "network_flow_admitted_total",
+                "Messages admitted per flow",
+                lambda: flow.admitted,
+                flow=key,
+            )
+            self.metrics.counter(
+                "network_flow_dropped_total",
+                "Messages dropped per flow",
+                lambda: flow.dropped,
+                flow=key,
+            )
+        return flow
+
+    def _push_to(self, flow: Flow, encoded_message) -> None:
+        flow.queue.append(encoded_message)
+        flow.admitted += 1
+        if not flow.active:
+            flow.active = True
+            self.active[flow.config.priority].append(flow)
+        self.size += 1
+        self.sent += 1
+        if self.size > self.peak:
+            self.peak = self.size
+
+    def _deactivate(self, flow: Flow) -> None:
+        flow.active = False
+        flow.in_turn = False
+        flow.deficit = 0.0
+
+    def _pop(self):
+        for priority in PriorityClass:
+            active = self.active[priority]
+            while active:
+                flow = active[0]
+                if not flow.in_turn:
+                    flow.deficit += flow.config.weight
+                    flow.in_turn = True
+                if flow.deficit < 1:
+                    active.rotate(-1)
+                    flow.in_turn = False
+                    continue
+                flow.deficit -= 1
+                encoded_message = flow.queue.popleft()
+                if not flow.queue:
+                    active.popleft()
+                    self._deactivate(flow)
+                elif flow.deficit < 1:
+                    active.rotate(-1)
+                    flow.in_turn = False
+                self.size -= 1
+                return encoded_message
+        raise IndexError("pop from an empty FairNetwork")
+
+    def _evict(self, lowest: PriorityClass) -> bool:
+        """Drops the oldest message of the longest queue among the classes from lowest down.
+        Must hold the lock."""
+        victims = [
+            flow
+            for priority in PriorityClass
+            if priority >= lowest
+            for flow in self.active[priority]
+        ]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda flow: (flow.config.priority, len(flow.queue)))
+        victim.queue.popleft()
+        victim.dropped += 1
+        self.dropped += 1
+        self.size -= 1
+        if not victim.queue:
+            self.active[victim.config.priority].remove(victim)
+            self._deactivate(victim)
+        return True
+
+    def _admit(self, flow: Flow, deadline: Optional[float]) -> bool:
+        """Applies the rate limit, push-out and backpressure policy. Must hold the lock."""
+        if not flow.take_token(self.clock.monotonic()):
+            flow.dropped += 1
+            self.dropped += 1
+            return False
+        if self.size < self.max_messages:
+            return True
+        if flow.config.priority < PriorityClass.BULK and self._evict(
+            PriorityClass(flow.config.priority + 1)
+        ):
+            self.full += 1
+            return True
+        if self.policy is BackpressurePolicy.DROP_OLDEST:
+            self.full += 1
+            if self._evict(flow.config.priority):
+                return True
+        elif self.policy is BackpressurePolicy.DROP_NEWEST:
+            self.full += 1
+        else:
+            return self._wait_for_room(deadline)
+        flow.dropped += 1
+        self.dropped += 1
+        return False
+
+    def send_message(self, encoded_message) -> bool:
+        deadline = self._deadline()
+        with self.lock:
+            flow = self._flow(encoded_message)
+            if not self._admit(flow, deadline):
+                return False
+            self._push_to(flow, encoded_message)
+            self.not_empty.notify()
+        return True
+
+    def send_many(self, encoded_messages: Iterable) -> int:
+        pending = list(encoded_messages)
+        deadline = self._deadline()
+        sent = 0
+        with self.lock:
+            for encoded_message in pending:
+                flow = self._flow(encoded_message)
+                if not self._admit(flow, deadline):
+                    continue
+                self._push_to(flow, encoded_message)
+                sent += 1
+                if self.size == 1:
+                    self.not_empty.notify_all()
+        return sent
+
+    def flow_counts(self) -> dict[Hashable, dict[str, int]]:
+        """Returns the admitted, dropped and queued messages of every flow"""
+        with self.lock:
+            return {
+                key: {
+                    "admitted": flow.admitted,
+                    "dropped": flow.dropped,
+                    "queued": len(flow.queue),
+                }
+                for key, flow in self.flows.items()
+            }
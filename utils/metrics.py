@@ -0,0 +1,309 @@
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+
+Labels = tuple[tuple[str, str], ...]
+Snapshot = dict[str, Union[float, dict[str, float]]]
+
+
+def _labels_text(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """
+    The Counter class is a monotonically increasing count. A counter created with a function
+    reads its value from it instead, which lets a component keep plain integers it already
+    updates under its own lock and expose them without any extra cost on the hot path.
+    """
+
+    kind = "counter"
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self.lock: threading.Lock = threading.Lock()
+        self.function: Optional[Callable[[], float]] = function
+        self.count: float = 0
+
+    def inc(self, n: float = 1) -> None:
+        with self.lock:
+            self.count += n
+
+    @property
+    def value(self) -> float:
+        return self.function() if self.function is not None else self.count
+
+
+class Gauge(Counter):
+    """The Gauge class is a value that can go up and down, set directly or read from a function."""
+
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.count = value
+
+    def dec(self, n: float = 1) -> None:
+        self.inc(-n)
+
+
+class Histogram:
+    """
+    The Histogram class is an HDR-style log-linear histogram. Recorded values are converted to
+    integers of unit (microseconds by default) and counted in buckets: values below
+    2 ** sub_bucket_bits get one bucket each, larger values get 2 ** (sub_bucket_bits - 1)
+    buckets per power of two, so percentiles keep a bounded relative error (about 3% with the
+    default 5 bits) over any range of values while a record is a couple of integer operations.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, unit: float = 1e-6, sub_bucket_bits: int = 5):
+        self.lock: threading.Lock = threading.Lock()
+        self.unit: float = unit
+        self.sub_bucket_bits: int = sub_bucket_bits
+        self.sub_buckets: int = 1 << sub_bucket_bits
+        self.counts: list[int] = []
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def _index(self, n: int) -> int:
+        if n < self.sub_buckets:
+            return n
+        shift = n.bit_length() - self.sub_bucket_bits
+        return (shift << (self.sub_bucket_bits - 1)) + (n >> shift)
+
+    def _highest_value(self, index: int) -> int:
+        """Returns the largest integer counted in the bucket at index"""
+        if index < self.sub_buckets:
+            return index
+        shift = (index >> (self.sub_bucket_bits - 1)) - 1
+        mantissa = index - (shift << (self.sub_bucket_bits - 1))
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value: float) -> None:
+        index = self._index(max(0, int(value / self.unit)))
+        with self.lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> float:
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(q / 100 * self.count))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(self.max, self._highest_value(index) * self.unit)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def value(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+        }
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """
+    The MetricsRegistry class creates and keeps the metrics of the pipeline, identified by a
+    name and optional labels (e.g. sensor="SensorA_0"). Asking twice for the same name and
+    labels returns the same metric, so components can resolve their metrics once and update
+    them on the hot path. A metric read from a function belongs to the component that passed
+    it, so registering a second one under the same name and labels raises ValueError; such
+    components take a label telling their instances apart. snapshot returns every current value, render_text formats them in the
+    Prometheus text format and serve exposes both over a local HTTP endpoint.
+    """
+
+    enabled: bool = True
+
+    def __init__(self):
+        self.lock: threading.Lock = threading.Lock()
+        self.metrics: dict[tuple[str, Labels], Metric] = {}
+        self.descriptions: dict[str, str] = {}
+
+    def _get(
+        self,
+        factory: Callable[[], Metric],
+        name: str,
+        description: str,
+        labels,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Metric:
+        key = (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is not None and function is not None:
+                raise ValueError(
+                    f"metric {name}{_labels_text(key[1])} is already registered"
+                )
+            if metric is None:
+                metric = self.metrics[key] = factory()
+                if description:
+                    self.descriptions.setdefault(name, description)
+            return metric
+
+    def counter(
+        self,
+        name: str,
+        description: str = "",
+        function: Optional[Callable[[], float]] = None,
+        **labels,
+    ) -> Counter:
+        return self._get(lambda: Counter(function), name, description, labels, function)
+
+    def gauge(
+        self,
+        name: str,
+        description: str = "",
+        function: Optional[Callable[[], float]] = None,
+        **labels,
+    ) -> Gauge:
+        return self._get(lambda: Gauge(function), name, description, labels, function)
+
+    def histogram(
+        self, name: str, description: str = "", unit: float = 1e-6, **labels
+    ) -> Histogram:
+        return self._get(lambda: Histogram(unit), name, description, labels)
+
+    def _items(self) -> list[tuple[tuple[str, Labels], Metric]]:
+        with self.lock:
+            return sorted(self.metrics.items(), key=lambda item: item[0])
+
+    def snapshot(self) -> Snapshot:
+        """Returns {name{labels}: value}, histograms as a dict of count, sum, max and percentiles"""
+        return {
+            name + _labels_text(labels): metric.value
+            for (name, labels), metric in self._items()
+        }
+
+    def render_text(self) -> str:
+        lines, described = [], set()
+        for (name, labels), metric in self._items():
+            if name not in described:
+                described.add(name)
+                if name in self.descriptions:
+                    lines.append(f"# HELP {name} {self.descriptions[name]}")
+                kind = "summary" if metric.kind == "histogram" else metric.kind
+                lines.append(f"# TYPE {name} {kind}")
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_labels_text(labels)} {metric.value}")
+                continue
+            summary = metric.value
+            for quantile, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99")):
+                quantile_labels = labels + (("quantile", quantile),)
+                lines.append(f"{name}{_labels_text(quantile_labels)} {summary[key]}")
+            lines.append(f"{name}_sum{_labels_text(labels)} {summary['sum']}")
+            lines.append(f"{name}_count{_labels_text(labels)} {summary['count']}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9100) -> "MetricsServer":
+        server = MetricsServer(self, host, port)
+        server.start()
+        return server
+
+
+class NullMetric:
+    """The NullMetric class accepts every metric update and does nothing."""
+
+    kind = "null"
+    value = 0
+
+    def inc(self, n: float = 1) -> None:
+        pass
+
+    def dec(self, n: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def record(self, value: float) -> None:
+        pass
+
+
+NULL_METRIC = NullMetric()
+
+
+class NullMetricsRegistry(MetricsRegistry):
+    """
+    The NullMetricsRegistry class is the disabled registry used by default: every metric it
+    hands out is the shared NullMetric and nothing is kept, so instrumented code only pays for
+    a no-op method call. Timings that need a clock read check enabled first.
+    """
+
+    enabled: bool = False
+
+    def _get(self, factory, name, description, labels, function=None) -> NullMetric:
+        return NULL_METRIC
+
+
+NULL_METRICS = NullMetricsRegistry()
+
+
+class MetricsServer(threading.Thread):
+    """
+    The MetricsServer class serves a MetricsRegistry over HTTP from a daemon thread:
+    /metrics returns render_text and /metrics.json the snapshot. Port 0 picks a free port,
+    available as port once the server is created.
+    """
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9100
+    ):
+        super().__init__(daemon=True)
+        self.registry: MetricsRegistry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler) -> None:
+                if handler.path == "/metrics":
+                    body = registry.render_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif handler.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args) -> None:
+                pass
+
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), Handler)
+        self.port: int = self.server.server_address[1]
+
+    def run(self) -> None:
+        self.server.serve_forever()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,40 +1,223 @@
 import threading
+import time
+from enum import Enum
+from typing import Iterable, Optional, Protocol
+
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.metrics import NULL_METRICS, MetricsRegistry
+
+
+class NetworkFullError(Exception):
+    """Raised when a message cannot be admitted before the send timeout expires."""
+
+
+class BackpressurePolicy(Enum):
+    """
+    The BackpressurePolicy enum defines what a producer does when the network already holds
+    max_messages messages: wait for room, wait for room up to a timeout, evict the oldest
+    buffered message, or discard the message being sent.
+    """
+
+    BLOCK = "block"
+    BLOCK_TIMEOUT = "block_timeout"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+
+
+class MessageSender(Protocol):
+    """
+    The MessageSender class is a protocol for the producer side of a network, what sensors
+    send through: Network and its variants in process, SocketNetwork across processes or
+    machines.
+    """
+
+    def send_message(self, encoded_message) -> bool:
+        """Sends one message, returns False if it was dropped"""
+
+    def send_many(self, encoded_messages: Iterable) -> int:
+        """Sends several messages, returns the number admitted"""
+
+
+class MessageReceiver(Protocol):
+    """
+    The MessageReceiver class is a protocol for the consumer side of a network, what Logging
+    receives from: Network and its variants in process, SocketCollector across processes or
+    machines.
+    """
+
+    def receive_message(self, timeout: Optional[float] = None):
+        """Receives one message, returns None if the timeout expires"""
+
+    def receive_many(self, max_n: int, timeout: Optional[float] = None) -> list:
+        """Receives up to max_n messages, returns an empty list if the timeout expires"""
 
 
 class Network:
     """
     The Network class provides a thread-safe way to send and receive messages between different
-    parts of a program. It uses a semaphore to limit the number of messages that can be sent at once,
-    and a buffer queue to store messages until they are received. The class also uses a condition
-    variable to allow threads to wait for new messages to arrive.
+    parts of a program. Messages are stored in a bounded ring buffer of max_messages slots, so no
+    message is overwritten while it waits to be received. Producers and consumers share a single
+    lock with two condition variables (not_empty/not_full), and the batch methods send_many and
+    receive_many move several messages per lock round-trip. When the buffer is full the configured
+    BackpressurePolicy decides whether the producer blocks, times out or drops a message.
+    Deadlines and timed waits go through the given Clock. The sent, dropped and full counts and
+    the buffer depth are plain integers updated under the lock and exported to the given
+    MetricsRegistry as function metrics; only producers that actually have to wait for room
+    are timed.
     """
 
-    def __init__(self, max_messages: int = 5) -> None:
-        self.encoded_message: str = None
+    def __init__(
+        self,
+        max_messages: int = 5,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        timeout: Optional[float] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ) -> None:
+        if max_messages < 1:
+            raise ValueError("max_messages must be at least 1")
+        self.clock: Clock = clock
+        self.max_messages: int = max_messages
+        self.policy: BackpressurePolicy = policy
+        self.timeout: Optional[float] = timeout
         self.lock: threading.Lock = threading.Lock()
-        self.semaphore: threading.Semaphore = threading.Semaphore(max_messages)
-        self.condition: threading.Condition = threading.Condition(self.lock)
-        self.buffer_queue: list[str] = []
-
-    def send_message(self, encoded_message: str) -> None:
-        with self.condition:
-            if self.semaphore._value == 0:
-                raise threading.BrokenBarrierError(
-                    "The maximum number of messages has been reached."
-                )
-            self.semaphore.acquire()
-            print(f"Sending message: {encoded_message}")
-            self.new_mesasge: bool = True
-            self.encoded_message: str = encoded_message
-            self.buffer_queue: List[str] = [encoded_message]
-            self.condition.notify_all()  # Notify waiting consumers
-
-    def receive_message(self) -> str:
-        with self.condition:
-            while not self.buffer_queue:
-                self.condition.wait()  # Wait for notification from the producer
-            for message in self.buffer_queue:
-                # print(f"Receiving message: {message}")
-                self.buffer_queue.remove(message)
-                self.semaphore.release()
-                return self.encoded_message
+        self.not_empty: threading.Condition = threading.Condition(self.lock)
+        self.not_full: threading.Condition = threading.Condition(self.lock)
+        self.buffer: list = [None] * max_messages
+        self.head: int = 0
+        self.size: int = 0
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.full: int = 0
+        self.peak: int = 0
+        metrics.counter(
+            "network_sent_total", "Messages admitted to the network", lambda: self.sent
+        )
+        metrics.counter(
+            "network_dropped_total",
+            "Messages dropped by the backpressure policy",
+            lambda: self.dropped,
+        )
+        metrics.counter(
+            "network_full_total",
+            "Sends that found the buffer at max_messages",
+            lambda: self.full,
+        )
+        metrics.gauge("network_depth", "Messages in the buffer", lambda: self.size)
+        metrics.gauge(
+            "network_depth_max", "Deepest the buffer has been", lambda: self.peak
+        )
+        self.send_wait = metrics.histogram(
+            "network_send_wait_seconds", "Time producers waited for room"
+        )
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.size
+
+    def _push(self, encoded_message) -> None:
+        self.buffer[(self.head + self.size) % self.max_messages] = encoded_message
+        self.size += 1
+        self.sent += 1
+        if self.size > self.peak:
+            self.peak = self.size
+
+    def _pop(self):
+        encoded_message = self.buffer[self.head]
+        self.buffer[self.head] = None
+        self.head = (self.head + 1) % self.max_messages
+        self.size -= 1
+        return encoded_message
+
+    def _wait_for_room(self, deadline: Optional[float]) -> bool:
+        """Applies the backpressure policy while the buffer is full. Must hold the lock."""
+        if self.size < self.max_messages:
+            return True
+        self.full += 1
+        if self.policy is BackpressurePolicy.DROP_NEWEST:
+            self.dropped += 1
+            return False
+        if self.policy is BackpressurePolicy.DROP_OLDEST:
+            self._pop()
+            self.dropped += 1
+            return True
+        started = time.perf_counter()
+        try:
+            while self.size == self.max_messages:
+                if deadline is None:
+                    self.not_full.wait()
+                    continue
+                remaining = deadline - self.clock.monotonic()
+                if remaining <= 0 or not self.clock.wait(self.not_full, remaining):
+                    if self.size == self.max_messages:
+                        raise NetworkFullError(
+                            "The maximum number of messages has been reached."
+                        )
+        finally:
+            self.send_wait.record(time.perf_counter() - started)
+        return True
+
+    def _deadline(self) -> Optional[float]:
+        if self.policy is BackpressurePolicy.BLOCK_TIMEOUT and self.timeout is not None:
+            return self.clock.monotonic() + self.timeout
+        return None
+
+    def _wait_for_messages(self, timeout: Optional[float]) -> bool:
+        """Waits until the buffer holds a message. Must hold the lock."""
+        if timeout is None:
+            while self.size == 0:
+                self.not_empty.wait()
+            return True
+        deadline = self.clock.monotonic() + timeout
+        while self.size == 0:
+            remaining = deadline - self.clock.monotonic()
+            if remaining <= 0:
+                return False
+            self.clock.wait(self.not_empty, remaining)
+        return True
+
+    def send_message(self, encoded_message) -> bool:
+        """Sends one message, returns False if it was dropped by the backpressure policy"""
+        deadline = self._deadline()
+        with self.lock:
+            if not self._wait_for_room(deadline):
+                return False
+            self._push(encoded_message)
+            self.not_empty.notify()
+        return True
+
+    def send_many(self, encoded_messages: Iterable) -> int:
+        """Sends several messages filling as many free slots as possible per lock
+        acquisition, returns the number of messages admitted to the buffer"""
+        pending = list(encoded_messages)
+        deadline = self._deadline()
+        sent = 0
+        with self.lock:
+            for encoded_message in pending:
+                if not self._wait_for_room(deadline):
+                    continue
+                self._push(encoded_message)
+                sent += 1
+                if self.size == 1:
+                    self.not_empty.notify_all()
+        return sent
+
+    def receive_message(self, timeout: Optional[float] = None):
+        """Receives one message, waiting for it. Returns None if the timeout expires"""
+        with self.lock:
+            if not self._wait_for_messages(timeout):
+                return None
+            encoded_message = self._pop()
+            self.not_full.notify()
+            return encoded_message
+
+    def receive_many(self, max_n: int, timeout: Optional[float] = None) -> list:
+        """Waits until at least one message is available (or the timeout expires) and
+        drains up to max_n messages in a single lock round-trip"""
+        with self.lock:
+            if not self._wait_for_messages(timeout):
+                return []
+            count = min(max_n, self.size)
+            messages = [self._pop() for _ in range(count)]
+            self.not_full.notify(count)
+            return messages
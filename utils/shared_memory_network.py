@@ -0,0 +1,127 @@
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+from typing import Iterable, Optional
+
+from utils.codec import BinaryCodec
+from utils.network import NetworkFullError
+
+
+class SharedMemoryNetwork:
+    """
+    The SharedMemoryNetwork class carries fixed-size binary records (BinaryCodec records by
+    default) between processes through a ring buffer of max_messages slots placed in a
+    multiprocessing.shared_memory block, so messages are copied into shared memory instead of
+    being pickled through a pipe. Two process-shared semaphores count free and filled slots and
+    a lock guards the read/write indices kept in the block header. It exposes the same
+    send/receive methods as Network, so Logging can consume from it unchanged; payloads holding
+    several packed records (BinaryCodec.encode_many) are split into one slot per record.
+    An instance is handed to child processes as a multiprocessing.Process argument, and the
+    process that created it must call close() with unlink=True when done.
+    """
+
+    header = struct.Struct("<QQ")
+
+    def __init__(
+        self,
+        max_messages: int = 5,
+        record_size: int = BinaryCodec.record.size,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if max_messages < 1:
+            raise ValueError("max_messages must be at least 1")
+        self.max_messages: int = max_messages
+        self.record_size: int = record_size
+        self.timeout: Optional[float] = timeout
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=self.header.size + max_messages * record_size
+        )
+        self.header.pack_into(self.memory.buf, 0, 0, 0)
+        self.lock = multiprocessing.Lock()
+        self.free_slots = multiprocessing.Semaphore(max_messages)
+        self.filled_slots = multiprocessing.Semaphore(0)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["memory"] = self.memory.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.memory = shared_memory.SharedMemory(name=state["memory"])
+
+    def __len__(self) -> int:
+        with self.lock:
+            write_index, read_index = self.header.unpack_from(self.memory.buf, 0)
+        return write_index - read_index
+
+    def _records(self, encoded_message: bytes) -> list[bytes]:
+        if len(encoded_message) % self.record_size:
+            raise ValueError(
+                f"Payload of {len(encoded_message)} bytes is not a multiple of {self.record_size}"
+            )
+        view = memoryview(encoded_message)
+        return [
+            view[offset : offset + self.record_size]
+            for offset in range(0, len(encoded_message), self.record_size)
+        ]
+
+    def _offset(self, index: int) -> int:
+        return self.header.size + (index % self.max_messages) * self.record_size
+
+    def send_message(self, encoded_message: bytes) -> bool:
+        return self.send_many([encoded_message]) > 0
+
+    def send_many(self, encoded_messages: Iterable[bytes]) -> int:
+        """Copies every record into the ring, waiting for free slots. Returns the number of
+        records sent"""
+        records = [
+            record
+            for encoded_message in encoded_messages
+            for record in self._records(encoded_message)
+        ]
+        for record in records:
+            if not self.free_slots.acquire(timeout=self.timeout):
+                raise NetworkFullError(
+                    "The maximum number of messages has been reached."
+                )
+            with self.lock:
+                write_index, read_index = self.header.unpack_from(self.memory.buf, 0)
+                offset = self._offset(write_index)
+                self.memory.buf[offset : offset + self.record_size] = record
+                self.header.pack_into(self.memory.buf, 0, write_index + 1, read_index)
+            self.filled_slots.release()
+        return len(records)
+
+    def receive_message(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        messages = self.receive_many(1, timeout=timeout)
+        return messages[0] if messages else None
+
+    def receive_many(self, max_n: int, timeout: Optional[float] = None) -> list[bytes]:
+        """Waits until at least one record is available (or the timeout expires) and copies
+        up to max_n records out of the ring as one contiguous payload"""
+        if max_n < 1 or not self.filled_slots.acquire(timeout=timeout):
+            return []
+        count = 1
+        while count < max_n and self.filled_slots.acquire(block=False):
+            count += 1
+        with self.lock:
+            write_index, read_index = self.header.unpack_from(self.memory.buf, 0)
+            # The records span at most two contiguous runs of the ring
+            start = self._offset(read_index)
+            first = min(count, self.max_messages - read_index % self.max_messages)
+            payload = bytes(self.memory.buf[start : start + first * self.record_size])
+            if first < count:
+                rest = (count - first) * self.record_size
+                payload += bytes(
+                    self.memory.buf[self.header.size : self.header.size + rest]
+                )
+            self.header.pack_into(self.memory.buf, 0, write_index, read_index + count)
+        for _ in range(count):
+            self.free_slots.release()
+        return [payload]
+
+    def close(self, unlink: bool = False) -> None:
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
@@ -0,0 +1,558 @@
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional, Union
+
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.diagnostics import get_logger
+from utils.metrics import NULL_METRICS, MetricsRegistry
+from utils.network import BackpressurePolicy, Network, NetworkFullError
+
+log = get_logger(__name__).limit("connection_failed", per_second=1)
+
+Address = Union[tuple[str, int], str]
+
+# Every frame is a 4 byte big-endian body length, a kind byte and the body
+HEADER = struct.Struct("!IB")
+CREDIT = struct.Struct("!I")
+TEXT, BINARY, GRANT, REQUEST = b"T"[0], b"B"[0], b"C"[0], b"R"[0]
+
+
+def parse_address(text: str) -> Address:
+    """Parses "host:port" into a TCP address, anything else is a Unix socket path"""
+    host, _, port = text.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return text
+
+
+def _family(address: Address) -> int:
+    return socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+
+
+def _frame(kind: int, body: bytes) -> bytes:
+    return HEADER.pack(len(body), kind) + body
+
+
+def _message_frame(encoded_message) -> bytes:
+    if isinstance(encoded_message, str):
+        return _frame(TEXT, encoded_message.encode())
+    return _frame(BINARY, bytes(encoded_message))
+
+
+def _parse_frames(buffer: bytearray) -> tuple[list[tuple[int, bytes]], int]:
+    """Returns the complete (kind, body) frames at the start of buffer and the bytes they take"""
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= HEADER.size:
+        length, kind = HEADER.unpack_from(buffer, offset)
+        end = offset + HEADER.size + length
+        if end > len(buffer):
+            break
+        frames.append((kind, bytes(buffer[offset + HEADER.size : end])))
+        offset = end
+    return frames, offset
+
+
+class Connection:
+    """
+    One persistent socket of a SocketNetwork: the credits granted by the collector, the frames
+    waiting to be coalesced into one write and the thread reading credit grants.
+    """
+
+    def __init__(self, sock: socket.socket, network: "SocketNetwork"):
+        self.sock: socket.socket = sock
+        self.lock: threading.Lock = threading.Lock()
+        self.granted: threading.Condition = threading.Condition(self.lock)
+        self.send_lock: threading.Lock = threading.Lock()
+        self.credits: int = 0
+        self.requested: bool = False
+        self.pending: deque[bytes] = deque()
+        self.pending_bytes: int = 0
+        self.broken: bool = False
+        self.reader: threading.Thread = threading.Thread(
+            target=self._read_grants, args=(network,), daemon=True
+        )
+        self.reader.start()
+
+    def _read_grants(self, network: "SocketNetwork") -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = self.sock.recv(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+                frames, consumed = _parse_frames(buffer)
+                del buffer[:consumed]
+                granted = sum(
+                    CREDIT.unpack(body)[0] for kind, body in frames if kind == GRANT
+                )
+                if granted:
+                    with self.lock:
+                        self.credits += granted
+                        self.requested = False
+                        self.granted.notify_all()
+        except OSError:
+            pass
+        with self.lock:
+            self.broken = True
+            self.granted.notify_all()
+        if network.runing:
+            log.warning("connection_failed", reason="closed by the collector")
+
+    def take(self) -> bytes:
+        """Returns the coalesced pending frames and empties them. Must hold the lock."""
+        data = b"".join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        return data
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.reader.join(1.0)
+
+
+class SocketNetwork:
+    """
+    The SocketNetwork class is the sending side of a network spanning processes or machines:
+    sensors send to it as to a Network and the messages travel over TCP (address given as a
+    (host, port) tuple) or a Unix domain socket (a path) to a SocketCollector, as length-prefixed
+    frames. Each sending thread keeps using one of up to `connections` persistent connections.
+    Frames are coalesced Nagle-style into one write per connection: flushed once max_batch_bytes
+    are pending or linger seconds after the first pending frame (linger=0 writes every send).
+    The collector enforces its max_messages through credit-based flow control: a message may
+    only be sent with a credit granted by the collector, and a connection out of credits asks for
+    more and applies the BackpressurePolicy meanwhile (DROP_OLDEST drops the oldest frame not yet
+    written). A broken connection drops its unwritten frames and is reopened on a later send,
+    at most once every reconnect_interval seconds. Sent, dropped and flush counts are exported
+    to the MetricsRegistry.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        connections: int = 1,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        timeout: Optional[float] = None,
+        linger: float = 0.005,
+        max_batch_bytes: int = 64 * 1024,
+        credit_request: int = 64,
+        reconnect_interval: float = 1.0,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+    ) -> None:
+        if connections < 1:
+            raise ValueError("connections must be at least 1")
+        self.address: Address = address
+        self.policy: BackpressurePolicy = policy
+        self.timeout: Optional[float] = timeout
+        self.linger: float = linger
+        self.max_batch_bytes: int = max_batch_bytes
+        self.credit_request: int = credit_request
+        self.reconnect_interval: float = reconnect_interval
+        self.clock: Clock = clock
+        self.runing: bool = True
+        self.connections: list[Optional[Connection]] = [None] * connections
+        self.last_attempt: list[float] = [float("-inf")] * connections
+        self.pool_lock: threading.Lock = threading.Lock()
+        self.next_connection: int = 0
+        self.affinity: threading.local = threading.local()
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.flushes: int = 0
+        self.flush_condition: threading.Condition = threading.Condition()
+        self.dirty: bool = False
+        self.urgent: bool = False
+        metrics.counter(
+            "network_sent_total", "Messages admitted to the network", lambda: self.sent
+        )
+        metrics.counter(
+            "network_dropped_total",
+            "Messages dropped by the backpressure policy or a broken connection",
+            lambda: self.dropped,
+        )
+        metrics.counter(
+            "network_flushes_total", "Coalesced socket writes", lambda: self.flushes
+        )
+        self.flusher: threading.Thread = threading.Thread(
+            target=self._flush_loop, daemon=True
+        )
+        self.flusher.start()
+
+    def _connect(self, index: int) -> Optional[Connection]:
+        """Returns the connection at index, opening it if needed. Must hold pool_lock."""
+        connection = self.connections[index]
+        if connection is not None and not connection.broken:
+            return connection
+        if connection is not None:
+            with connection.lock:
+                self._discard(connection)
+            connection.close()
+            self.connections[index] = None
+        now = time.monotonic()
+        if now - self.last_attempt[index] < self.reconnect_interval:
+            return None
+        self.last_attempt[index] = now
+        sock = socket.socket(_family(self.address), socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except OSError as e:
+            sock.close()
+            log.warning("connection_failed", address=str(self.address), reason=str(e))
+            return None
+        if not isinstance(self.address, str):
+            # Frames are coalesced here, Nagle's algorithm would only add latency
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = self.connections[index] = Connection(sock, self)
+        return connection
+
+    def _connection(self) -> Optional[Connection]:
+        index = getattr(self.affinity, "index", None)
+        with self.pool_lock:
+            if index is None:
+                index = self.affinity.index = self.next_connection
+                self.next_connection = (self.next_connection + 1) % len(
+                    self.connections
+                )
+            return self._connect(index)
+
+    def _request_credits(self, connection: Connection) -> None:
+        """Queues a credit request ahead of the pending frames. Must hold the lock."""
+        if connection.requested:
+            return
+        connection.requested = True
+        frame = _frame(REQUEST, CREDIT.pack(self.credit_request))
+        connection.pending.appendleft(frame)
+        connection.pending_bytes += len(frame)
+        with self.flush_condition:
+            self.dirty = self.urgent = True
+            self.flush_condition.notify()
+
+    def _take_credit(self, connection: Connection, deadline: Optional[float]) -> bool:
+        """Takes a credit for one message following the backpressure policy. Must hold the
+        lock."""
+        while connection.credits == 0:
+            if connection.broken:
+                return False
+            self._request_credits(connection)
+            if self.policy is BackpressurePolicy.DROP_NEWEST:
+                return False
+            if self.policy is BackpressurePolicy.DROP_OLDEST:
+                # The credit of the oldest unwritten message goes to the new one
+                for i, frame in enumerate(connection.pending):
+                    if frame[HEADER.size - 1] in (TEXT, BINARY):
+                        del connection.pending[i]
+                        connection.pending_bytes -= len(frame)
+                        self.dropped += 1
+                        return True
+                return False
+            if deadline is None:
+                connection.granted.wait()
+                continue
+            remaining = deadline - self.clock.monotonic()
+            if remaining <= 0 or not self.clock.wait(connection.granted, remaining):
+                if connection.credits == 0:
+                    raise NetworkFullError(
+                        "The maximum number of messages has been reached."
+                    )
+        connection.credits -= 1
+        return True
+
+    def _deadline(self) -> Optional[float]:
+        if self.policy is BackpressurePolicy.BLOCK_TIMEOUT and self.timeout is not None:
+            return self.clock.monotonic() + self.timeout
+        return None
+
+    def send_message(self, encoded_message) -> bool:
+        return self.send_many([encoded_message]) == 1
+
+    def send_many(self, encoded_messages: Iterable) -> int:
+        frames = [
+            _message_frame(encoded_message) for encoded_message in encoded_messages
+        ]
+        connection = self._connection()
+        if connection is None:
+            self.dropped += len(frames)
+            return 0
+        deadline = self._deadline()
+        sent = 0
+        error: Optional[NetworkFullError] = None
+        with connection.lock:
+            try:
+                for frame in frames:
+                    if not self._take_credit(connection, deadline):
+                        self.dropped += 1
+                        continue
+                    connection.pending.append(frame)
+                    connection.pending_bytes += len(frame)
+                    sent += 1
+            except NetworkFullError as e:
+                # The frames admitted before the timeout are still counted and written
+                error = e
+            self.sent += sent
+            full = connection.pending_bytes >= self.max_batch_bytes
+        if full or self.linger == 0:
+            self._flush(connection)
+        elif sent:
+            with self.flush_condition:
+                if not self.dirty:
+                    self.dirty = True
+                    self.flush_condition.notify()
+        if error is not None:
+            raise error
+        return sent
+
+    def _discard(self, connection: Connection) -> None:
+        """Drops the unwritten frames of a broken connection. Must hold its lock."""
+        self.dropped += sum(
+            1
+            for frame in connection.pending
+            if frame[HEADER.size - 1] in (TEXT, BINARY)
+        )
+        connection.take()
+
+    def _flush(self, connection: Connection) -> None:
+        with connection.send_lock:
+            with connection.lock:
+                if connection.broken:
+                    self._discard(connection)
+                    return
+                if not connection.pending:
+                    return
+                data = connection.take()
+            try:
+                connection.sock.sendall(data)
+                self.flushes += 1
+            except OSError as e:
+                with connection.lock:
+                    connection.broken = True
+                    connection.granted.notify_all()
+                log.warning(
+                    "connection_failed", address=str(self.address), reason=str(e)
+                )
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self.flush_condition:
+                while not self.dirty and self.runing:
+                    self.flush_condition.wait()
+                if not self.urgent:
+                    # Let more frames join the write unless a credit request is waiting
+                    self.flush_condition.wait_for(lambda: self.urgent, self.linger)
+                self.dirty = self.urgent = False
+                runing = self.runing
+            for connection in list(self.connections):
+                if connection is not None:
+                    self._flush(connection)
+            if not runing:
+                return
+
+    def flush(self) -> None:
+        """Writes the pending frames of every connection"""
+        for connection in list(self.connections):
+            if connection is not None:
+                self._flush(connection)
+
+    def close(self) -> None:
+        """Writes the pending frames and closes the connections"""
+        self.flush()
+        with self.flush_condition:
+            self.runing = False
+            self.flush_condition.notify()
+        self.flusher.join()
+        with self.pool_lock:
+            for connection in self.connections:
+                if connection is not None:
+                    connection.close()
+            self.connections = [None] * len(self.connections)
+
+
+class Peer:
+    """A connection accepted by a SocketCollector with the credits it holds"""
+
+    __slots__ = ("sock", "send_lock", "credits", "wanted", "starving")
+
+    def __init__(self, sock: socket.socket):
+        self.sock: socket.socket = sock
+        self.send_lock: threading.Lock = threading.Lock()
+        self.credits: int = 0
+        self.wanted: int = 0
+        self.starving: bool = False
+
+    def grant(self, credits: int) -> None:
+        try:
+            with self.send_lock:
+                self.sock.sendall(_frame(GRANT, CREDIT.pack(credits)))
+        except OSError:
+            pass
+
+
+class SocketCollector(Network):
+    """
+    The SocketCollector class is the receiving side of a SocketNetwork: a Network that Logging
+    consumes from unchanged, filled by the messages of every sensor process connected to
+    address. The max_messages slots are shared out as credits so the cap holds across all
+    connections: a credit is granted only for a free slot not already promised to another
+    connection, one share of the slots per connection at a time, and slots freed by receivers
+    go first to the connections waiting for credits. Messages are only put in the buffer by the
+    connections; local send_message calls would take slots the credits do not account for.
+    Call start to accept connections and close to stop.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        max_messages: int = 5,
+        clock: Clock = SYSTEM_CLOCK,
+        metrics: MetricsRegistry = NULL_METRICS,
+        backlog: int = 64,
+    ) -> None:
+        super().__init__(
+            max_messages, BackpressurePolicy.DROP_NEWEST, clock=clock, metrics=metrics
+        )
+        self.server: socket.socket = socket.socket(_family(address), socket.SOCK_STREAM)
+        if isinstance(address, str):
+            try:
+                os.unlink(address)
+            except FileNotFoundError:
+                pass
+        else:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen(backlog)
+        self.address: Address = self.server.getsockname()
+        self.available: int = max_messages
+        self.peers: list[Peer] = []
+        self.starving: deque[Peer] = deque()
+        self.runing: bool = True
+        self.acceptor: threading.Thread = threading.Thread(
+            target=self._accept, daemon=True
+        )
+        metrics.gauge(
+            "collector_connections", "Connected senders", lambda: len(self.peers)
+        )
+
+    def start(self) -> None:
+        self.acceptor.start()
+
+    def _accept(self) -> None:
+        while self.runing:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            peer = Peer(sock)
+            with self.lock:
+                self.peers.append(peer)
+            threading.Thread(target=self._serve, args=(peer,), daemon=True).start()
+
+    def _grants(self) -> list[tuple[Peer, int]]:
+        """Shares the available credits among the starving peers. Must hold the lock."""
+        grants = []
+        share = max(1, self.max_messages // max(1, len(self.peers)))
+        while self.available and self.starving:
+            peer = self.starving.popleft()
+            peer.starving = False
+            credits = min(self.available, peer.wanted, share)
+            self.available -= credits
+            peer.credits += credits
+            grants.append((peer, credits))
+        return grants
+
+    def _deliver(self, peer: Peer, frames: list[tuple[int, bytes]]) -> None:
+        with self.lock:
+            delivered = 0
+            for kind, body in frames:
+                if kind == REQUEST:
+                    peer.wanted = CREDIT.unpack(body)[0]
+                    if not peer.starving:
+                        peer.starving = True
+                        self.starving.append(peer)
+                    continue
+                peer.credits -= 1
+                if self.size == self.max_messages:
+                    self.dropped += 1
+                    continue
+                self._push(body.decode() if kind == TEXT else body)
+                delivered += 1
+            if delivered:
+                self.not_empty.notify_all()
+            grants = self._grants()
+        for granted_peer, credits in grants:
+            granted_peer.grant(credits)
+
+    def _serve(self, peer: Peer) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = peer.sock.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                frames, consumed = _parse_frames(buffer)
+                del buffer[:consumed]
+                if frames:
+                    self._deliver(peer, frames)
+        except OSError:
+            pass
+        with self.lock:
+            self.peers.remove(peer)
+            if peer.starving:
+                self.starving.remove(peer)
+            # Credits the peer held are never going to be used
+            self.available += max(0, peer.credits)
+            peer.credits = 0
+            grants = self._grants()
+        for granted_peer, credits in grants:
+            granted_peer.grant(credits)
+        peer.sock.close()
+
+    def _release(self, count: int) -> None:
+        if not count:
+            return
+        with self.lock:
+            self.available += count
+            grants = self._grants()
+        for peer, credits in grants:
+            peer.grant(credits)
+
+    def receive_message(self, timeout: Optional[float] = None):
+        encoded_message = super().receive_message(timeout)
+        if encoded_message is not None:
+            self._release(1)
+        return encoded_message
+
+    def receive_many(self, max_n: int, timeout: Optional[float] = None) -> list:
+        encoded_messages = super().receive_many(max_n, timeout)
+        self._release(len(encoded_messages))
+        return encoded_messages
+
+    def close(self) -> None:
+        self.runing = False
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        with self.lock:
+            peers = list(self.peers)
+        for peer in peers:
+            try:
+                peer.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.acceptor.is_alive():
+            self.acceptor.join(1.0)
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
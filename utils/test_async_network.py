@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from utils.async_network import AsyncNetwork
+from utils.network import BackpressurePolicy, NetworkFullError
+
+
+class TestAsyncNetwork:
+    def test_send_and_receive_many(self):
+        async def scenario():
+            network = AsyncNetwork(max_messages=3)
+            await network.send_many(["a", "b", "c"])
+            return await network.receive_many(5)
+
+        assert asyncio.run(scenario()) == ["a", "b", "c"]
+
+    def test_block_timeout(self):
+        async def scenario():
+            network = AsyncNetwork(
+                max_messages=1, policy=BackpressurePolicy.BLOCK_TIMEOUT, timeout=0.01
+            )
+            await network.send_message("a")
+            await network.send_message("b")
+
+        with pytest.raises(NetworkFullError):
+            asyncio.run(scenario())
+
+    def test_drop_oldest(self):
+        async def scenario():
+            network = AsyncNetwork(
+                max_messages=2, policy=BackpressurePolicy.DROP_OLDEST
+            )
+            await network.send_many(["a", "b", "c"])
+            return await network.receive_many(5), network.dropped
+
+        assert asyncio.run(scenario()) == (["b", "c"], 1)
+
+    def test_receive_timeout(self):
+        async def scenario():
+            network = AsyncNetwork()
+            return await network.receive_many(5, timeout=0.01)
+
+        assert asyncio.run(scenario()) == []
+
+    def test_zero_timeout_takes_queued_messages_only(self):
+        async def scenario():
+            network = AsyncNetwork()
+            empty = await network.receive_many(5, timeout=0)
+            await network.send_many(["a", "b"])
+            return empty, await network.receive_many(5, timeout=0)
+
+        assert asyncio.run(scenario()) == ([], ["a", "b"])
@@ -0,0 +1,64 @@
+from utils.codec import BinaryCodec, SensorRegistry, TextCodec
+
+
+class TestTextCodec:
+    def test_round_trip_with_spaces_in_name(self):
+        codec = TextCodec()
+        encoded = codec.encode("boiler room 1", -5, 1627894567.25)
+        assert encoded == "boiler room 1 -5 1627894567.25"
+        assert codec.decode(encoded) == ("boiler room 1", -5, 1627894567.25)
+
+    def test_decode_many(self):
+        codec = TextCodec()
+        batch = [
+            codec.encode("a", 1, 1.0),
+            codec.encode_many([("b", 2, 2.0), ("c", 3, 3.0)]),
+        ]
+        assert list(codec.decode_many(batch)) == [
+            ("a", 1, 1.0),
+            ("b", 2, 2.0),
+            ("c", 3, 3.0),
+        ]
+
+
+class TestBinaryCodec:
+    def test_fixed_record_size(self):
+        codec = BinaryCodec()
+        assert len(codec.encode("sensor", 100, 1.0)) == 14
+        assert len(codec.encode_many([("a", 1, 1.0), ("b", -100, 2.0)])) == 28
+
+    def test_round_trip(self):
+        codec = BinaryCodec()
+        encoded = codec.encode("sensor with spaces", -100, 1627894567.123)
+        assert codec.decode(encoded) == ("sensor with spaces", -100, 1627894567.123)
+
+    def test_decode_many_mixed_payloads(self):
+        registry = SensorRegistry()
+        producer = BinaryCodec(registry)
+        consumer = BinaryCodec(registry)
+        batch = [
+            producer.encode("a", 1, 1.0),
+            producer.encode_many([("b", 2, 2.0), ("a", 3, 3.0)]),
+        ]
+        assert list(consumer.decode_many(batch)) == [
+            ("a", 1, 1.0),
+            ("b", 2, 2.0),
+            ("a", 3, 3.0),
+        ]
+        assert len(registry) == 2
+
+    def test_intern_range(self):
+        registry = SensorRegistry()
+        codec = BinaryCodec(registry)
+        names = [f"bank_{i}" for i in range(3)]
+        single = registry.intern("single")
+        first = registry.intern_range(names)
+        assert registry.intern("bank_2") == first + 2
+        assert registry.intern("other") == single + 1
+        assert len(registry) == 5
+        assert registry.names == ["single", "other"]
+        batch = [codec.encode_many([("bank_1", 1, 1.0), ("single", 2, 2.0)])]
+        assert list(codec.decode_many(batch)) == [
+            ("bank_1", 1, 1.0),
+            ("single", 2, 2.0),
+        ]
@@ -0,0 +1,70 @@
+import io
+import json
+import logging
+
+from utils.diagnostics import (
+    RateLimit,
+    Sample,
+    get_logger,
+    start_logging,
+    stop_logging,
+)
+
+
+class TestDiagnostics:
+    def test_records_are_written_by_the_listener(self):
+        stream = io.StringIO()
+        listener = start_logging(stream=stream)
+        try:
+            get_logger("tests").info("sensor_started", sensor="SensorA_0", type="A")
+            get_logger("tests").debug("hidden")
+        finally:
+            stop_logging(listener)
+        line = stream.getvalue().strip()
+        assert "level=info logger=pipeline.tests event=sensor_started" in line
+        assert line.endswith("sensor=SensorA_0 type=A")
+        assert "hidden" not in stream.getvalue()
+
+    def test_json_format_and_exceptions(self):
+        stream = io.StringIO()
+        listener = start_logging(stream=stream, as_json=True)
+        try:
+            try:
+                raise OSError("disk full")
+            except OSError as e:
+                get_logger("tests").error("write_failed", exc_info=e, path="a b")
+        finally:
+            stop_logging(listener)
+        record = json.loads(stream.getvalue())
+        assert record["event"] == "write_failed"
+        assert record["path"] == "a b"
+        assert "disk full" in record["exception"]
+
+    def test_rate_limited_event_reports_suppressed(self):
+        stream = io.StringIO()
+        listener = start_logging(stream=stream, level=logging.WARNING)
+        log = get_logger("tests").limit("message_dropped", per_second=0.001, burst=2)
+        try:
+            for _ in range(10):
+                log.warning("message_dropped", sensor="SensorB_0")
+        finally:
+            stop_logging(listener)
+        assert len(stream.getvalue().splitlines()) == 2
+
+    def test_rate_limit_counts_suppressed_events(self):
+        limit = RateLimit(per_second=1_000_000, burst=1)
+        limit.tokens = 0
+        limit.per_second = 0
+        assert limit.allow() == (False, 0)
+        assert limit.allow() == (False, 0)
+        limit.tokens = 1
+        assert limit.allow() == (True, 2)
+
+    def test_sample(self):
+        sample = Sample(every=3)
+        assert [sample.allow() for _ in range(4)] == [
+            (True, 0),
+            (False, 0),
+            (False, 0),
+            (True, 2),
+        ]
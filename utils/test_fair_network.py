@@ -0,0 +1,99 @@
+from utils.clock import VirtualClock
+from utils.codec import BinaryCodec
+from utils.fair_network import FairNetwork, FlowConfig, PriorityClass, by_sensor_type
+from utils.metrics import MetricsRegistry
+from utils.network import BackpressurePolicy
+
+
+def names(messages: list[str]) -> list[str]:
+    return [message.rsplit(" ", 2)[0] for message in messages]
+
+
+class TestFairNetwork:
+    def test_round_robin_between_flows(self):
+        network = FairNetwork(max_messages=10, flow_of=by_sensor_type)
+        network.send_many([f"SensorB_{i} 1 1.0" for i in range(4)])
+        network.send_message("SensorC_0 1 1.0")
+        assert names(network.receive_many(10)) == [
+            "SensorB_0",
+            "SensorC_0",
+            "SensorB_1",
+            "SensorB_2",
+            "SensorB_3",
+        ]
+
+    def test_weighted_flows(self):
+        network = FairNetwork(
+            max_messages=20,
+            flows={"a": FlowConfig(weight=2), "b": FlowConfig(weight=0.5)},
+        )
+        network.send_many(["a 1 1.0"] * 6 + ["b 1 1.0"] * 3)
+        expected = ["a", "a", "a", "a", "b", "a", "a", "b", "b"]
+        assert names(network.receive_many(9)) == expected
+
+    def test_priority_class_is_served_first(self):
+        network = FairNetwork(
+            max_messages=10,
+            flows={"alarm": FlowConfig(priority=PriorityClass.CRITICAL)},
+        )
+        network.send_many(["temperature 1 1.0", "temperature 2 2.0", "alarm 1 3.0"])
+        assert names(network.receive_many(10)) == [
+            "alarm",
+            "temperature",
+            "temperature",
+        ]
+
+    def test_critical_message_pushes_out_lower_class(self):
+        network = FairNetwork(
+            max_messages=2,
+            policy=BackpressurePolicy.BLOCK_TIMEOUT,
+            timeout=0.01,
+            flows={
+                "alarm": FlowConfig(priority=PriorityClass.CRITICAL),
+                "bulk": FlowConfig(priority=PriorityClass.BULK),
+            },
+        )
+        network.send_many(["bulk 1 1.0", "bulk 2 2.0"])
+        assert network.send_message("alarm 1 3.0")
+        assert network.receive_many(10) == ["alarm 1 3.0", "bulk 2 2.0"]
+        assert network.flow_counts()["bulk"] == {
+            "admitted": 2,
+            "dropped": 1,
+            "queued": 0,
+        }
+
+    def test_drop_oldest_evicts_longest_queue(self):
+        network = FairNetwork(max_messages=3, policy=BackpressurePolicy.DROP_OLDEST)
+        network.send_many(["fast 1 1.0", "fast 2 2.0", "slow 1 3.0", "slow 2 4.0"])
+        assert sorted(network.receive_many(10)) == [
+            "fast 2 2.0",
+            "slow 1 3.0",
+            "slow 2 4.0",
+        ]
+
+    def test_token_bucket_rate_limit(self):
+        clock = VirtualClock()
+        metrics = MetricsRegistry()
+        network = FairNetwork(
+            max_messages=10,
+            clock=clock,
+            metrics=metrics,
+            flows={"chatty": FlowConfig(rate=1.0)},
+        )
+        assert network.send_message("chatty 1 1.0")
+        assert not network.send_message("chatty 2 2.0")
+        clock.advance(1.0)
+        assert network.send_message("chatty 3 3.0")
+        snapshot = metrics.snapshot()
+        assert snapshot['network_flow_admitted_total{flow="chatty"}'] == 2
+        assert snapshot['network_flow_dropped_total{flow="chatty"}'] == 1
+        assert snapshot["network_dropped_total"] == 1
+
+    def test_binary_codec_flows(self):
+        codec = BinaryCodec()
+        network = FairNetwork(max_messages=10, codec=codec)
+        network.send_many([codec.encode("a", 1, 1.0), codec.encode("a", 2, 2.0)])
+        network.send_message(codec.encode("b", 3, 3.0))
+        received = [codec.decode(message) for message in network.receive_many(10)]
+        assert [name for name, _, _ in received] == ["a", "b", "a"]
+        assert set(network.flow_counts()) == {"a", "b"}
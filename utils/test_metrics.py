@@ -0,0 +1,111 @@
+import json
+import urllib.request
+
+import pytest
+
+from sensors.base_sensor import SameSensorFactory, SensorType
+from utils.metrics import NULL_METRIC, NULL_METRICS, Histogram, MetricsRegistry
+from utils.network import BackpressurePolicy, Network
+
+
+class TestMetricsRegistry:
+    def test_same_name_and_labels_return_same_metric(self):
+        metrics = MetricsRegistry()
+        counter = metrics.counter("sent_total", sensor="a")
+        counter.inc()
+        metrics.counter("sent_total", sensor="a").inc(2)
+        metrics.counter("sent_total", sensor="b").inc()
+        assert metrics.snapshot() == {
+            'sent_total{sensor="a"}': 3,
+            'sent_total{sensor="b"}': 1,
+        }
+
+    def test_function_metrics_read_on_snapshot(self):
+        metrics = MetricsRegistry()
+        depth = [0]
+        metrics.gauge("depth", function=lambda: depth[0])
+        depth[0] = 7
+        assert metrics.snapshot()["depth"] == 7
+
+    def test_second_function_metric_with_the_same_key_raises(self):
+        metrics = MetricsRegistry()
+        Network(metrics=metrics)
+        with pytest.raises(ValueError, match="network_sent_total"):
+            Network(metrics=metrics)
+        metrics.gauge("depth", function=lambda: 1, queue="a")
+        metrics.gauge("depth", function=lambda: 2, queue="b")
+        with pytest.raises(ValueError):
+            metrics.gauge("depth", function=lambda: 3, queue="a")
+        assert metrics.snapshot()['depth{queue="a"}'] == 1
+
+    def test_histogram_percentiles_within_relative_error(self):
+        histogram = Histogram(unit=1)
+        for value in range(1, 10_001):
+            histogram.record(value)
+        assert histogram.count == 10_000
+        assert abs(histogram.percentile(50) - 5000) / 5000 < 0.04
+        assert abs(histogram.percentile(99) - 9900) / 9900 < 0.04
+        assert histogram.percentile(100) == 10_000
+
+    def test_null_registry_keeps_nothing(self):
+        counter = NULL_METRICS.counter("sent_total", sensor="a")
+        counter.inc()
+        assert counter is NULL_METRIC
+        assert not NULL_METRICS.enabled
+        assert NULL_METRICS.snapshot() == {}
+
+    def test_render_text(self):
+        metrics = MetricsRegistry()
+        metrics.counter("sent_total", "Messages sent", sensor="a").inc()
+        metrics.histogram("save_seconds").record(0.001)
+        text = metrics.render_text()
+        assert "# HELP sent_total Messages sent" in text
+        assert 'sent_total{sensor="a"} 1' in text
+        assert "# TYPE save_seconds summary" in text
+        assert "save_seconds_count 1" in text
+
+    def test_http_exporter(self):
+        metrics = MetricsRegistry()
+        metrics.counter("sent_total").inc(5)
+        server = metrics.serve(port=0)
+        try:
+            base = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(f"{base}/metrics", timeout=2) as response:
+                assert "sent_total 5" in response.read().decode()
+            with urllib.request.urlopen(f"{base}/metrics.json", timeout=2) as response:
+                assert json.loads(response.read()) == {"sent_total": 5}
+        finally:
+            server.close()
+
+
+class TestInstrumentation:
+    def test_network_metrics(self):
+        metrics = MetricsRegistry()
+        network = Network(
+            max_messages=2, policy=BackpressurePolicy.DROP_NEWEST, metrics=metrics
+        )
+        network.send_many(["a", "b", "c"])
+        snapshot = metrics.snapshot()
+        assert snapshot["network_sent_total"] == 2
+        assert snapshot["network_dropped_total"] == 1
+        assert snapshot["network_full_total"] == 1
+        assert snapshot["network_depth"] == 2
+        assert snapshot["network_depth_max"] == 2
+
+    def test_sensor_send_and_drop_counts(self):
+        metrics = MetricsRegistry()
+        network = Network(
+            max_messages=1, policy=BackpressurePolicy.DROP_NEWEST, metrics=metrics
+        )
+        sensor = SameSensorFactory().create_sensors(
+            network=network,
+            sensor_type=SensorType.SensorB,
+            number_of_sensors=1,
+            metrics=metrics,
+        )[0]
+        for _ in range(3):
+            sensor.read_sensor_data()
+            sensor.send_sensor_data()
+        snapshot = metrics.snapshot()
+        assert snapshot['sensor_sent_total{sensor="SensorB_0"}'] == 1
+        assert snapshot['sensor_dropped_total{sensor="SensorB_0"}'] == 2
@@ -1,7 +1,7 @@
 import threading
 import pytest
 
-from utils.network import Network
+from utils.network import Network, BackpressurePolicy, NetworkFullError
 
 
 class TestNetwork:
@@ -13,11 +13,53 @@ class TestNetwork:
         assert received_message == message
 
     def test_send_more_messages_than_max_limit(self):
-        network = Network(max_messages=1)
+        network = Network(
+            max_messages=1, policy=BackpressurePolicy.BLOCK_TIMEOUT, timeout=0.01
+        )
         message1 = "Message 1"
         message2 = "Message 2"
         message3 = "Message 3"
-        with pytest.raises(threading.BrokenBarrierError):
+        with pytest.raises(NetworkFullError):
             network.send_message(message1)
             network.send_message(message2)
             network.send_message(message3)
+
+    def test_messages_are_not_overwritten(self):
+        network = Network(max_messages=3)
+        for i in range(3):
+            network.send_message(f"Message {i}")
+        assert [network.receive_message() for _ in range(3)] == [
+            "Message 0",
+            "Message 1",
+            "Message 2",
+        ]
+
+    def test_drop_oldest(self):
+        network = Network(max_messages=2, policy=BackpressurePolicy.DROP_OLDEST)
+        assert network.send_many(["a", "b", "c"]) == 3
+        assert network.receive_many(5) == ["b", "c"]
+        assert network.dropped == 1
+
+    def test_drop_newest(self):
+        network = Network(max_messages=2, policy=BackpressurePolicy.DROP_NEWEST)
+        assert network.send_many(["a", "b", "c"]) == 2
+        assert network.send_message("d") is False
+        assert network.receive_many(5) == ["a", "b"]
+        assert network.dropped == 2
+
+    def test_receive_many_timeout(self):
+        network = Network()
+        assert network.receive_many(5, timeout=0.01) == []
+        assert network.receive_message(timeout=0.01) is None
+
+    def test_blocking_producer_is_released_by_consumer(self):
+        network = Network(max_messages=2)
+        messages = [f"Message {i}" for i in range(100)]
+        producer = threading.Thread(target=network.send_many, args=(messages,))
+        producer.start()
+        received = []
+        while len(received) < len(messages):
+            received.extend(network.receive_many(10, timeout=1))
+        producer.join(timeout=1)
+        assert received == messages
+        assert len(network) == 0
@@ -0,0 +1,76 @@
+import multiprocessing
+
+import pytest
+
+from utils.codec import BinaryCodec, SensorRegistry
+from utils.network import NetworkFullError
+from utils.shared_memory_network import SharedMemoryNetwork
+
+
+def produce(network: SharedMemoryNetwork, count: int) -> None:
+    registry = SensorRegistry()
+    registry.intern("sensor")
+    codec = BinaryCodec(registry)
+    for i in range(count):
+        network.send_message(codec.encode("sensor", i % 100, float(i)))
+
+
+class TestSharedMemoryNetwork:
+    def test_send_and_receive_records(self):
+        codec = BinaryCodec()
+        network = SharedMemoryNetwork(max_messages=4)
+        try:
+            network.send_message(codec.encode("a", 1, 1.0))
+            network.send_message(codec.encode_many([("b", 2, 2.0), ("a", 3, 3.0)]))
+            assert len(network) == 3
+            payloads = network.receive_many(10)
+            assert list(codec.decode_many(payloads)) == [
+                ("a", 1, 1.0),
+                ("b", 2, 2.0),
+                ("a", 3, 3.0),
+            ]
+            assert network.receive_many(10, timeout=0.01) == []
+        finally:
+            network.close(unlink=True)
+
+    def test_wraps_around_the_ring(self):
+        codec = BinaryCodec()
+        network = SharedMemoryNetwork(max_messages=3)
+        try:
+            received = []
+            for i in range(10):
+                network.send_many([codec.encode("a", i, float(i))])
+                if i % 2:
+                    received.extend(codec.decode_many(network.receive_many(3)))
+            assert network.receive_many(3, timeout=0.01) == []
+            assert [value for _, value, _ in received] == list(range(10))
+        finally:
+            network.close(unlink=True)
+
+    def test_full_ring_times_out(self):
+        codec = BinaryCodec()
+        network = SharedMemoryNetwork(max_messages=1, timeout=0.01)
+        try:
+            network.send_message(codec.encode("a", 1, 1.0))
+            with pytest.raises(NetworkFullError):
+                network.send_message(codec.encode("a", 2, 2.0))
+        finally:
+            network.close(unlink=True)
+
+    def test_cross_process(self):
+        network = SharedMemoryNetwork(max_messages=8)
+        registry = SensorRegistry()
+        registry.intern("sensor")
+        codec = BinaryCodec(registry)
+        try:
+            producer = multiprocessing.Process(target=produce, args=(network, 200))
+            producer.start()
+            received = []
+            while len(received) < 200:
+                received.extend(codec.decode_many(network.receive_many(50, timeout=5)))
+            producer.join()
+            assert [timestamp for _, _, timestamp in received] == [
+                float(i) for i in range(200)
+            ]
+        finally:
+            network.close(unlink=True)
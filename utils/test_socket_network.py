@@ -0,0 +1,176 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from logging_service.logging import Logging
+from service.repository.repository import InMemoryRepository
+from utils.codec import BinaryCodec, TextCodec
+from utils.metrics import MetricsRegistry
+from utils.network import BackpressurePolicy, NetworkFullError
+from utils.socket_network import SocketCollector, SocketNetwork, parse_address
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def receive_all(collector: SocketCollector, count: int, timeout: float = 5.0) -> list:
+    received = []
+    deadline = time.monotonic() + timeout
+    while len(received) < count and time.monotonic() < deadline:
+        received.extend(collector.receive_many(count - len(received), timeout=0.1))
+    return received
+
+
+def send_readings(address, count: int) -> None:
+    """Runs in a separate sensor process"""
+    codec = TextCodec()
+    network = SocketNetwork(address, linger=0.001)
+    for i in range(count):
+        network.send_message(codec.encode(f"SensorA_{i % 3}", i % 50, 1700000000.0 + i))
+    network.close()
+
+
+@pytest.fixture
+def collector():
+    collector = SocketCollector(("127.0.0.1", 0), max_messages=100)
+    collector.start()
+    yield collector
+    collector.close()
+
+
+class TestSocketNetwork:
+    def test_parse_address(self):
+        assert parse_address("localhost:9000") == ("localhost", 9000)
+        assert parse_address("/tmp/collector.sock") == "/tmp/collector.sock"
+
+    def test_messages_arrive_in_order_over_tcp(self, collector):
+        network = SocketNetwork(collector.address)
+        messages = [f"SensorA_0 {i} {i}.0" for i in range(50)]
+        assert network.send_many(messages[:25]) == 25
+        for message in messages[25:]:
+            assert network.send_message(message)
+        assert receive_all(collector, 50) == messages
+        network.close()
+
+    def test_binary_payloads_over_unix_socket(self, tmp_path):
+        collector = SocketCollector(str(tmp_path / "collector.sock"), max_messages=10)
+        collector.start()
+        codec = BinaryCodec()
+        network = SocketNetwork(collector.address)
+        payload = codec.encode_many([("SensorA_0", 1, 1.0), ("SensorA_0", 2, 2.0)])
+        assert network.send_message(payload)
+        received = receive_all(collector, 1)
+        assert list(codec.decode_many(received)) == [
+            ("SensorA_0", 1, 1.0),
+            ("SensorA_0", 2, 2.0),
+        ]
+        network.close()
+        collector.close()
+
+    def test_credits_cap_messages_across_connections(self):
+        collector = SocketCollector(("127.0.0.1", 0), max_messages=4)
+        collector.start()
+        senders = [
+            SocketNetwork(collector.address, policy=BackpressurePolicy.DROP_NEWEST)
+            for _ in range(2)
+        ]
+        # The first send of a connection has no credit yet and asks for some
+        for sender in senders:
+            assert not sender.send_message("SensorA_0 1 1.0")
+
+        def credits() -> int:
+            return sum(sender.connections[0].credits for sender in senders)
+
+        assert wait_for(lambda: credits() == 4)
+        sent = sum(sender.send_many(["SensorA_0 1 1.0"] * 10) for sender in senders)
+        assert sent == 4
+        assert wait_for(lambda: len(collector) == 4)
+        assert len(receive_all(collector, 4)) == 4
+        assert wait_for(lambda: credits() == 4)
+        assert (
+            sum(sender.send_many(["SensorA_0 1 1.0"] * 10) for sender in senders) == 4
+        )
+        assert collector.peak <= 4
+        for sender in senders:
+            sender.close()
+        collector.close()
+
+    def test_send_timeout_counts_and_writes_the_admitted_frames(self):
+        collector = SocketCollector(("127.0.0.1", 0), max_messages=2)
+        collector.start()
+        network = SocketNetwork(
+            collector.address, policy=BackpressurePolicy.BLOCK_TIMEOUT, timeout=0.2
+        )
+        messages = [f"SensorA_0 {i} {i}.0" for i in range(5)]
+        with pytest.raises(NetworkFullError):
+            network.send_many(messages)
+        assert network.sent == 2
+        assert receive_all(collector, 2) == messages[:2]
+        network.close()
+        collector.close()
+
+    def test_blocking_sender_waits_for_the_consumer(self):
+        collector = SocketCollector(("127.0.0.1", 0), max_messages=2)
+        collector.start()
+        network = SocketNetwork(collector.address)
+        messages = [f"SensorA_0 {i} {i}.0" for i in range(20)]
+        producer = threading.Thread(target=network.send_many, args=(messages,))
+        producer.start()
+        received = []
+        while len(received) < 20:
+            time.sleep(0.002)
+            received.extend(collector.receive_many(20, timeout=1))
+        producer.join(5)
+        assert received == messages
+        assert collector.peak <= 2
+        network.close()
+        collector.close()
+
+    def test_frames_are_coalesced(self, collector):
+        metrics = MetricsRegistry()
+        network = SocketNetwork(collector.address, linger=0.05, metrics=metrics)
+        network.send_message("SensorA_0 1 1.0")
+        assert len(receive_all(collector, 1)) == 1
+        flushes = metrics.snapshot()["network_flushes_total"]
+        for i in range(30):
+            network.send_message(f"SensorA_0 {i} {i}.0")
+        assert len(receive_all(collector, 30)) == 30
+        assert metrics.snapshot()["network_flushes_total"] - flushes <= 3
+        network.close()
+
+    def test_sends_to_a_closed_collector_are_dropped(self):
+        collector = SocketCollector(("127.0.0.1", 0), max_messages=10)
+        collector.start()
+        network = SocketNetwork(collector.address, reconnect_interval=60)
+        assert network.send_message("SensorA_0 1 1.0")
+        assert len(receive_all(collector, 1)) == 1
+        collector.close()
+        assert wait_for(lambda: network.send_message("SensorA_0 2 2.0") is False)
+        assert network.dropped >= 1
+        network.close()
+
+    def test_collector_feeds_logging_from_a_sensor_process(self, collector):
+        repository = InMemoryRepository()
+        logging = Logging(repository=repository, network=collector, flush_interval_ms=5)
+        logging.daemon = True
+        logging.start()
+        process = multiprocessing.Process(
+            target=send_readings, args=(collector.address, 300)
+        )
+        process.start()
+        process.join(10)
+        assert process.exitcode == 0
+        assert wait_for(lambda: len(repository.data) == 300)
+        assert {message.sensor_name for message in repository.data} == {
+            "SensorA_0",
+            "SensorA_1",
+            "SensorA_2",
+        }